@@ -45,7 +45,17 @@ INSTALLED_APPS = [
     'recipe',
 ]
 
+# API-only processes (API_ONLY=1) leave out the admin, which saves its
+# imports and URL patterns at startup
+API_ONLY = os.environ.get('API_ONLY', '0') == '1'
+if API_ONLY:
+    INSTALLED_APPS.remove('django.contrib.admin')
+
 MIDDLEWARE = [
+    'core.middleware.HealthCheckMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.SlowQueryMiddleware',
+    'core.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,6 +65,20 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Middleware for paths under API_MIDDLEWARE_PREFIXES when served through
+# core.handlers (app.wsgi). The API authenticates with tokens only, so
+# sessions, CSRF, auth and messages are left out. None uses MIDDLEWARE.
+API_MIDDLEWARE_PREFIXES = ['/api/']
+API_MIDDLEWARE = [
+    'core.middleware.HealthCheckMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.SlowQueryMiddleware',
+    'core.middleware.ServerTimingMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
 ROOT_URLCONF = 'app.urls'
 
 TEMPLATES = [
@@ -89,6 +113,27 @@ DATABASES = {
     }
 }
 
+# Extra databases holding per-user recipe data, e.g. DB_SHARDS=default,shard1
+# with DB_HOST_SHARD1/DB_NAME_SHARD1/... describing each extra shard.
+DATABASE_SHARDS = os.environ.get('DB_SHARDS', 'default').split(',')
+# Ids handed out by each shard; the Nth shard owns N * this + 1 onwards
+DATABASE_SHARD_ID_RANGE = 10 ** 12
+
+for shard in DATABASE_SHARDS:
+    if shard not in DATABASES:
+        suffix = shard.upper()
+        DATABASES[shard] = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'HOST': os.environ.get(f'DB_HOST_{suffix}'),
+            'NAME': os.environ.get(f'DB_NAME_{suffix}'),
+            'USER': os.environ.get(f'DB_USER_{suffix}',
+                                   os.environ.get('DB_USER')),
+            'PASSWORD': os.environ.get(f'DB_PASS_{suffix}',
+                                       os.environ.get('DB_PASS')),
+        }
+
+DATABASE_ROUTERS = ['core.sharding.UserShardRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -130,6 +175,37 @@ MEDIA_URL = '/static/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+DEFAULT_FILE_STORAGE = 'core.storage.ContentAddressedStorage'
+
+# How media bytes are sent after access checks: 'nginx' (X-Accel-Redirect
+# to MEDIA_ACCEL_PREFIX), 'sendfile' (X-Sendfile) or '' to stream from Python
+MEDIA_SENDFILE_BACKEND = os.environ.get('MEDIA_SENDFILE_BACKEND', '')
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# Unreferenced images younger than this are left alone by sweep_images
+IMAGE_SWEEP_GRACE_SECONDS = 3600
+
+# Limits enforced while a recipe image upload streams in
+RECIPE_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+RECIPE_IMAGE_MAX_PIXELS = 40_000_000
+RECIPE_IMAGE_FORMATS = ['JPEG', 'PNG', 'WEBP', 'GIF']
+
+# Widths served by the on-demand resize endpoint and its disk cache budget
+RECIPE_IMAGE_WIDTHS = [160, 320, 640, 1024, 1600]
+RESIZED_IMAGE_CACHE_BYTES = 2 * 1024 ** 3
+
+# Threads generating recipe image variants; defaults to the CPU count
+IMAGE_PIPELINE_WORKERS = int(os.environ.get('IMAGE_PIPELINE_WORKERS', 0))
+# Hand variant generation to the run_worker task queue instead
+IMAGE_PIPELINE_USE_TASKS = (
+    os.environ.get('IMAGE_PIPELINE_USE_TASKS', '0') == '1'
+)
+
+# Rows deleted per transaction when a user is deleted, and chunks run by
+# one delete_user_data task before it re-queues itself
+USER_DELETION_CHUNK_SIZE = 1000
+USER_DELETION_CHUNKS_PER_TASK = 50
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
@@ -140,8 +216,104 @@ AUTH_USER_MODEL= 'core.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS':'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'core.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.FastJSONParser',
+        'core.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# Most IDs a client may fetch with one batch request
+BATCH_RETRIEVE_MAX_IDS = 100
+
+# Most changes returned by one /api/recipe/changes/ page
+SYNC_PAGE_SIZE = 500
+
+# Seconds a change waits before the sync feed returns it; must exceed the
+# longest transaction that writes recipe data (see core/changes.py)
+SYNC_COMMIT_LAG = int(os.environ.get('SYNC_COMMIT_LAG', 5))
+
+# Most sub-requests per /api/batch/ call, and the threads running the
+# reads of a parallel batch
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', '4'))
+
+# Share of requests measured by ServerTimingMiddleware (0.0 - 1.0)
+SERVER_TIMING_SAMPLE_RATE = float(
+    os.environ.get('SERVER_TIMING_SAMPLE_RATE', '1.0' if DEBUG else '0.01')
+)
+
+# Shared directory where each worker process publishes its metrics, how
+# often it does so, and who may scrape them: requests with the bearer
+# METRICS_TOKEN or from METRICS_ALLOWED_IPS. Nobody may by default; never
+# list the reverse proxy's address, every proxied request comes from it.
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_SECONDS = 5
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = [
+    ip for ip in os.environ.get('METRICS_ALLOWED_IPS', '').split(',') if ip
+]
+
+# Queries slower than this are logged with their view (0 disables), and
+# this share of the slow SELECTs is explained in the background
+SLOW_QUERY_THRESHOLD_MS = int(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200))
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(
+    os.environ.get('SLOW_QUERY_EXPLAIN_SAMPLE_RATE', '0.1')
+)
+# Rotating log file for slow queries and their plans; stderr when unset
+SLOW_QUERY_LOG_FILE = os.environ.get('SLOW_QUERY_LOG_FILE', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG_FILE,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+        } if SLOW_QUERY_LOG_FILE else {
+            'class': 'logging.StreamHandler',
+        },
+        'timing': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        # One line per sampled request from ServerTimingMiddleware
+        'core.timing': {
+            'handlers': ['timing'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
 }
 
+# Seconds a readiness dependency check result is reused per process
+HEALTH_CHECK_CACHE_SECONDS = 5
+
+# Serve /api/schema/ from a schema generated once per APP_VERSION (or per
+# change of the Python sources when unset); build_schema can pre-generate
+# it into SCHEMA_CACHE_FILE
+SCHEMA_CACHE = True
+SCHEMA_GZIP = True
+SCHEMA_CACHE_FILE = os.environ.get('SCHEMA_CACHE_FILE', '')
+APP_VERSION = os.environ.get('APP_VERSION', '')
+
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,
+    # The schema views are imported lazily, so they cannot describe
+    # themselves
+    'SERVE_INCLUDE_SCHEMA': False,
 }
@@ -13,25 +13,30 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
-from django.conf.urls.static import static
 from django.conf import settings
 from django.urls import path, include
-from drf_spectacular.views import (SpectacularAPIView, SpectacularSwaggerView,)
+from core.batch import BatchView
+from core.views import lazy_view, metrics_view
+from recipe.views import RecipeMediaView
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
-    path('api/schema/', SpectacularAPIView.as_view(), name='api-schema'),
+    path('api/schema/', lazy_view('core.schema.CachedSpectacularAPIView'),
+         name='api-schema'),
     path('api/docs/',
-         SpectacularSwaggerView.as_view(url_name='api-schema'),
+         lazy_view('drf_spectacular.views.SpectacularSwaggerView',
+                   url_name='api-schema'),
          name='api-docs',
          ),
+    path('internal/metrics', metrics_view, name='metrics'),
+    path('api/batch/', BatchView.as_view(), name='batch'),
     path('api/user/', include('user.urls')),
     path('api/recipe/', include('recipe.urls')),
+    path(f"{settings.MEDIA_URL.lstrip('/')}<path:path>",
+         RecipeMediaView.as_view(),
+         name='media'),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL,
-                          document_root=settings.MEDIA_ROOT)
-
+if not settings.API_ONLY:
+    from django.contrib import admin
 
+    urlpatterns.insert(0, path('admin/', admin.site.urls))
@@ -0,0 +1,165 @@
+"""
+Request multiplexing.
+
+`POST /api/batch/` takes a list of sub-requests, authenticates once and
+runs each of them in-process through the URL resolver with the batch
+request's user forced onto it, so a client can load a screen with one
+round trip and one token lookup. Sub-requests run in order; with
+`parallel` set, consecutive reads run concurrently on a thread pool while
+writes still run one at a time between them. Only API paths can be
+batched; the admin and media views expect the full middleware chain.
+"""
+import contextvars
+import json
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.handlers.exception import convert_exception_to_response
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.urls import Resolver404, resolve
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema
+from rest_framework import serializers, status
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+API_PREFIX = '/api/'
+
+
+class SubRequestSerializer(serializers.Serializer):
+    """Serializer for one request of a batch"""
+    method = serializers.ChoiceField(
+        choices=['GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE'],
+        default='GET',
+    )
+    path = serializers.RegexField(r'^/[^#]*$')
+    body = serializers.JSONField(required=False)
+
+
+class BatchSerializer(serializers.Serializer):
+    """Serializer for a batch of requests"""
+    requests = SubRequestSerializer(many=True, allow_empty=False)
+    parallel = serializers.BooleanField(default=False)
+
+    def validate_requests(self, value):
+        """Limit the number of sub-requests to BATCH_MAX_REQUESTS"""
+        limit = settings.BATCH_MAX_REQUESTS
+        if len(value) > limit:
+            raise serializers.ValidationError(
+                f'Ensure this field has no more than {limit} elements.'
+            )
+        return value
+
+
+def build_request(request, method, path, body=None):
+    """Return a WSGIRequest for a sub-request of the batch request"""
+    path_info, _, query_string = path.partition('?')
+    content = b'' if body is None else json.dumps(body).encode()
+    environ = dict(request.META)
+    environ.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path_info,
+        'QUERY_STRING': query_string,
+        'CONTENT_TYPE': 'application/json' if content else '',
+        'CONTENT_LENGTH': str(len(content)),
+        'wsgi.input': BytesIO(content),
+    })
+    environ.pop('HTTP_ACCEPT', None)
+    environ.pop('HTTP_ACCEPT_ENCODING', None)
+    environ.pop('HTTP_IF_NONE_MATCH', None)
+    sub_request = WSGIRequest(environ)
+    sub_request._force_auth_user = request.user
+    sub_request._force_auth_token = request.auth
+    return sub_request
+
+
+def dispatch(request, spec):
+    """Run one sub-request and return its status, headers and body"""
+    sub_request = build_request(request, spec['method'], spec['path'],
+                                spec.get('body'))
+    if not sub_request.path_info.startswith(API_PREFIX):
+        return {'status': status.HTTP_400_BAD_REQUEST, 'headers': {},
+                'body': {'detail': f'Only {API_PREFIX} paths can be '
+                                   f'batched.'}}
+    try:
+        match = resolve(sub_request.path_info)
+    except Resolver404:
+        return {'status': status.HTTP_404_NOT_FOUND, 'headers': {},
+                'body': {'detail': 'Not found.'}}
+    if getattr(match.func, 'view_class', None) is BatchView:
+        return {'status': status.HTTP_400_BAD_REQUEST, 'headers': {},
+                'body': {'detail': 'Batches cannot be nested.'}}
+    sub_request.resolver_match = match
+
+    def view(sub_request):
+        return match.func(sub_request, *match.args, **match.kwargs)
+
+    response = convert_exception_to_response(view)(sub_request)
+    if isinstance(response, Response):
+        body = response.data
+    elif response.streaming:
+        body = None
+    else:
+        body = response.content.decode(response.charset, 'replace')
+    # Release the streamed file; response.close() would also send
+    # request_finished and close the batch request's connections
+    file_to_stream = getattr(response, 'file_to_stream', None)
+    if file_to_stream is not None:
+        file_to_stream.close()
+    headers = {key: value for key, value in response.items()
+               if key not in ('Content-Type', 'Content-Length', 'Vary')}
+    return {'status': response.status_code, 'headers': headers, 'body': body}
+
+
+def _dispatch_in_thread(request, spec):
+    try:
+        return dispatch(request, spec)
+    finally:
+        connections.close_all()
+
+
+def run(request, specs, parallel=False):
+    """Run the sub-requests, returning their responses in request order"""
+    if not parallel or settings.BATCH_MAX_WORKERS < 2:
+        return [dispatch(request, spec) for spec in specs]
+
+    responses = []
+    with ThreadPoolExecutor(settings.BATCH_MAX_WORKERS) as executor:
+        reads = []
+        for spec in list(specs) + [None]:
+            if spec is not None and spec['method'] in SAFE_METHODS:
+                reads.append(executor.submit(
+                    contextvars.copy_context().run,
+                    _dispatch_in_thread, request, spec,
+                ))
+                continue
+            responses.extend(future.result() for future in reads)
+            reads = []
+            if spec is not None:
+                responses.append(dispatch(request, spec))
+    return responses
+
+
+class BatchView(APIView):
+    """Run several API requests in one round trip
+
+    Sub-requests are not instrumented on their own; metrics, slow queries
+    and Server-Timing are reported for the batch request as a whole.
+    """
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    @extend_schema(request=BatchSerializer,
+                   responses={200: OpenApiTypes.OBJECT})
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({'responses': run(
+            request._request, serializer.validated_data['requests'],
+            serializer.validated_data['parallel'],
+        )})
@@ -0,0 +1,122 @@
+"""
+Change tracking for delta syncs.
+
+Every save of a recipe, tag or ingredient stamps it with the next value
+of a monotonic change sequence (`ChangeTrackedModel`), and deleting one
+through the API leaves a `Tombstone` carrying its own sequence number, so
+`/api/recipe/changes/?since=<cursor>` only reads the rows changed after
+the cursor from the (user, change_seq) indexes.
+
+On PostgreSQL the numbers come from the `core_change_seq` sequence of
+each shard; other backends use the highest number in use plus one, which
+is only safe with a single writer. Code writing rows without `save()`
+stamps them with `bump` or `stamp`, and code copying stamped rows into a
+database moves its sequence past them with `advance_sequence`.
+
+A sequence number is handed out when a row is written, not when its
+transaction commits, so a sync could see number 11 while 10 is still
+uncommitted and move its cursor past 10 for good. Each number is
+therefore stored with the database time it was handed out
+(`changed_at`), and on PostgreSQL `committed_filter` leaves out changes
+younger than SYNC_COMMIT_LAG seconds: those older must have committed
+as long as no transaction writing recipe data runs longer than that.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+SEQUENCE = 'core_change_seq'
+
+
+def _uses_sequence(using):
+    return connections[using].vendor == 'postgresql'
+
+
+def next_change(using='default'):
+    """Return a new change sequence number and the time it was taken"""
+    if _uses_sequence(using):
+        with connections[using].cursor() as cursor:
+            cursor.execute('SELECT nextval(%s), clock_timestamp()',
+                           [SEQUENCE])
+            return cursor.fetchone()
+
+    from django.db.models import Max
+    from core.models import Ingredient, Recipe, Tag, Tombstone
+
+    return max(
+        model.objects.using(using).aggregate(m=Max('change_seq'))['m'] or 0
+        for model in (Recipe, Tag, Ingredient, Tombstone)
+    ) + 1, timezone.now()
+
+
+def next_change_seq(using='default'):
+    """Return a new change sequence number on a database"""
+    return next_change(using)[0]
+
+
+def next_value(using='default'):
+    """Return a new change sequence number usable in QuerySet.update()"""
+    if _uses_sequence(using):
+        return RawSQL('nextval(%s)', [SEQUENCE])
+    return next_change_seq(using)
+
+
+def stamp(using='default'):
+    """Return change_seq and changed_at values for QuerySet.update()"""
+    if _uses_sequence(using):
+        return {'change_seq': next_value(using),
+                'changed_at': RawSQL('clock_timestamp()', [])}
+    return dict(zip(('change_seq', 'changed_at'), next_change(using)))
+
+
+def bump(queryset):
+    """Stamp every row of queryset with its own new sequence number"""
+    using = queryset.db
+    if _uses_sequence(using):
+        return queryset.update(**stamp(using))
+    ids = list(queryset.values_list('pk', flat=True))
+    for pk in ids:
+        queryset.model.objects.using(using).filter(pk=pk).update(
+            **stamp(using)
+        )
+    return len(ids)
+
+
+def committed_filter(using='default'):
+    """Return filters leaving out changes that may not be committed yet"""
+    if not _uses_sequence(using):
+        return {}
+    with connections[using].cursor() as cursor:
+        cursor.execute('SELECT clock_timestamp()')
+        now = cursor.fetchone()[0]
+    return {'changed_at__lte':
+            now - timedelta(seconds=settings.SYNC_COMMIT_LAG)}
+
+
+def record_deletion(instance, using=None):
+    """Leave a tombstone for a recipe, tag or ingredient about to go"""
+    from core.models import Tombstone
+
+    using = using or instance._state.db or 'default'
+    change_seq, changed_at = next_change(using)
+    return Tombstone.objects.using(using).create(
+        user_id=instance.user_id,
+        model_name=instance._meta.model_name,
+        object_id=instance.pk,
+        change_seq=change_seq,
+        changed_at=changed_at,
+    )
+
+
+def advance_sequence(using, value):
+    """Make sure new numbers on a database are greater than value"""
+    if not _uses_sequence(using) or not value:
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'SELECT setval(%s, GREATEST(%s, last_value)) FROM {SEQUENCE}',
+            [SEQUENCE, value],
+        )
@@ -0,0 +1,145 @@
+"""
+Chunked background deletion of users.
+
+Deleting a user with `User.delete()` makes Django's collector load every
+recipe, tag, ingredient and M2M row into memory and delete them in one
+long transaction. `request_deletion` instead deactivates the account and
+revokes its tokens right away and queues `delete_user_data`, which
+removes the data in bounded chunks: M2M rows first, then recipes (their
+images are released for `sweep_images`), tags, ingredients, the sync
+tombstones and finally the user row. Each chunk is its own short
+transaction and the stage and counts are recorded on a `UserDeletion`
+row, so a deletion can be watched, and resumes where it stopped if its
+worker dies. Each chunk locks that row and works from what it holds, so
+runners that overlap (a `--sync` run next to the queued task, or a task
+queued twice) take turns instead of undoing each other's progress.
+"""
+import logging
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from core import sharding
+from core.models import (ImageBlob, Ingredient, Recipe, Tag, Task,
+                         Tombstone, UserDeletion)
+
+logger = logging.getLogger(__name__)
+
+# (stage, model, lookup of the user's id) in deletion order
+CHUNKED_STAGES = [
+    (UserDeletion.RECIPE_TAGS, Recipe.tags.through, 'recipe__user_id'),
+    (UserDeletion.RECIPE_INGREDIENTS, Recipe.ingredients.through,
+     'recipe__user_id'),
+    (UserDeletion.RECIPES, Recipe, 'user_id'),
+    (UserDeletion.TAGS, Tag, 'user_id'),
+    (UserDeletion.INGREDIENTS, Ingredient, 'user_id'),
+    (UserDeletion.TOMBSTONES, Tombstone, 'user_id'),
+]
+STAGES = [stage for stage, _, _ in CHUNKED_STAGES] + [UserDeletion.USER,
+                                                      UserDeletion.DONE]
+
+
+def request_deletion(user):
+    """Deactivate a user now and queue the deletion of their data"""
+    from core.tasks import delete_user_data
+
+    with transaction.atomic(using='default'):
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        Token.objects.filter(user=user).delete()
+        deletion, created = UserDeletion.objects.get_or_create(
+            user_id=user.pk,
+            defaults={'email': user.email,
+                      'alias': sharding.shard_for_user(user)},
+        )
+        if created:
+            delete_user_data.delay(deletion_id=deletion.pk)
+    return deletion
+
+
+def has_pending_task(deletion):
+    """Return True if a delete_user_data task is queued or running"""
+    from core.tasks import delete_user_data
+
+    return Task.objects.filter(
+        name=delete_user_data.task_name,
+        status__in=[Task.QUEUED, Task.RUNNING],
+        payload__deletion_id=deletion.pk,
+    ).exists()
+
+
+def _delete_chunk(current, model, lookup, chunk_size):
+    """Delete up to chunk_size of the user's rows and record the count
+
+    current is the locked UserDeletion row; returns the released images.
+    """
+    alias = current.alias
+    rows = model.objects.using(alias).filter(**{lookup: current.user_id})
+    images = []
+    if model is Recipe:
+        chunk = list(rows.values_list('pk', 'image')[:chunk_size])
+        ids = [pk for pk, _ in chunk]
+        images = [image for _, image in chunk if image]
+    else:
+        ids = list(rows.values_list('pk', flat=True)[:chunk_size])
+    with transaction.atomic(using=alias):
+        model.objects.using(alias).filter(pk__in=ids).delete()
+    name = model._meta.model_name
+    stage = current.stage
+    if len(ids) < chunk_size:
+        stage = STAGES[STAGES.index(stage) + 1]
+    UserDeletion.objects.filter(pk=current.pk).update(
+        stage=stage, updated_at=timezone.now(),
+        deleted={**current.deleted,
+                 name: current.deleted.get(name, 0) + len(ids)},
+    )
+    return images
+
+
+def _delete_user(current):
+    """Delete the user row and its mirrors on every shard"""
+    sharding.remove_mirrors(current.user_id)
+    get_user_model().objects.using('default').filter(
+        pk=current.user_id
+    ).delete()
+    now = timezone.now()
+    UserDeletion.objects.filter(pk=current.pk).update(
+        stage=UserDeletion.DONE, updated_at=now, finished_at=now,
+    )
+    logger.info('Deleted user %s: %s', current.user_id, current.deleted)
+
+
+def run(deletion, chunk_size=1000, max_chunks=None, progress=None):
+    """Delete chunks until done or max_chunks ran; returns True when done
+
+    deletion is refreshed after every chunk; progress, if given, is then
+    called with it.
+    """
+    stages = {stage: (model, lookup)
+              for stage, model, lookup in CHUNKED_STAGES}
+    chunks = 0
+    while True:
+        if max_chunks is not None and chunks >= max_chunks:
+            return False
+        images = []
+        with transaction.atomic(using='default'):
+            current = UserDeletion.objects.select_for_update().get(
+                pk=deletion.pk
+            )
+            if current.stage == UserDeletion.DONE:
+                break
+            chunks += 1
+            if current.stage == UserDeletion.USER:
+                _delete_user(current)
+            else:
+                model, lookup = stages[current.stage]
+                images = _delete_chunk(current, model, lookup, chunk_size)
+        for image in images:
+            ImageBlob.objects.release(image)
+        deletion.refresh_from_db()
+        if progress is not None:
+            progress(deletion)
+    deletion.refresh_from_db()
+    return True
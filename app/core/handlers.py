@@ -0,0 +1,65 @@
+"""
+WSGI handler with a lean middleware chain for the API.
+
+The API authenticates with DRF tokens only, so session, CSRF, auth and
+message middleware do nothing useful for it. `RoutedWSGIHandler` builds
+a second middleware chain from API_MIDDLEWARE and uses it for paths
+under API_MIDDLEWARE_PREFIXES; every other path (the admin) keeps the
+full MIDDLEWARE chain.
+"""
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections
+
+
+@contextmanager
+def middleware_setting(middleware):
+    """Temporarily replace settings.MIDDLEWARE while loading a chain"""
+    original = settings.MIDDLEWARE
+    settings.MIDDLEWARE = middleware
+    try:
+        yield
+    finally:
+        settings.MIDDLEWARE = original
+
+
+@contextmanager
+def keep_connections():
+    """Keep database connections open across in-process requests"""
+    request_started.disconnect(close_old_connections)
+    request_finished.disconnect(close_old_connections)
+    try:
+        yield
+    finally:
+        request_started.connect(close_old_connections)
+        request_finished.connect(close_old_connections)
+
+
+class RoutedWSGIHandler(WSGIHandler):
+    """Dispatch API paths to the API_MIDDLEWARE chain"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.api_handler = None
+        if settings.API_MIDDLEWARE is not None:
+            self.api_handler = BaseHandler()
+            with middleware_setting(settings.API_MIDDLEWARE):
+                self.api_handler.load_middleware()
+        self.api_prefixes = tuple(settings.API_MIDDLEWARE_PREFIXES)
+
+    def get_response(self, request):
+        if (self.api_handler is not None and
+                request.path_info.startswith(self.api_prefixes)):
+            return self.api_handler.get_response(request)
+        return super().get_response(request)
+
+
+def get_wsgi_application():
+    """Like Django's get_wsgi_application, with the routed handler"""
+    django.setup(set_prefix=False)
+    return RoutedWSGIHandler()
@@ -0,0 +1,72 @@
+"""
+Liveness and readiness probes.
+
+Dependency checks are cached per process for HEALTH_CHECK_CACHE_SECONDS so
+frequent probes from many replicas barely touch the database.
+"""
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def check_databases():
+    """Return an error message per unreachable database alias"""
+    errors = {}
+    for alias in settings.DATABASES:
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Exception as exc:
+            errors[alias] = str(exc).strip() or exc.__class__.__name__
+    return errors
+
+
+def check_media():
+    """Return an error message if MEDIA_ROOT is not writable"""
+    try:
+        os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
+        with tempfile.TemporaryFile(dir=settings.MEDIA_ROOT):
+            pass
+    except OSError as exc:
+        return {'media': str(exc)}
+    return {}
+
+
+CHECKS = {
+    'database': check_databases,
+    'media': check_media,
+}
+
+
+def run_check(name):
+    """Run a named check, reusing a recent result if there is one"""
+    ttl = getattr(settings, 'HEALTH_CHECK_CACHE_SECONDS', 5)
+    now = time.monotonic()
+    cached = _cache.get(name)
+    if cached is not None and now - cached[0] < ttl:
+        return cached[1]
+    with _lock:
+        cached = _cache.get(name)
+        if cached is not None and now - cached[0] < ttl:
+            return cached[1]
+        errors = CHECKS[name]()
+        _cache[name] = (time.monotonic(), errors)
+    return errors
+
+
+def readiness():
+    """Return a mapping of check name to errors for failing checks"""
+    results = {name: run_check(name) for name in CHECKS}
+    return {name: errors for name, errors in results.items() if errors}
+
+
+def clear_cache():
+    """Forget cached check results"""
+    _cache.clear()
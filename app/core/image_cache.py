@@ -0,0 +1,135 @@
+"""
+On-demand resized recipe images.
+
+Each (image, width, format) is rendered once and kept under
+MEDIA_ROOT/cache/resized. Recency is tracked through file mtimes and the
+least recently used files are evicted once the directory grows past
+RESIZED_IMAGE_CACHE_BYTES. Concurrent requests for the same missing
+variant wait on a per-variant lock, in this process and across processes,
+so the source is decoded only once.
+"""
+import fcntl
+import hashlib
+import io
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from core.images import FORMATS
+
+CACHE_DIR = os.path.join('cache', 'resized')
+
+_locks = {}
+_locks_guard = threading.Lock()
+_size = {'bytes': None}
+
+
+def cache_name(source_name, width, fmt):
+    """Return the storage name of a cached resized image"""
+    key = hashlib.sha1(source_name.encode()).hexdigest()
+    filename = f'{key}_w{width}{FORMATS[fmt][1]}'
+    return os.path.join(CACHE_DIR, key[:2], filename)
+
+
+def render(source_name, width, fmt):
+    """Return the image resized to width, encoded in fmt"""
+    from PIL import Image, ImageOps
+
+    pil_format, ext, save_options = FORMATS[fmt]
+    with default_storage.open(source_name, 'rb') as source:
+        with Image.open(source) as img:
+            img.draft('RGB', (width, width))
+            img = ImageOps.exif_transpose(img)
+            if img.width > width:
+                img.thumbnail((width, img.height), Image.LANCZOS)
+            if pil_format == 'JPEG' and img.mode != 'RGB':
+                img = img.convert('RGB')
+            buffer = io.BytesIO()
+            img.save(buffer, format=pil_format, **save_options)
+    return buffer.getvalue()
+
+
+def _thread_lock(name):
+    with _locks_guard:
+        return _locks.setdefault(name, threading.Lock())
+
+
+def _scan(root):
+    """Return (mtime, size, path) for every cached file"""
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith('.lock'):
+                continue
+            path = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+
+def evict(limit=None):
+    """Delete least recently used files until the cache fits its limit"""
+    limit = limit or settings.RESIZED_IMAGE_CACHE_BYTES
+    entries = sorted(_scan(os.path.join(settings.MEDIA_ROOT, CACHE_DIR)))
+    total = sum(size for mtime, size, path in entries)
+    target = limit * 0.9
+    for mtime, size, path in entries:
+        if total <= target:
+            break
+        for stale in (path, path + '.lock'):
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+        total -= size
+    _size['bytes'] = total
+    return total
+
+
+def _record_write(size):
+    if _size['bytes'] is None:
+        _size['bytes'] = sum(
+            entry[1] for entry in
+            _scan(os.path.join(settings.MEDIA_ROOT, CACHE_DIR))
+        )
+    else:
+        _size['bytes'] += size
+    if _size['bytes'] > settings.RESIZED_IMAGE_CACHE_BYTES:
+        evict()
+
+
+def get_resized(source_name, width, fmt):
+    """Return the storage name of the resized image, rendering on a miss"""
+    name = cache_name(source_name, width, fmt)
+    path = default_storage.path(name)
+    try:
+        os.utime(path)
+        return name
+    except FileNotFoundError:
+        pass
+
+    try:
+        with _thread_lock(name):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + '.lock', 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                if os.path.exists(path):
+                    os.utime(path)
+                    return name
+                content = render(source_name, width, fmt)
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+                with os.fdopen(fd, 'wb') as tmp:
+                    tmp.write(content)
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, path)
+    finally:
+        with _locks_guard:
+            _locks.pop(name, None)
+    _record_write(len(content))
+    return name
@@ -0,0 +1,184 @@
+"""
+Recipe image processing.
+
+After an upload the original is resized into fixed-size variants in a
+background worker pool, so the upload response does not wait for Pillow.
+Variants are stored next to the original as `<stem>_<variant>.<ext>`;
+content-addressed originals that already have variants are not re-rendered.
+"""
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+
+from core.storage import is_content_addressed
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = {
+    'thumbnail': (200, 200),
+    'medium': (800, 800),
+}
+
+FORMATS = {
+    'jpeg': ('JPEG', '.jpg', {'quality': 82, 'optimize': True,
+                              'progressive': True}),
+    'webp': ('WEBP', '.webp', {'quality': 80, 'method': 4}),
+}
+
+_executor = None
+
+
+def get_executor():
+    """Return the shared image processing worker pool"""
+    global _executor
+    if _executor is None:
+        workers = getattr(settings, 'IMAGE_PIPELINE_WORKERS', None)
+        _executor = ThreadPoolExecutor(
+            max_workers=workers or os.cpu_count() or 1,
+            thread_name_prefix='recipe-image',
+        )
+    return _executor
+
+
+def variant_name(source_name, variant, fmt):
+    """Return the storage name of a variant of an image"""
+    stem = os.path.splitext(source_name)[0]
+    return f'{stem}_{variant}{FORMATS[fmt][1]}'
+
+
+def source_stem(name):
+    """Return the storage name without extension or variant suffix"""
+    stem = os.path.splitext(name)[0]
+    for variant in VARIANTS:
+        if stem.endswith(f'_{variant}'):
+            return stem[:-len(variant) - 1]
+    return stem
+
+
+def variant_names(source_name):
+    """Return the storage names of every variant of an image"""
+    return [variant_name(source_name, variant, fmt)
+            for variant in VARIANTS for fmt in FORMATS]
+
+
+def image_metadata(source, size=None):
+    """Return dimensions, format, size and a placeholder color of an image
+
+    Only a reduced-scale decode is done for the placeholder, which is the
+    most common color of a small palette of the image.
+    """
+    from PIL import Image
+
+    with Image.open(source) as img:
+        width, height = img.size
+        image_format = img.format
+        if img.getexif().get(0x0112) in (5, 6, 7, 8):
+            width, height = height, width
+        img.draft('RGB', (64, 64))
+        small = img.convert('RGB')
+        small.thumbnail((64, 64))
+        palette = small.quantize(colors=4)
+        count, index = max(palette.getcolors())
+        red, green, blue = palette.getpalette()[index * 3:index * 3 + 3]
+    if size is None:
+        source.seek(0, os.SEEK_END)
+        size = source.tell()
+    source.seek(0)
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_bytes': size,
+        'image_format': image_format.lower(),
+        'image_placeholder': f'#{red:02x}{green:02x}{blue:02x}',
+    }
+
+
+def render_variants(source):
+    """Resize an image file into every variant and format
+
+    Returns a mapping of (variant, format) to encoded bytes.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+        rendered = {}
+        for variant, size in VARIANTS.items():
+            resized = img.copy()
+            resized.thumbnail(size, Image.LANCZOS)
+            for fmt, (pil_format, ext, save_options) in FORMATS.items():
+                out = resized
+                if pil_format == 'JPEG' and out.mode != 'RGB':
+                    out = out.convert('RGB')
+                buffer = io.BytesIO()
+                out.save(buffer, format=pil_format, **save_options)
+                rendered[(variant, fmt)] = buffer.getvalue()
+    return rendered
+
+
+def generate_variants(recipe_id, source_name, using='default'):
+    """Render and store the variants of a recipe image"""
+    from core.changes import stamp
+    from core.models import Recipe
+
+    variants = {
+        variant: {fmt: variant_name(source_name, variant, fmt)
+                  for fmt in FORMATS}
+        for variant in VARIANTS
+    }
+    if not (is_content_addressed(source_name) and
+            all(default_storage.exists(name)
+                for name in variant_names(source_name))):
+        with default_storage.open(source_name, 'rb') as source:
+            rendered = render_variants(source)
+        for (variant, fmt), content in rendered.items():
+            name = variants[variant][fmt]
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            default_storage.save(name, ContentFile(content))
+    Recipe.objects.using(using).filter(
+        pk=recipe_id, image=source_name
+    ).update(image_variants=variants, **stamp(using))
+    return variants
+
+
+def _run_in_worker(func, *args):
+    """Run func in a pool thread, logging errors and closing connections"""
+    try:
+        return func(*args)
+    except Exception:
+        logger.exception('Image processing failed for %r', args)
+    finally:
+        connections.close_all()
+
+
+def schedule_variants(recipe):
+    """Queue variant generation for a recipe once the upload commits
+
+    Runs on the in-process pool, or on the task queue when
+    IMAGE_PIPELINE_USE_TASKS is set.
+    """
+    using = recipe._state.db or 'default'
+    source_name = recipe.image.name
+
+    def submit():
+        if getattr(settings, 'IMAGE_PIPELINE_USE_TASKS', False):
+            from core.tasks import generate_image_variants
+
+            generate_image_variants.delay(recipe_id=recipe.pk,
+                                          source_name=source_name,
+                                          using=using)
+            return
+        get_executor().submit(
+            _run_in_worker, generate_variants, recipe.pk, source_name, using
+        )
+
+    transaction.on_commit(submit, using=using)
@@ -0,0 +1,61 @@
+# Command to fill in stored metadata for existing recipe images
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import changes, sharding
+from core.images import image_metadata
+from core.models import Recipe
+
+
+class Command(BaseCommand):
+    """Django command to backfill recipe image metadata."""
+    help = ('Read each recipe image that has no stored dimensions yet and '
+            'save its size, format and placeholder color.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def _process(self, alias, recipe_id, name):
+        """Compute and store the metadata of one image"""
+        try:
+            with default_storage.open(name, 'rb') as source:
+                metadata = image_metadata(source)
+            Recipe.objects.using(alias).filter(
+                pk=recipe_id, image=name
+            ).update(**metadata, **changes.stamp(alias))
+            return True
+        except (OSError, SyntaxError, ValueError) as exc:
+            self.stderr.write(f'Recipe {recipe_id} ({name}): {exc}')
+            return False
+        finally:
+            connections[alias].close()
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        done = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for alias in sharding.get_shards():
+                last_id = 0
+                while True:
+                    batch = list(Recipe.objects.using(alias).filter(
+                        image_width__isnull=True, id__gt=last_id,
+                    ).exclude(image='').exclude(image__isnull=True).order_by(
+                        'id'
+                    ).values_list('id', 'image')[:options['batch_size']])
+                    if not batch:
+                        break
+                    last_id = batch[-1][0]
+                    results = list(pool.map(
+                        lambda row: self._process(alias, *row), batch
+                    ))
+                    done += results.count(True)
+                    failed += results.count(False)
+                    self.stdout.write(f'{alias}: {done} images updated.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Backfilled {done} images, {failed} failed.'
+        ))
@@ -0,0 +1,276 @@
+# Command to benchmark the API endpoints against the current database
+import io
+import json
+import math
+import tempfile
+import time
+from contextlib import ExitStack
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Count
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import sharding
+from core.middleware import QueryCounter
+from core.models import Recipe
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAG_URL = reverse('recipe:tag-list')
+TOKEN_URL = reverse('user:token')
+
+
+def recipe_url(recipe_id, action='detail'):
+    return reverse(f'recipe:recipe-{action}', args=[recipe_id])
+
+
+def percentile(values, pct):
+    """Return the nearest-rank percentile of sorted values"""
+    index = max(0, math.ceil(pct / 100 * len(values)) - 1)
+    return values[index]
+
+
+def sample_jpeg(size=(1200, 900)):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (180, 90, 40)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    """Django command to measure API latency, throughput and queries."""
+    help = ('Run each API scenario in-process through the full middleware '
+            'stack as a seeded user and report p50/p95/p99 latency, '
+            'requests per second and queries per request. Changes made '
+            'by the requests are rolled back and uploaded files go to a '
+            'temporary MEDIA_ROOT.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            help='Only run this scenario (repeatable).')
+        parser.add_argument('--email', help='User to run as.')
+        parser.add_argument(
+            '--min-recipes', type=int, default=20,
+            help='Without --email, run as the first user with at least '
+                 'this many recipes.',
+        )
+        parser.add_argument('--password', default='password123')
+        parser.add_argument('--save', metavar='PATH',
+                            help='Write the results as a JSON baseline.')
+        parser.add_argument('--compare', metavar='PATH',
+                            help='Flag regressions against a baseline.')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Allowed relative slowdown before flagging (0.2 = 20%%).',
+        )
+
+    def _find_user(self, email, min_recipes):
+        """Return the benchmark user and their shard"""
+        user_model = get_user_model()
+        if email:
+            user = user_model.objects.filter(email=email).first()
+        else:
+            candidates = [
+                row['user'] for row in (
+                    Recipe.objects.using(alias).values('user').annotate(
+                        recipes=Count('id')
+                    ).filter(recipes__gte=min_recipes).order_by('user')
+                    .first()
+                    for alias in sharding.get_shards()
+                ) if row
+            ]
+            user = user_model.objects.filter(pk__in=candidates).order_by(
+                'pk'
+            ).first()
+        if user is None:
+            raise CommandError('No user to benchmark; run seed_data first.')
+        return user, sharding.shard_for_user(user)
+
+    def _scenarios(self, user, alias, password):
+        """Return {name: (request function, mutates)} for the user"""
+        recipe = Recipe.objects.using(alias).filter(
+            user=user, tags__isnull=False, ingredients__isnull=False
+        ).first() or Recipe.objects.using(alias).filter(user=user).first()
+        if recipe is None:
+            raise CommandError(f'{user.email} has no recipes.')
+        tag = recipe.tags.first()
+        ingredient = recipe.ingredients.first()
+        image = sample_jpeg()
+        new_recipe = {
+            'title': 'Benchmark Stew', 'time_minutes': 30, 'price': '7.50',
+            'tags': [{'name': 'Dinner'}, {'name': 'Benchmark'}],
+            'ingredients': [{'name': 'Salt'}, {'name': 'Lentils'},
+                            {'name': 'Onion'}],
+        }
+
+        scenarios = {
+            'recipe_list': (lambda c: c.get(RECIPE_URL), False),
+            'recipe_detail': (lambda c: c.get(recipe_url(recipe.id)), False),
+            'recipe_create': (
+                lambda c: c.post(RECIPE_URL, new_recipe, format='json'),
+                True,
+            ),
+            'recipe_update': (
+                lambda c: c.patch(recipe_url(recipe.id),
+                                  {'title': 'Renamed', 'tags': [
+                                      {'name': 'Renamed'}]},
+                                  format='json'),
+                True,
+            ),
+            'image_upload': (
+                lambda c: c.post(
+                    recipe_url(recipe.id, 'upload-image'),
+                    {'image': SimpleUploadedFile('bench.jpg', image,
+                                                 'image/jpeg')},
+                    format='multipart',
+                ),
+                True,
+            ),
+            'token': (
+                lambda c: c.post(TOKEN_URL, {'email': user.email,
+                                             'password': password}),
+                True,
+            ),
+            'tags_assigned_only': (
+                lambda c: c.get(TAG_URL, {'assigned_only': 1}), False,
+            ),
+        }
+        if tag is not None:
+            scenarios['recipe_list_by_tag'] = (
+                lambda c: c.get(RECIPE_URL, {'tags': tag.id}), False,
+            )
+        if ingredient is not None:
+            scenarios['recipe_list_by_ingredient'] = (
+                lambda c: c.get(RECIPE_URL, {'ingredients': ingredient.id}),
+                False,
+            )
+        return scenarios
+
+    def _request(self, client, func, mutates, aliases):
+        """Run one request; returns (seconds, queries, status)"""
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            if mutates:
+                for alias in aliases:
+                    stack.enter_context(transaction.atomic(using=alias))
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            start = time.perf_counter()
+            response = func(client)
+            elapsed = time.perf_counter() - start
+            if mutates:
+                for alias in aliases:
+                    transaction.set_rollback(True, using=alias)
+        return elapsed, counter.count, response.status_code
+
+    def _run(self, client, func, mutates, aliases, options):
+        for _ in range(options['warmup']):
+            self._request(client, func, mutates, aliases)
+        timings = []
+        queries = []
+        statuses = set()
+        total_start = time.perf_counter()
+        for _ in range(options['iterations']):
+            elapsed, count, status_code = self._request(
+                client, func, mutates, aliases
+            )
+            timings.append(elapsed)
+            queries.append(count)
+            statuses.add(status_code)
+        total = time.perf_counter() - total_start
+        timings.sort()
+        return {
+            'p50_ms': round(percentile(timings, 50) * 1000, 3),
+            'p95_ms': round(percentile(timings, 95) * 1000, 3),
+            'p99_ms': round(percentile(timings, 99) * 1000, 3),
+            'rps': round(options['iterations'] / total, 1),
+            'queries': max(queries),
+            'status': sorted(statuses),
+        }
+
+    def _regressions(self, results, baseline, tolerance):
+        """Return descriptions of results worse than the baseline"""
+        problems = []
+        for name, result in results.items():
+            base = baseline.get(name)
+            if base is None:
+                continue
+            if result['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+                problems.append(f'{name}: p95 {result["p95_ms"]}ms '
+                                f'(baseline {base["p95_ms"]}ms)')
+            if result['rps'] < base['rps'] * (1 - tolerance):
+                problems.append(f'{name}: {result["rps"]} req/s '
+                                f'(baseline {base["rps"]})')
+            if result['queries'] > base['queries']:
+                problems.append(f'{name}: {result["queries"]} queries '
+                                f'(baseline {base["queries"]})')
+        return problems
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1.')
+        user, alias = self._find_user(options['email'],
+                                      options['min_recipes'])
+        token, created = Token.objects.get_or_create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        scenarios = self._scenarios(user, alias, options['password'])
+        selected = options['scenarios'] or list(scenarios)
+        unknown = set(selected) - set(scenarios)
+        if unknown:
+            raise CommandError(
+                f'Unknown scenarios: {", ".join(sorted(unknown))}. '
+                f'Choose from: {", ".join(scenarios)}.'
+            )
+        aliases = sorted({'default', alias})
+
+        self.stdout.write(f'Benchmarking as {user.email} on {alias}')
+        self.stdout.write(
+            f'{"scenario":28}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+            f'{"req/s":>9}{"queries":>9}'
+        )
+        results = {}
+        # Uploads are rolled back but their files are not; keep them out
+        # of the real MEDIA_ROOT
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(ALLOWED_HOSTS=['testserver'],
+                                  MEDIA_ROOT=media_root):
+            for name in selected:
+                func, mutates = scenarios[name]
+                result = results[name] = self._run(
+                    client, func, mutates, aliases, options
+                )
+                self.stdout.write(
+                    f'{name:28}{result["p50_ms"]:9.2f}'
+                    f'{result["p95_ms"]:9.2f}{result["p99_ms"]:9.2f}'
+                    f'{result["rps"]:9.1f}{result["queries"]:9d}'
+                    f'  HTTP {",".join(map(str, result["status"]))}'
+                )
+
+        if options['save']:
+            with open(options['save'], 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+            self.stdout.write(f'Saved baseline to {options["save"]}')
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            problems = self._regressions(results, baseline,
+                                         options['tolerance'])
+            for problem in problems:
+                self.stdout.write(self.style.ERROR(f'REGRESSION {problem}'))
+            if problems:
+                raise CommandError(
+                    f'{len(problems)} regressions beyond '
+                    f'{options["tolerance"]:.0%} of the baseline.'
+                )
+            self.stdout.write(self.style.SUCCESS('No regressions.'))
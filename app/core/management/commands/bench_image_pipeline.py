@@ -0,0 +1,56 @@
+# Command to benchmark recipe image variant generation
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from core.images import render_variants
+
+
+class Command(BaseCommand):
+    """Django command to measure image processing throughput."""
+    help = 'Render variants for synthetic photos and report images/second.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=40)
+        parser.add_argument('--width', type=int, default=3000)
+        parser.add_argument('--height', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+
+    def _make_source(self, width, height):
+        """Return JPEG bytes for a noisy photo-like image"""
+        from PIL import Image
+
+        img = Image.effect_noise((width, height), 64).convert('RGB')
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=90)
+        return buffer.getvalue()
+
+    def _run(self, source, count, workers):
+        """Return images/second processing count copies of source"""
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(lambda _: render_variants(io.BytesIO(source)),
+                          range(count)))
+        return count / (time.perf_counter() - start)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        source = self._make_source(options['width'], options['height'])
+        workers = options['workers']
+        count = options['images']
+        self.stdout.write(
+            f"Source {options['width']}x{options['height']} "
+            f"({len(source) // 1024} KiB), {count} images"
+        )
+        render_variants(io.BytesIO(source))
+
+        single = self._run(source, count, 1)
+        pooled = self._run(source, count, workers)
+        self.stdout.write(f'1 worker:  {single:8.2f} images/s')
+        self.stdout.write(
+            f'{workers} workers: {pooled:8.2f} images/s '
+            f'({pooled / workers:.2f} images/s per core)'
+        )
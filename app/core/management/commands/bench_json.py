@@ -0,0 +1,85 @@
+# Command to benchmark JSON and MessagePack encoding of recipe payloads
+import io
+import time
+from collections import OrderedDict
+
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.parsers import FastJSONParser, MessagePackParser
+from core.renderers import FastJSONRenderer, MessagePackRenderer, orjson
+
+
+def recipe_payload(count):
+    """Return a recipe detail list as the serializers would produce it"""
+    return [OrderedDict([
+        ('id', pk),
+        ('title', f'Spicy Lentil Soup {pk}'),
+        ('time_minutes', 30 + pk % 90),
+        ('price', f'{pk % 100}.{pk % 100:02d}'),
+        ('link', f'https://example.com/recipes/{pk}/'),
+        ('tags', [OrderedDict([('id', pk * 3 + i), ('name', name)])
+                  for i, name in enumerate(['Vegan', 'Dinner', 'Quick'])]),
+        ('ingredients', [OrderedDict([('id', pk * 6 + i), ('name', name)])
+                         for i, name in enumerate(
+                             ['Lentils', 'Onion', 'Garlic', 'Cumin',
+                              'Tomato', 'Crème fraîche'])]),
+        ('description', 'Simmer everything for half an hour.'),
+        ('image', f'http://testserver/static/media/uploads/recipe/{pk}.jpg'),
+        ('image_variants', OrderedDict([
+            ('thumbnail', f'http://testserver/static/media/{pk}_t.webp'),
+            ('medium', f'http://testserver/static/media/{pk}_m.webp'),
+        ])),
+        ('image_width', 1200),
+        ('image_height', 900),
+        ('image_bytes', 182044),
+        ('image_format', 'JPEG'),
+        ('image_placeholder', '#b45a28'),
+    ]) for pk in range(1, count + 1)]
+
+
+class Command(BaseCommand):
+    """Django command to compare JSON and MessagePack encoding."""
+    help = ('Render and parse a list of recipes with DRF\'s JSON classes, '
+            'the orjson-backed ones and MessagePack, and report the '
+            'payload size and time per call.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def _time(self, func, iterations):
+        """Return the best time of func in milliseconds"""
+        best = float('inf')
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+        return best * 1000
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        data = recipe_payload(options['recipes'])
+        iterations = options['iterations']
+        body = JSONRenderer().render(data)
+        if FastJSONRenderer().render(data) != body:
+            self.stderr.write(self.style.ERROR(
+                'FastJSONRenderer output differs from JSONRenderer!'
+            ))
+
+        self.stdout.write(f'{options["recipes"]} recipes, '
+                          f'orjson {"installed" if orjson else "missing"}')
+        for label, renderer, parser in (
+            ('json (DRF)', JSONRenderer(), JSONParser()),
+            ('fast json', FastJSONRenderer(), FastJSONParser()),
+            ('msgpack', MessagePackRenderer(), MessagePackParser()),
+        ):
+            encoded = renderer.render(data)
+            render_ms = self._time(lambda: renderer.render(data), iterations)
+            parse_ms = self._time(
+                lambda: parser.parse(io.BytesIO(encoded)), iterations
+            )
+            self.stdout.write(f'{label:12} {len(encoded):9d} bytes   '
+                              f'render {render_ms:8.2f} ms   '
+                              f'parse {parse_ms:8.2f} ms')
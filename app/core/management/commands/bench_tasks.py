@@ -0,0 +1,39 @@
+# Command to benchmark task queue throughput
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from core.models import Task
+from core.tasks import noop
+
+
+class Command(BaseCommand):
+    """Django command to measure tasks processed per second."""
+    help = 'Enqueue no-op tasks and report enqueue and processing rates.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=10000)
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        count = options['tasks']
+        start = time.perf_counter()
+        Task.objects.bulk_create(
+            [Task(name=noop.task_name) for _ in range(count)],
+            batch_size=1000,
+        )
+        enqueue_rate = count / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        call_command('run_worker', burst=True,
+                     concurrency=options['concurrency'],
+                     batch_size=options['batch_size'],
+                     stdout=self.stdout)
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(f'Enqueued: {enqueue_rate:10.0f} tasks/s (bulk)')
+        self.stdout.write(f'Processed: {count / elapsed:9.0f} tasks/s '
+                          f'with {options["concurrency"]} threads')
@@ -0,0 +1,41 @@
+# Command to pre-generate the OpenAPI schema served by /api/schema/
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from drf_spectacular.settings import spectacular_settings
+
+from core import schema
+
+
+class Command(BaseCommand):
+    """Django command to build the cached OpenAPI schema."""
+    help = ('Generate the OpenAPI schema for the current code version and '
+            'store it in SCHEMA_CACHE_FILE, so workers serve it without '
+            'generating it.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.SCHEMA_CACHE_FILE,
+                            help='Defaults to SCHEMA_CACHE_FILE.')
+        parser.add_argument('--lang', action='append', default=[],
+                            help='Also build the ?lang= variant for this '
+                                 'language (repeatable).')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if not options['output']:
+            raise CommandError('Set SCHEMA_CACHE_FILE or pass --output.')
+        langs = [None]
+        for lang in options['lang']:
+            supported = schema.supported_lang(lang)
+            if supported is None:
+                raise CommandError(f'Unsupported or default language {lang}.')
+            langs.append(supported)
+        generator_class = spectacular_settings.DEFAULT_GENERATOR_CLASS
+        schemas = {
+            lang or '': schema.generate(generator_class, lang=lang)
+            for lang in langs
+        }
+        schema.write_file(options['output'], schemas)
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote the schema for version {schema.code_version()} to '
+            f'{options["output"]}.'
+        ))
@@ -0,0 +1,67 @@
+# Command to delete users and their data in chunks
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core import deletion
+from core.models import UserDeletion
+from core.tasks import delete_user_data
+
+
+class Command(BaseCommand):
+    """Django command to delete users in the background."""
+    help = ('Deactivate a user and delete their data in chunks on the task '
+            'queue (or right here with --sync), list deletions with '
+            '--status, or re-queue unfinished ones with --resume.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', nargs='?')
+        parser.add_argument('--sync', action='store_true',
+                            help='Delete in this process, reporting '
+                                 'progress.')
+        parser.add_argument('--status', action='store_true',
+                            help='List deletions and their progress.')
+        parser.add_argument('--resume', action='store_true',
+                            help='Queue every unfinished deletion that has '
+                                 'no queued or running task.')
+        parser.add_argument('--chunk-size', type=int,
+                            default=settings.USER_DELETION_CHUNK_SIZE)
+
+    def _report(self, progress):
+        counts = ', '.join(f'{name} {count}'
+                           for name, count in progress.deleted.items())
+        self.stdout.write(f'{progress.email}: {progress.stage} '
+                          f'({counts or "nothing deleted yet"})')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        unfinished = UserDeletion.objects.exclude(stage=UserDeletion.DONE)
+        if options['status']:
+            for progress in UserDeletion.objects.order_by('created_at'):
+                self._report(progress)
+            return
+        if options['resume']:
+            stalled = [progress for progress in unfinished
+                       if not deletion.has_pending_task(progress)]
+            for progress in stalled:
+                delete_user_data.delay(deletion_id=progress.pk)
+            self.stdout.write(f'Queued {len(stalled)} deletions.')
+            return
+        if not options['email']:
+            raise CommandError('Give an email, --status or --resume.')
+
+        progress = unfinished.filter(email=options['email']).first()
+        if progress is None:
+            try:
+                user = get_user_model().objects.using('default').get(
+                    email=options['email']
+                )
+            except get_user_model().DoesNotExist:
+                raise CommandError(f'No user with email {options["email"]}.')
+            progress = deletion.request_deletion(user)
+        if not options['sync']:
+            self.stdout.write(f'Queued the deletion of {progress.email}.')
+            return
+        deletion.run(progress, chunk_size=options['chunk_size'],
+                     progress=self._report)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {progress.email}.'))
@@ -0,0 +1,159 @@
+# Command to move one user's recipe data to another database shard
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Max
+
+from core import changes, sharding
+from core.models import Recipe, Tag, Ingredient, Tombstone, UserShard
+
+
+# Models copied for a user, parents first, with the lookup of their user
+MOVED_MODELS = (
+    (Tag, 'user'),
+    (Ingredient, 'user'),
+    (Recipe, 'user'),
+    (Recipe.tags.through, 'recipe__user'),
+    (Recipe.ingredients.through, 'recipe__user'),
+    (Tombstone, 'user'),
+)
+
+
+class Command(BaseCommand):
+    """Django command to move a user between shards."""
+    help = ('Copy a user\'s recipes, tags and ingredients to another shard, '
+            'switch the directory and remove the old copy. Reads keep '
+            'working during the move; writes get a 503 until it finishes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+        parser.add_argument('target')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--grace', type=float, default=5,
+            help='Seconds to wait after blocking writes so that requests '
+                 'already writing to the old shard can finish.',
+        )
+
+    def _copy(self, model, source, target, filters, batch_size):
+        """Copy rows matching filters from source to target in batches"""
+        rows = model.objects.using(source).filter(**filters).values()
+        batch = []
+        copied = 0
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(model(**row))
+            if len(batch) >= batch_size:
+                model.objects.using(target).bulk_create(batch)
+                copied += len(batch)
+                batch = []
+        if batch:
+            model.objects.using(target).bulk_create(batch)
+            copied += len(batch)
+        return copied
+
+    def _check_collisions(self, user, source, target, batch_size):
+        """Refuse to move rows whose ids are already taken on the target"""
+        for model, lookup in MOVED_MODELS:
+            ids = list(model.objects.using(source).filter(
+                **{lookup: user}
+            ).values_list('pk', flat=True))
+            for start in range(0, len(ids), batch_size):
+                taken = list(model.objects.using(target).filter(
+                    pk__in=ids[start:start + batch_size]
+                ).values_list('pk', flat=True)[:5])
+                if taken:
+                    raise CommandError(
+                        f'{model._meta.model_name} ids {taken} already '
+                        f'exist on "{target}"; nothing was moved.'
+                    )
+
+    def _fingerprint(self, user, alias):
+        """Return row counts and latest changes of the user on a shard"""
+        fingerprint = []
+        for model, lookup in MOVED_MODELS:
+            rows = model.objects.using(alias).filter(**{lookup: user})
+            aggregates = {'count': Count('pk')}
+            if hasattr(model, 'change_seq'):
+                aggregates['seq'] = Max('change_seq')
+            fingerprint.append(rows.aggregate(**aggregates))
+        return fingerprint
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        target = options['target']
+        batch_size = options['batch_size']
+        if target not in sharding.get_shards():
+            raise CommandError(f'Unknown shard "{target}".')
+        try:
+            user = get_user_model().objects.using('default').get(
+                email=options['email']
+            )
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user with email {options["email"]}.')
+
+        assignment = sharding.get_assignment(user)
+        source = assignment.alias
+        if source == target:
+            self.stdout.write(f'User already on shard "{target}".')
+            return
+
+        self._check_collisions(user, source, target, batch_size)
+        UserShard.objects.using('default').filter(pk=user.pk).update(
+            is_moving=True
+        )
+        try:
+            # Requests that passed the is_moving check may still be writing
+            time.sleep(options['grace'])
+            sharding.mirror_user(user, target)
+            recipe_ids = Recipe.objects.using(source).filter(
+                user=user
+            ).values_list('id', flat=True)
+            before = self._fingerprint(user, source)
+            with transaction.atomic(using=target):
+                for model, lookup in MOVED_MODELS:
+                    copied = self._copy(model, source, target,
+                                        {lookup: user}, batch_size)
+                    self.stdout.write(
+                        f'Copied {copied} {model._meta.model_name} rows.'
+                    )
+                if self._fingerprint(user, source) != before:
+                    raise CommandError(
+                        'The user\'s data changed during the copy; nothing '
+                        'was moved, please retry.'
+                    )
+                sharding.reserve_id_range(target, sharding.sharded_models())
+                changes.advance_sequence(target, max(
+                    model.objects.using(target).filter(user=user).aggregate(
+                        m=Max('change_seq')
+                    )['m'] or 0
+                    for model in (Recipe, Tag, Ingredient, Tombstone)
+                ))
+            UserShard.objects.using('default').filter(pk=user.pk).update(
+                alias=target
+            )
+            if self._fingerprint(user, source) != before:
+                raise CommandError(
+                    f'The user\'s data on "{source}" changed while it was '
+                    f'switched to "{target}"; the old copy was kept for '
+                    f'reconciliation.'
+                )
+            with transaction.atomic(using=source):
+                Recipe.objects.using(source).filter(
+                    id__in=list(recipe_ids)
+                ).delete()
+                Tag.objects.using(source).filter(user=user).delete()
+                Ingredient.objects.using(source).filter(user=user).delete()
+                Tombstone.objects.using(source).filter(user=user).delete()
+                if source != 'default':
+                    get_user_model().objects.using(source).filter(
+                        pk=user.pk
+                    ).delete()
+        finally:
+            UserShard.objects.using('default').filter(pk=user.pk).update(
+                is_moving=False
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {user.email} from "{source}" to "{target}".'
+        ))
@@ -0,0 +1,80 @@
+# Command to profile the cold start of a server process
+import json
+import os
+import subprocess
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def parse_importtime(output):
+    """Return [(module, self_us, cumulative_us)] from -X importtime"""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or '[us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+class Command(BaseCommand):
+    """Django command to report import and app loading times."""
+    help = ('Start Django in a fresh interpreter with -X importtime and '
+            'report the slowest imports, the time per top-level package '
+            'and the time each app and startup phase takes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=15)
+        parser.add_argument('--api-only', action='store_true',
+                            help='Profile an API_ONLY=1 process.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        env = dict(os.environ)
+        if options['api_only']:
+            env['API_ONLY'] = '1'
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-m', 'core.startup'],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f'Startup failed:\n{result.stderr[-2000:]}')
+        timings = json.loads(result.stdout)
+        modules = parse_importtime(result.stderr)
+        limit = options['limit']
+
+        self.stdout.write(f'Django startup: {timings["total"] * 1000:.0f} ms')
+        for phase, seconds in timings['phases'].items():
+            self.stdout.write(f'  {phase:20}{seconds * 1000:8.1f} ms')
+
+        self.stdout.write('\nApps (import / models / ready, ms):')
+        for label, steps in sorted(timings['apps'].items(),
+                                   key=lambda item: -sum(item[1].values())):
+            self.stdout.write(
+                f'  {label:20}{steps.get("import", 0) * 1000:8.1f}'
+                f'{steps.get("models", 0) * 1000:8.1f}'
+                f'{steps.get("ready", 0) * 1000:8.1f}'
+            )
+
+        packages = Counter()
+        for name, self_us, cumulative_us in modules:
+            packages[name.split('.')[0]] += self_us
+        self.stdout.write(f'\nImport time by package ({len(modules)} '
+                          f'modules, {sum(packages.values()) / 1000:.0f} '
+                          f'ms):')
+        for package, self_us in packages.most_common(limit):
+            self.stdout.write(f'  {package:40}{self_us / 1000:8.1f} ms')
+
+        self.stdout.write('\nSlowest imports (cumulative):')
+        for name, self_us, cumulative_us in sorted(
+                modules, key=lambda module: -module[2])[:limit]:
+            self.stdout.write(f'  {name:40}{cumulative_us / 1000:8.1f} ms')
+
+        if timings['loaded']:
+            self.stdout.write(self.style.WARNING(
+                f'\nLoaded at startup although used lazily: '
+                f'{", ".join(timings["loaded"])}'
+            ))
@@ -0,0 +1,84 @@
+# Command to run queued background tasks
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.taskqueue import Worker
+
+
+class Command(BaseCommand):
+    """Django command to process the task queue."""
+    help = 'Claim and run queued tasks until stopped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Number of worker threads.')
+        parser.add_argument('--batch-size', type=int, default=10,
+                            help='Tasks claimed per query.')
+        parser.add_argument('--visibility-timeout', type=int, default=300,
+                            help='Seconds before a claimed task is retried '
+                                 'if its worker disappears.')
+        parser.add_argument('--retry-delay', type=float, default=5,
+                            help='Base delay of the retry backoff.')
+        parser.add_argument('--poll-interval', type=float, default=1,
+                            help='Seconds to sleep when the queue is empty.')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once the queue is empty.')
+
+    def _loop(self, worker, options):
+        """Run batches until stopped (or the queue drains in burst mode)"""
+        while not self.stopping.is_set():
+            processed = worker.run_batch()
+            with self.lock:
+                self.processed += processed
+            if not processed:
+                if options['burst']:
+                    return
+                self.stopping.wait(options['poll_interval'])
+
+    def _thread_loop(self, worker, options):
+        try:
+            self._loop(worker, options)
+        finally:
+            connections.close_all()
+
+    def _stop(self, signum, frame):
+        self.stdout.write('Stopping after the current batch...')
+        self.stopping.set()
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.processed = 0
+        previous_handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                previous_handlers[signum] = signal.signal(signum, self._stop)
+        worker = Worker(
+            visibility_timeout=options['visibility_timeout'],
+            batch_size=options['batch_size'],
+            retry_delay=options['retry_delay'],
+        )
+        try:
+            if options['concurrency'] == 1:
+                self._loop(worker, options)
+            else:
+                threads = [
+                    threading.Thread(target=self._thread_loop,
+                                     args=(worker, options),
+                                     name=f'task-worker-{i}', daemon=True)
+                    for i in range(options['concurrency'])
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {self.processed} tasks.'
+        ))
@@ -0,0 +1,244 @@
+# Command to fill the database with generated users and recipes
+import io
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.db.models import Max
+
+from core import changes, sharding
+from core.models import Ingredient, Recipe, Tag, UserShard
+
+ADJECTIVES = ['Spicy', 'Smoky', 'Creamy', 'Crispy', 'Quick', 'Rustic',
+              'Zesty', 'Sweet', 'Garlic', 'Herby', 'Golden', 'Hearty']
+DISHES = ['Soup', 'Stew', 'Curry', 'Salad', 'Pasta', 'Risotto', 'Tacos',
+          'Pie', 'Bowl', 'Noodles', 'Tart', 'Bake', 'Skewers', 'Pancakes']
+TAGS = ['Vegan', 'Vegetarian', 'Dessert', 'Breakfast', 'Dinner', 'Lunch',
+        'Quick', 'Gluten Free', 'Spicy', 'Comfort', 'Healthy', 'Party']
+INGREDIENTS = ['Salt', 'Pepper', 'Garlic', 'Onion', 'Tomato', 'Rice',
+               'Flour', 'Butter', 'Egg', 'Milk', 'Chicken', 'Lentils',
+               'Basil', 'Lemon', 'Ginger', 'Chili', 'Potato', 'Carrot']
+
+
+def _copy_value(value):
+    """Format a value for COPY ... FROM STDIN in text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n'))
+
+
+class Command(BaseCommand):
+    """Django command to generate a benchmark dataset."""
+    help = ('Create users with a skewed number of recipes, tags and '
+            'ingredients. The same --seed always yields the same data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=float, default=10,
+                            help='Mean recipes per regular user.')
+        parser.add_argument('--tags', type=float, default=8,
+                            help='Mean tags per regular user.')
+        parser.add_argument('--ingredients', type=float, default=25,
+                            help='Mean ingredients per regular user.')
+        parser.add_argument('--tags-per-recipe', type=float, default=2)
+        parser.add_argument('--ingredients-per-recipe', type=float,
+                            default=6)
+        parser.add_argument(
+            '--power-users', type=float, default=0.01,
+            help='Share of users with --power-factor times more recipes.',
+        )
+        parser.add_argument('--power-factor', type=float, default=100)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--password', default='password123')
+        parser.add_argument('--batch-size', type=int, default=50000)
+
+    def _insert(self, alias, table, columns, rows):
+        """Insert rows with COPY on PostgreSQL, executemany elsewhere"""
+        if not rows:
+            return
+        connection = connections[alias]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                data = io.StringIO(''.join(
+                    '\t'.join(_copy_value(value) for value in row) + '\n'
+                    for row in rows
+                ))
+                quote = connection.ops.quote_name
+                cursor.copy_expert(
+                    f'COPY {quote(table)} '
+                    f'({", ".join(quote(c) for c in columns)}) FROM STDIN',
+                    data,
+                )
+            else:
+                placeholders = ', '.join(['%s'] * len(columns))
+                cursor.executemany(
+                    f'INSERT INTO {table} ({", ".join(columns)}) '
+                    f'VALUES ({placeholders})',
+                    rows,
+                )
+
+    def _flush(self, alias, buffers, force=False):
+        """Write buffered rows once there are enough of them"""
+        if not force and sum(map(len, buffers.values())) < self.batch_size:
+            return
+        with transaction.atomic(using=alias):
+            for (table, columns), rows in buffers.items():
+                self._insert(alias, table, columns, rows)
+                self.counts[table] = self.counts.get(table, 0) + len(rows)
+                rows.clear()
+
+    def _columns(self, model, *names):
+        return (model._meta.db_table,
+                tuple(model._meta.get_field(name).column for name in names))
+
+    def _count(self, mean, scale=1):
+        """Draw a skewed, non-negative count with the given mean"""
+        return int(self.rng.expovariate(1 / (mean * scale)) + 0.5)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options['users'] < 1:
+            raise CommandError('--users must be at least 1.')
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.counts = {}
+        start = time.perf_counter()
+
+        user_model = get_user_model()
+        password = make_password(options['password'])
+        first_user = (user_model.objects.aggregate(m=Max('pk'))['m'] or 0) + 1
+        users = list(range(first_user, first_user + options['users']))
+        shards = sharding.get_shards()
+        by_alias = {}
+        for user_id in users:
+            alias = sharding.hash_shard(user_id, shards)
+            by_alias.setdefault(alias, []).append(user_id)
+
+        user_columns = self._columns(
+            user_model, 'id', 'email', 'name', 'password', 'is_active',
+            'is_staff', 'is_superuser',
+        )
+        user_rows = [
+            (user_id, f'seed{user_id}@example.com', f'Seed User {user_id}',
+             password, True, False, False)
+            for user_id in users
+        ]
+        self._flush('default', {user_columns: list(user_rows)}, force=True)
+        if len(shards) > 1:
+            for alias, user_ids in by_alias.items():
+                if alias != 'default':
+                    on_shard = set(user_ids)
+                    shard_users = {user_columns: [
+                        row for row in user_rows if row[0] in on_shard
+                    ]}
+                    self._flush(alias, shard_users, force=True)
+            UserShard.objects.bulk_create(
+                UserShard(user_id=user_id, alias=alias)
+                for alias, user_ids in by_alias.items()
+                for user_id in user_ids
+            )
+
+        for alias, user_ids in by_alias.items():
+            sharding.reserve_id_range(alias, sharding.sharded_models())
+            self._seed_shard(alias, user_ids, options)
+            sharding.reserve_id_range(alias, sharding.sharded_models())
+        self._reset_sequences('default', [user_model])
+
+        elapsed = time.perf_counter() - start
+        for table, count in sorted(self.counts.items()):
+            self.stdout.write(f'{table}: {count} rows')
+        total = sum(self.counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {total} rows in {elapsed:.1f}s '
+            f'({total / elapsed:.0f} rows/s).'
+        ))
+
+    def _seed_shard(self, alias, user_ids, options):
+        """Generate the tags, ingredients and recipes of users on a shard"""
+        next_id = {model: sharding.next_id(alias, model)
+                   for model in (Recipe, Tag, Ingredient)}
+        first_seq, changed_at = changes.next_change(alias)
+        seq = first_seq
+        changed_at = connections[alias].ops.adapt_datetimefield_value(
+            changed_at
+        )
+        tag_columns = self._columns(Tag, 'id', 'name', 'user', 'change_seq',
+                                    'changed_at')
+        ingredient_columns = self._columns(Ingredient, 'id', 'name', 'user',
+                                           'change_seq', 'changed_at')
+        recipe_columns = self._columns(
+            Recipe, 'id', 'user', 'title', 'description', 'time_minutes',
+            'price', 'link', 'image_variants', 'image_format',
+            'image_placeholder', 'change_seq', 'changed_at',
+        )
+        recipe_tags = self._columns(Recipe.tags.through, 'recipe', 'tag')
+        recipe_ingredients = self._columns(
+            Recipe.ingredients.through, 'recipe', 'ingredient'
+        )
+        buffers = {columns: [] for columns in (
+            tag_columns, ingredient_columns, recipe_columns, recipe_tags,
+            recipe_ingredients,
+        )}
+
+        for user_id in user_ids:
+            is_power = self.rng.random() < options['power_users']
+            scale = options['power_factor'] if is_power else 1
+            owned = {}
+            for model, columns, names, mean in (
+                (Tag, tag_columns, TAGS, options['tags']),
+                (Ingredient, ingredient_columns, INGREDIENTS,
+                 options['ingredients']),
+            ):
+                count = max(1, self._count(mean, scale ** 0.5))
+                first = next_id[model]
+                next_id[model] += count
+                owned[model] = range(first, first + count)
+                buffers[columns].extend(
+                    (pk, f'{names[pk % len(names)]} {pk}', user_id, seq + i,
+                     changed_at)
+                    for i, pk in enumerate(owned[model])
+                )
+                seq += count
+
+            for _ in range(self._count(options['recipes'], scale)):
+                recipe_id = next_id[Recipe]
+                next_id[Recipe] += 1
+                buffers[recipe_columns].append((
+                    recipe_id, user_id,
+                    f'{self.rng.choice(ADJECTIVES)} '
+                    f'{self.rng.choice(DISHES)}',
+                    '', self.rng.randint(5, 240),
+                    f'{self.rng.randint(100, 9999) / 100:.2f}',
+                    '', '{}', '', '', seq, changed_at,
+                ))
+                seq += 1
+                for model, columns, mean in (
+                    (Tag, recipe_tags, options['tags_per_recipe']),
+                    (Ingredient, recipe_ingredients,
+                     options['ingredients_per_recipe']),
+                ):
+                    choices = owned[model]
+                    count = min(len(choices), self._count(mean))
+                    buffers[columns].extend(
+                        (recipe_id, pk)
+                        for pk in self.rng.sample(choices, count)
+                    )
+            self._flush(alias, buffers)
+        self._flush(alias, buffers, force=True)
+        if seq > first_seq:
+            changes.advance_sequence(alias, seq - 1)
+
+    def _reset_sequences(self, alias, models):
+        """Move id sequences past the explicitly inserted ids"""
+        connection = connections[alias]
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
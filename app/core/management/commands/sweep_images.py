@@ -0,0 +1,66 @@
+# Command to delete recipe image files no recipe refers to anymore
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core import sharding
+from core.images import variant_names
+from core.models import ImageBlob, Recipe
+
+
+class Command(BaseCommand):
+    """Django command to garbage-collect unreferenced images."""
+    help = ('Delete stored images (and their variants) whose reference '
+            'count dropped to zero, in batches.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--grace', type=int,
+            default=settings.IMAGE_SWEEP_GRACE_SECONDS,
+            help='Skip images released less than this many seconds ago.',
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def _references(self, name):
+        """Count recipes on every shard that still use the image"""
+        return sum(
+            Recipe.objects.using(alias).filter(image=name).count()
+            for alias in sharding.get_shards()
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        cutoff = timezone.now() - timedelta(seconds=options['grace'])
+        deleted = 0
+        last_id = 0
+        while True:
+            batch = list(ImageBlob.objects.filter(
+                ref_count__lte=0, updated_at__lt=cutoff, id__gt=last_id,
+            ).order_by('id')[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            for blob in batch:
+                with transaction.atomic():
+                    blob = ImageBlob.objects.select_for_update().filter(
+                        pk=blob.pk, ref_count__lte=0
+                    ).first()
+                    if blob is None:
+                        continue
+                    references = self._references(blob.name)
+                    if references:
+                        blob.ref_count = references
+                        blob.save(update_fields=['ref_count'])
+                        continue
+                    if not options['dry_run']:
+                        for name in [blob.name] + variant_names(blob.name):
+                            default_storage.delete(name)
+                        blob.delete()
+                    deleted += 1
+            self.stdout.write(f'Swept {deleted} images so far.')
+        self.stdout.write(self.style.SUCCESS(f'Swept {deleted} images.'))
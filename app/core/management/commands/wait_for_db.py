@@ -1,6 +1,12 @@
 # Command to wait for database before starting the Django services
+import random
 import time
-from django.core.management.base import BaseCommand
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.migrations.executor import MigrationExecutor
 from psycopg2 import OperationalError as Psycopg2OpError
 from django.db.utils import OperationalError
 
@@ -8,15 +14,112 @@ from django.db.utils import OperationalError
 class Command(BaseCommand):
     """Django command to wait for database."""
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', action='append', dest='databases',
+            help='Database alias to wait for; repeatable. '
+                 'Defaults to every configured database.',
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=60,
+            help='Give up and exit non-zero after this many seconds.',
+        )
+        parser.add_argument(
+            '--connect-timeout', type=int, default=3,
+            help='Seconds allowed for each connection attempt.',
+        )
+        parser.add_argument(
+            '--max-delay', type=float, default=5,
+            help='Upper bound for the backoff between attempts.',
+        )
+        parser.add_argument(
+            '--migrations', action='store_true',
+            help='Also wait until all migrations are applied.',
+        )
+
+    def _set_connect_timeout(self, aliases, seconds):
+        """Apply a per-attempt connect timeout, returning the old options"""
+        previous = {}
+        for alias in aliases:
+            settings_dict = connections[alias].settings_dict
+            if 'postgresql' not in settings_dict['ENGINE']:
+                continue
+            options = settings_dict.setdefault('OPTIONS', {})
+            previous[alias] = options.get('connect_timeout')
+            options['connect_timeout'] = seconds
+        return previous
+
+    def _restore_connect_timeout(self, previous):
+        """Undo _set_connect_timeout"""
+        for alias, value in previous.items():
+            options = connections[alias].settings_dict['OPTIONS']
+            if value is None:
+                options.pop('connect_timeout', None)
+            else:
+                options['connect_timeout'] = value
+
+    def _pending_migrations(self, alias):
+        """Return True if the database has unapplied migrations"""
+        executor = MigrationExecutor(connections[alias])
+        targets = executor.loader.graph.leaf_nodes()
+        return bool(executor.migration_plan(targets))
+
+    def _probe(self, alias):
+        """Return None if the database is ready, else the reason why not"""
+        try:
+            self.check(databases=[alias])
+            if self.wait_migrations and self._pending_migrations(alias):
+                return 'migrations pending'
+            return None
+        except (Psycopg2OpError, OperationalError) as exc:
+            return str(exc).strip() or exc.__class__.__name__
+        finally:
+            connections[alias].close()
+
     def handle(self, *args, **options):
         """Entrypoint for command."""
         self.stdout.write("wait for database...")
-        db_up = False
-        while db_up is False:
-            try:
-                self.check(databases=['default'])
-                db_up = True
-            except (Psycopg2OpError, OperationalError):
-                self.stdout.write("Database unavailable.waiting for 1 second.")
-                time.sleep(1)
+        aliases = options['databases'] or list(settings.DATABASES)
+        unknown = set(aliases) - set(settings.DATABASES)
+        if unknown:
+            raise CommandError(
+                f"Unknown database alias: {', '.join(sorted(unknown))}"
+            )
+        self.wait_migrations = options['migrations']
+        deadline = time.monotonic() + options['timeout']
+        previous = self._set_connect_timeout(aliases,
+                                             options['connect_timeout'])
+        pending = list(aliases)
+        attempt = 0
+        try:
+            with ThreadPoolExecutor(max_workers=len(aliases)) as pool:
+                while True:
+                    results = pool.map(self._probe, pending)
+                    failures = {
+                        alias: reason
+                        for alias, reason in zip(pending, results)
+                        if reason is not None
+                    }
+                    pending = list(failures)
+                    if not pending:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise CommandError(
+                            'Gave up waiting for database: ' + ', '.join(
+                                f'{alias} ({reason})'
+                                for alias, reason in failures.items()
+                            ),
+                            returncode=1,
+                        )
+                    delay = min(options['max_delay'], 0.1 * 2 ** attempt)
+                    delay = min(random.uniform(delay / 2, delay), remaining)
+                    self.stdout.write(
+                        f"Database unavailable ({', '.join(pending)}). "
+                        f"waiting for {delay:.2f} seconds."
+                    )
+                    time.sleep(delay)
+                    attempt += 1
+        finally:
+            self._restore_connect_timeout(previous)
         self.stdout.write(self.style.SUCCESS('Database available'))
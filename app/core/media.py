@@ -0,0 +1,51 @@
+"""
+Media file delivery.
+
+Python only checks access; the bytes are sent by the front proxy through
+X-Accel-Redirect (nginx) or X-Sendfile (Apache, lighttpd) when
+MEDIA_SENDFILE_BACKEND is set. Without a proxy a FileResponse is returned,
+which WSGI servers hand to os.sendfile through wsgi.file_wrapper.
+"""
+import mimetypes
+import os
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.http import quote_etag
+
+from core.storage import is_content_addressed
+
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'private, max-age=300'
+
+
+def serve_file(request, name, content_type=None, immutable=None):
+    """Return a response delivering a stored media file"""
+    path = default_storage.path(name)
+    if not os.path.isfile(path):
+        raise Http404('File not found.')
+    if immutable is None:
+        immutable = is_content_addressed(name)
+    etag = quote_etag(os.path.basename(name) if immutable else
+                      f'{os.path.getmtime(path):.0f}-{os.path.getsize(path)}')
+    content_type = (content_type or mimetypes.guess_type(name)[0] or
+                    'application/octet-stream')
+
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        response = HttpResponse(status=304)
+    elif settings.MEDIA_SENDFILE_BACKEND == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = (settings.MEDIA_ACCEL_PREFIX +
+                                        quote(name))
+    elif settings.MEDIA_SENDFILE_BACKEND == 'sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+
+    response['ETag'] = etag
+    response['Cache-Control'] = (IMMUTABLE_CACHE_CONTROL if immutable
+                                 else DEFAULT_CACHE_CONTROL)
+    return response
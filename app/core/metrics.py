@@ -0,0 +1,202 @@
+"""
+Per-route request metrics in Prometheus text format.
+
+Each process keeps its histograms in memory. With METRICS_DIR set, every
+process also writes a snapshot to its own file there from a timer thread
+every METRICS_FLUSH_SECONDS, so an idle worker still reports its last
+requests, and the metrics endpoint adds up the files of all pre-forked
+workers. Files are named by process id; on its first request a process
+removes its own file and those of processes that are no longer running,
+so restarts do not count old totals. A forked child gets empty
+histograms and starts its own timer, so workers forked from a preloaded
+master do not overwrite each other's files.
+"""
+import bisect
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+HISTOGRAMS = {
+    'http_request_duration_seconds': (
+        'Time spent handling the request.',
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    ),
+    'http_request_db_queries': (
+        'Database queries run by the request.',
+        (0, 1, 2, 5, 10, 20, 50, 100),
+    ),
+    'http_response_size_bytes': (
+        'Size of the response body.',
+        (100, 1000, 10000, 100000, 1000000, 10000000),
+    ),
+}
+
+_lock = threading.Lock()
+_data = {}
+_process = {}
+_SNAPSHOT_RE = re.compile(r'^metrics_(\d+)\.json$')
+
+
+def _start_process():
+    """Give this process its own id and empty metrics"""
+    _data.clear()
+    _process['id'] = str(os.getpid())
+    _process['started'] = False
+
+
+_start_process()
+os.register_at_fork(after_in_child=_start_process)
+
+
+def observe(name, labels, value):
+    """Add one observation to a histogram"""
+    buckets = HISTOGRAMS[name][1]
+    key = json.dumps([name, sorted(labels.items())])
+    index = bisect.bisect_left(buckets, value)
+    with _lock:
+        series = _data.get(key)
+        if series is None:
+            series = _data[key] = [0] * (len(buckets) + 1) + [0.0, 0]
+        series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+
+def record_request(view, method, status, duration, queries, size):
+    """Record the metrics of one request"""
+    _ensure_started()
+    labels = {'view': view, 'method': method, 'status': str(status)}
+    observe('http_request_duration_seconds', labels, duration)
+    observe('http_request_db_queries', labels, queries)
+    observe('http_response_size_bytes', labels, size)
+
+
+def _snapshot_path():
+    return os.path.join(settings.METRICS_DIR,
+                        f'metrics_{_process["id"]}.json')
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _remove_stale_snapshots():
+    """Delete this process's old file and those of dead processes"""
+    for filename in os.listdir(settings.METRICS_DIR):
+        match = _SNAPSHOT_RE.match(filename)
+        if match is None:
+            continue
+        pid = int(match.group(1))
+        if pid == os.getpid() or not _is_running(pid):
+            try:
+                os.remove(os.path.join(settings.METRICS_DIR, filename))
+            except FileNotFoundError:
+                pass
+
+
+def _flush_periodically():
+    while True:
+        time.sleep(settings.METRICS_FLUSH_SECONDS)
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+def _ensure_started():
+    """Clear stale snapshots and start the flush timer once per process"""
+    if _process['started'] or not settings.METRICS_DIR:
+        return
+    with _lock:
+        if _process['started']:
+            return
+        _process['started'] = True
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    _remove_stale_snapshots()
+    threading.Thread(target=_flush_periodically, name='metrics-flush',
+                     daemon=True).start()
+
+
+def flush():
+    """Write this process's metrics to its file in METRICS_DIR"""
+    if not settings.METRICS_DIR:
+        return
+    with _lock:
+        payload = json.dumps(_data)
+    fd, tmp_path = tempfile.mkstemp(dir=settings.METRICS_DIR,
+                                    suffix='.tmp')
+    with os.fdopen(fd, 'w') as tmp:
+        tmp.write(payload)
+    os.replace(tmp_path, _snapshot_path())
+
+
+def collect():
+    """Return the metrics of every worker process added together"""
+    with _lock:
+        merged = {key: list(series) for key, series in _data.items()}
+    if not settings.METRICS_DIR or not os.path.isdir(settings.METRICS_DIR):
+        return merged
+    own = os.path.basename(_snapshot_path())
+    for filename in os.listdir(settings.METRICS_DIR):
+        if not filename.endswith('.json') or filename == own:
+            continue
+        try:
+            with open(os.path.join(settings.METRICS_DIR, filename)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for key, series in data.items():
+            if key not in merged:
+                merged[key] = list(series)
+            else:
+                merged[key] = [a + b for a, b in zip(merged[key], series)]
+    return merged
+
+
+def _escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _format_labels(labels):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in labels)
+
+
+def render():
+    """Return all metrics in the Prometheus text exposition format"""
+    series_by_name = {}
+    for key, series in collect().items():
+        name, labels = json.loads(key)
+        series_by_name.setdefault(name, []).append((labels, series))
+
+    lines = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for labels, series in sorted(series_by_name.get(name, [])):
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], series):
+                cumulative += count
+                bucket = _format_labels(labels + [['le', bound]])
+                lines.append(f'{name}_bucket{{{bucket}}} {cumulative}')
+            label_text = _format_labels(labels)
+            lines.append(f'{name}_sum{{{label_text}}} {series[-2]}')
+            lines.append(f'{name}_count{{{label_text}}} {series[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """Forget the metrics of this process"""
+    with _lock:
+        _data.clear()
@@ -0,0 +1,151 @@
+"""Middleware for the app"""
+
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+
+from core import health, metrics, timing
+from core.slow_queries import SlowQueryRecorder
+
+timing_logger = logging.getLogger('core.timing')
+
+
+class HealthCheckMiddleware:
+    """Answer /health/ probes before sessions, auth or URL resolving"""
+
+    LIVE_PATHS = ('/health/live', '/health/live/')
+    READY_PATHS = ('/health/ready', '/health/ready/')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path in self.LIVE_PATHS:
+            return JsonResponse({'status': 'ok'})
+        if request.path in self.READY_PATHS:
+            errors = health.readiness()
+            if errors:
+                return JsonResponse({'status': 'unavailable',
+                                     'errors': errors}, status=503)
+            return JsonResponse({'status': 'ok'})
+        return self.get_response(request)
+
+
+class QueryCounter:
+    """Database execute wrapper that only counts queries"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Record latency, query count and response size per URL name"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        if response.streaming:
+            size = int(response.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+        match = getattr(request, 'resolver_match', None)
+        metrics.record_request(
+            view=match.view_name if match else '<unresolved>',
+            method=request.method,
+            status=response.status_code,
+            duration=duration,
+            queries=counter.count,
+            size=size,
+        )
+        return response
+
+
+class SlowQueryMiddleware:
+    """Log queries slower than SLOW_QUERY_THRESHOLD_MS with their view"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.SLOW_QUERY_THRESHOLD_MS:
+            return self.get_response(request)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(
+                    SlowQueryRecorder(request, connection.alias)
+                ))
+            return self.get_response(request)
+
+
+class ServerTimingMiddleware:
+    """Report DB, serializer and render time of sampled requests
+
+    The breakdown is sent as a Server-Timing header and logged as one JSON
+    line on the `core.timing` logger. SERVER_TIMING_SAMPLE_RATE sets the
+    share of requests that are measured.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.SERVER_TIMING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        timings = timing.RequestTimings()
+        token = timing.activate(timings)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(timings)
+                    )
+                response = self.get_response(request)
+        finally:
+            timing.deactivate(token)
+
+        end = time.perf_counter()
+        if timings.render_start is not None:
+            timings.spans['render'] += end - timings.render_start
+        timings.spans['total'] = end - timings.start
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={seconds * 1000:.1f}' +
+            (f';desc="{timings.queries} queries"' if name == 'db' else '')
+            for name, seconds in timings.spans.items()
+        )
+        match = getattr(request, 'resolver_match', None)
+        timing_logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': timings.queries,
+            **{f'{name}_ms': round(seconds * 1000, 2)
+               for name, seconds in timings.spans.items()},
+        }))
+        return response
+
+    def process_template_response(self, request, response):
+        timings = timing.current()
+        if timings is not None:
+            timings.render_start = time.perf_counter()
+        return response
@@ -0,0 +1,27 @@
+# Generated by Django 4.0.10 on 2026-10-19 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField(unique=True)),
+                ('email', models.EmailField(max_length=255)),
+                ('alias', models.CharField(max_length=64)),
+                ('stage', models.CharField(choices=[('recipe_tags', 'Recipe tags'), ('recipe_ingredients', 'Recipe ingredients'), ('recipes', 'Recipes'), ('tags', 'Tags'), ('ingredients', 'Ingredients'), ('user', 'User'), ('done', 'Done')], default='recipe_tags', max_length=20)),
+                ('deleted', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.0.10 on 2026-10-19 15:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def number_existing_rows(apps, schema_editor):
+    """Give existing rows distinct change numbers and start the sequence"""
+    connection = schema_editor.connection
+    qn = connection.ops.quote_name
+    offset = 0
+    with connection.cursor() as cursor:
+        for model_name in ('Recipe', 'Tag', 'Ingredient'):
+            table = qn(apps.get_model('core', model_name)._meta.db_table)
+            cursor.execute(f'UPDATE {table} SET {qn("change_seq")} = '
+                           f'{qn("id")} + %s', [offset])
+            cursor.execute(f'SELECT MAX({qn("id")}) FROM {table}')
+            offset += cursor.fetchone()[0] or 0
+        if connection.vendor == 'postgresql':
+            cursor.execute('CREATE SEQUENCE core_change_seq')
+            if offset:
+                cursor.execute("SELECT setval('core_change_seq', %s)",
+                               [offset])
+
+
+def drop_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP SEQUENCE IF EXISTS core_change_seq')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_userdeletion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('change_seq', models.BigIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'change_seq'], name='core_ingredient_changes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'change_seq'], name='core_recipe_changes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'change_seq'], name='core_tag_changes_idx'),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['user', 'change_seq'], name='core_tombst_user_id_8c11dd_idx'),
+        ),
+        migrations.RunPython(number_existing_rows, drop_sequence),
+    ]
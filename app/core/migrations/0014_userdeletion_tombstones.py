@@ -0,0 +1,18 @@
+# Generated by Django 4.0.10 on 2026-10-19 09:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_change_time'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userdeletion',
+            name='stage',
+            field=models.CharField(choices=[('recipe_tags', 'Recipe tags'), ('recipe_ingredients', 'Recipe ingredients'), ('recipes', 'Recipes'), ('tags', 'Tags'), ('ingredients', 'Ingredients'), ('tombstones', 'Tombstones'), ('user', 'User'), ('done', 'Done')], default='recipe_tags', max_length=20),
+        ),
+    ]
@@ -1,21 +1,47 @@
 """Database models for our app"""
 
+import hashlib
 import uuid
 import os
 
 from django.conf import settings
-from django.db import models
+from django.db import IntegrityError, models, router
+from django.db.models import F
+from django.utils import timezone
 from django.contrib.auth.models import (
     AbstractBaseUser,BaseUserManager,PermissionsMixin,
 )
 
 
+def _image_content_hash(instance):
+    """Return the SHA-256 of a recipe's pending image upload, if any"""
+    image = getattr(instance, 'image', None)
+    upload = getattr(image, '_file', None)
+    if upload is None:
+        return None
+    digest = getattr(upload, 'content_hash', None)
+    if digest is None:
+        sha = hashlib.sha256()
+        for chunk in upload.chunks():
+            sha.update(chunk)
+        upload.seek(0)
+        digest = sha.hexdigest()
+    return digest
+
+
 def recipe_image_file_path(instance, filename):
-    """Generate file path for new recipe image"""
-    ext = os.path.splitext(filename)[1]
-    filename = f'{uuid.uuid4()}{ext}'
+    """Generate file path for new recipe image
+
+    Uploads are named after their content hash so identical images are
+    stored once.
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    digest = _image_content_hash(instance)
+    if digest is None:
+        filename = f'{uuid.uuid4()}{ext}'
+        return os.path.join('uploads', 'recipe', filename)
 
-    return os.path.join('uploads', 'recipe', filename)
+    return os.path.join('uploads', 'recipe', digest[:2], f'{digest}{ext}')
 
 
 class UserManager(BaseUserManager):
@@ -51,7 +77,32 @@ class User(AbstractBaseUser,PermissionsMixin):
     USERNAME_FIELD = 'email'
 
 
-class Recipe(models.Model):
+class ChangeTrackedModel(models.Model):
+    """Model stamped with a new change sequence number on every save"""
+    change_seq = models.BigIntegerField(default=0, editable=False)
+    changed_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        abstract = True
+        indexes = [
+            models.Index(fields=['user', 'change_seq'],
+                         name='%(app_label)s_%(class)s_changes_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        from core.changes import next_change
+
+        using = kwargs.get('using') or router.db_for_write(
+            type(self), instance=self
+        )
+        self.change_seq, self.changed_at = next_change(using)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'],
+                                       'change_seq', 'changed_at'}
+        super().save(*args, **kwargs)
+
+
+class Recipe(ChangeTrackedModel):
     """Recipe object"""
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              on_delete = models.CASCADE)
@@ -63,12 +114,18 @@ class Recipe(models.Model):
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image_variants = models.JSONField(default=dict, blank=True)
+    image_width = models.PositiveIntegerField(null=True, blank=True)
+    image_height = models.PositiveIntegerField(null=True, blank=True)
+    image_bytes = models.PositiveIntegerField(null=True, blank=True)
+    image_format = models.CharField(max_length=10, blank=True)
+    image_placeholder = models.CharField(max_length=7, blank=True)
 
     def __str__(self):
         return self.title
 
 
-class Tag(models.Model):
+class Tag(ChangeTrackedModel):
     """Tag for filtering recipes"""
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
@@ -78,7 +135,7 @@ class Tag(models.Model):
         return self.name
 
 
-class Ingredient(models.Model):
+class Ingredient(ChangeTrackedModel):
     """Ingredient for recipes"""
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
@@ -86,3 +143,132 @@ class Ingredient(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class Tombstone(models.Model):
+    """Record of a deleted recipe, tag or ingredient for delta syncs"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE)
+    model_name = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    change_seq = models.BigIntegerField()
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'change_seq'])]
+
+    def __str__(self):
+        return f'{self.model_name} {self.object_id} (#{self.change_seq})'
+
+
+class UserShard(models.Model):
+    """Directory entry pinning a user's recipe data to a database shard"""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL,
+                                on_delete=models.CASCADE,
+                                primary_key=True)
+    alias = models.CharField(max_length=64)
+    is_moving = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f'{self.user_id} -> {self.alias}'
+
+
+class ImageBlobManager(models.Manager):
+    """Manager for stored image reference counts"""
+
+    def acquire(self, name):
+        """Record one more recipe using the stored file"""
+        if self.filter(name=name).update(ref_count=F('ref_count') + 1,
+                                         updated_at=timezone.now()):
+            return
+        try:
+            self.create(name=name, ref_count=1)
+        except IntegrityError:
+            self.filter(name=name).update(ref_count=F('ref_count') + 1,
+                                          updated_at=timezone.now())
+
+    def release(self, name):
+        """Record one less recipe using the stored file"""
+        if self.filter(name=name).update(ref_count=F('ref_count') - 1,
+                                         updated_at=timezone.now()):
+            return
+        self.get_or_create(name=name, defaults={'ref_count': 0})
+
+
+class ImageBlob(models.Model):
+    """Reference count of a stored recipe image file"""
+    name = models.CharField(max_length=255, unique=True)
+    ref_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    objects = ImageBlobManager()
+
+    class Meta:
+        indexes = [models.Index(fields=['ref_count', 'updated_at'])]
+
+    def __str__(self):
+        return f'{self.name} ({self.ref_count})'
+
+
+class Task(models.Model):
+    """Deferred unit of work run by the run_worker command"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES,
+                              default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_at'])]
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
+
+
+class UserDeletion(models.Model):
+    """Progress of the chunked background deletion of a user's data"""
+    RECIPE_TAGS = 'recipe_tags'
+    RECIPE_INGREDIENTS = 'recipe_ingredients'
+    RECIPES = 'recipes'
+    TAGS = 'tags'
+    INGREDIENTS = 'ingredients'
+    TOMBSTONES = 'tombstones'
+    USER = 'user'
+    DONE = 'done'
+    STAGE_CHOICES = [
+        (RECIPE_TAGS, 'Recipe tags'),
+        (RECIPE_INGREDIENTS, 'Recipe ingredients'),
+        (RECIPES, 'Recipes'),
+        (TAGS, 'Tags'),
+        (INGREDIENTS, 'Ingredients'),
+        (TOMBSTONES, 'Tombstones'),
+        (USER, 'User'),
+        (DONE, 'Done'),
+    ]
+
+    user_id = models.BigIntegerField(unique=True)
+    email = models.EmailField(max_length=255)
+    alias = models.CharField(max_length=64)
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES,
+                             default=RECIPE_TAGS)
+    deleted = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.email} ({self.stage})'
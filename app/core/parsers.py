@@ -0,0 +1,43 @@
+"""Parsers for the API"""
+import io
+
+import msgpack
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+from core.renderers import FastJSONRenderer, MessagePackRenderer, orjson
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser using orjson for UTF-8 request bodies"""
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if (orjson is None or not self.strict or
+                encoding.lower().replace('-', '') != 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            # Let the stdlib parser accept what it can (e.g. big integers)
+            # and word the error exactly as before
+            return super().parse(io.BytesIO(body), media_type,
+                                 parser_context)
+
+
+class MessagePackParser(BaseParser):
+    """Parse MessagePack request bodies"""
+    media_type = 'application/msgpack'
+    renderer_class = MessagePackRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError(
+                f'MessagePack parse error - {exc or "invalid data"}'
+            )
@@ -0,0 +1,70 @@
+"""
+Renderers for the API.
+
+`FastJSONRenderer` produces the same bytes as DRF's JSONRenderer, but
+encodes with orjson when it is installed. Anything orjson cannot
+reproduce exactly (indented or ASCII-only output, integers over 64 bits)
+goes through the stdlib path of the parent class.
+
+`MessagePackRenderer` is a compact binary alternative negotiated with
+`Accept: application/msgpack`. Decimals are encoded as strings, like the
+serializers already do for prices, and other types as in JSON.
+"""
+from decimal import Decimal
+
+import msgpack
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Datetimes go through DRF's encoder so that UTC keeps its 'Z' suffix
+ORJSON_OPTIONS = (
+    orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    if orjson else 0
+)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer using orjson for compact UTF-8 output"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii or
+                not self.compact or self.get_indent(
+                    accepted_media_type, renderer_context or {}
+                ) is not None):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default,
+                               option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        # Escape U+2028 and U+2029 like JSONRenderer does
+        return (ret.replace(b'\xe2\x80\xa8', b'\\u2028')
+                .replace(b'\xe2\x80\xa9', b'\\u2029'))
+
+
+def _msgpack_default(obj, encoder=JSONEncoder()):
+    """Encode types MessagePack has no native form for"""
+    if isinstance(obj, Decimal):
+        return str(obj)
+    return encoder.default(obj)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Render responses as MessagePack"""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_msgpack_default,
+                             use_bin_type=True)
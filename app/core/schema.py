@@ -0,0 +1,169 @@
+"""
+Cached OpenAPI schema.
+
+Generating the schema walks every view and serializer, so it is done once
+per code version: the result is kept in memory and, with
+SCHEMA_CACHE_FILE set, in a file that `build_schema` can write at build
+time so that freshly started workers do not generate it either. Each
+rendered format is kept with its ETag and a gzipped copy. Cache keys only
+ever hold supported languages and the renderers' own media types, so
+clients cannot grow the cache with made-up ?lang= values or Accept
+parameters.
+"""
+import functools
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import translation
+from django.utils.cache import patch_vary_headers
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+
+_lock = threading.Lock()
+_schemas = {}
+_rendered = {}
+
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    """Return APP_VERSION, or a digest of the project's Python sources"""
+    if settings.APP_VERSION:
+        return settings.APP_VERSION
+    digest = hashlib.sha256()
+    for dirpath, dirnames, filenames in sorted(os.walk(settings.BASE_DIR)):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.endswith('.py'):
+                stat = os.stat(os.path.join(dirpath, filename))
+                digest.update(
+                    f'{dirpath}/{filename}:{stat.st_mtime_ns}:'
+                    f'{stat.st_size}'.encode()
+                )
+    return digest.hexdigest()[:16]
+
+
+def supported_lang(lang):
+    """Return the supported variant of lang, or None for the default"""
+    if not lang or not settings.USE_I18N:
+        return None
+    try:
+        lang = translation.get_supported_language_variant(lang)
+    except LookupError:
+        return None
+    default = translation.get_supported_language_variant(
+        settings.LANGUAGE_CODE
+    )
+    return None if lang == default else lang
+
+
+def generate(generator_class, urlconf=None, api_version=None, lang=None):
+    """Return the public schema as generated by drf-spectacular"""
+    generator = generator_class(urlconf=urlconf, api_version=api_version)
+    with translation.override(lang or settings.LANGUAGE_CODE):
+        return generator.get_schema(request=None, public=True)
+
+
+def _read_file(version, lang):
+    path = settings.SCHEMA_CACHE_FILE
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        data = json.load(f)
+    if data.get('version') != version:
+        return None
+    return data['schemas'].get(lang or '')
+
+
+def write_file(path, schemas):
+    """Store {lang: schema} for the current code version"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': code_version(), 'schemas': schemas}, f)
+    os.replace(tmp_path, path)
+
+
+def get_schema(generator_class, lang=None, **kwargs):
+    """Return the schema, generating it at most once per code version"""
+    key = (code_version(), lang or '')
+    schema = _schemas.get(key)
+    if schema is None:
+        with _lock:
+            schema = _schemas.get(key)
+            if schema is None:
+                schema = _read_file(*key)
+                if schema is None:
+                    schema = generate(generator_class, lang=lang, **kwargs)
+                _schemas[key] = schema
+    return schema
+
+
+class RenderedSchema:
+    """One rendering of the schema with its validators"""
+
+    def __init__(self, content, content_type):
+        self.content = content
+        self.content_type = content_type
+        self.etag = f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+        self.gzipped = (gzip.compress(content, mtime=0)
+                        if settings.SCHEMA_GZIP else None)
+
+
+def get_rendered(schema_key, media_type, render):
+    """Return the cached RenderedSchema, rendering it on first use"""
+    key = (code_version(),) + schema_key + (media_type,)
+    rendered = _rendered.get(key)
+    if rendered is None:
+        rendered = _rendered[key] = RenderedSchema(*render())
+    return rendered
+
+
+def clear():
+    """Forget the cached schemas, e.g. in tests"""
+    _schemas.clear()
+    _rendered.clear()
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    """OpenAPI schema generated once per code version and served cached"""
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        if not settings.SCHEMA_CACHE or not self.serve_public:
+            return super().get(request, *args, **kwargs)
+
+        lang = supported_lang(request.GET.get('lang'))
+        renderer = request.accepted_renderer
+        media_type = renderer.media_type
+
+        def render():
+            data = get_schema(
+                self.generator_class, lang=lang, urlconf=self.urlconf,
+                api_version=self.api_version,
+            )
+            content = renderer.render(data, media_type,
+                                      self.get_renderer_context())
+            content_type = media_type
+            if renderer.charset:
+                content_type = f'{media_type}; charset={renderer.charset}'
+            return content, content_type
+
+        rendered = get_rendered((lang or '',), media_type, render)
+        if rendered.etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        elif (rendered.gzipped is not None and 'gzip' in
+                request.headers.get('Accept-Encoding', '')):
+            response = HttpResponse(rendered.gzipped,
+                                    content_type=rendered.content_type)
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(rendered.content,
+                                    content_type=rendered.content_type)
+        response['ETag'] = rendered.etag
+        response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+        patch_vary_headers(response, ['Accept', 'Accept-Encoding'])
+        return response
@@ -0,0 +1,227 @@
+"""
+Per-user sharding of recipe data.
+
+Recipes, tags, ingredients and their M2M rows for one user always live on
+the same database alias. The alias comes from the `UserShard` directory on
+the `default` database; users without an entry are placed by a stable hash
+of their id and pinned there on their first write, so adding shards later
+never moves existing users. The user row itself stays on `default` and is
+mirrored onto the user's shard so foreign keys hold there too; moving or
+deleting a user removes the mirrors it leaves behind.
+
+Primary keys are kept when a user is moved, so every shard hands out ids
+from its own range: the Nth alias of DATABASE_SHARDS owns the ids from
+N * DATABASE_SHARD_ID_RANGE + 1 on. `reserve_id_range` points a shard's
+id sequences into its range; `seed_data` and `move_user_shard` call it
+after writing rows with explicit ids.
+"""
+import contextvars
+import hashlib
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import Max
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+SHARDED_MODELS = {
+    'recipe',
+    'tag',
+    'ingredient',
+    'recipe_tags',
+    'recipe_ingredients',
+    'tombstone',
+}
+
+_current_shard = contextvars.ContextVar('current_shard', default=None)
+
+
+class ShardMoving(APIException):
+    """Raised for writes while a user's data is being moved"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Your data is being moved, please retry shortly.'
+    default_code = 'shard_moving'
+
+
+def get_shards():
+    """Return the configured shard aliases"""
+    return list(getattr(settings, 'DATABASE_SHARDS', None) or ['default'])
+
+
+def is_sharded(model):
+    """Return True if rows of the model are placed per user"""
+    return (model._meta.app_label == 'core' and
+            model._meta.model_name in SHARDED_MODELS)
+
+
+def sharded_models():
+    """Return the models whose rows are placed per user"""
+    return [model for model in apps.get_app_config('core').get_models(
+        include_auto_created=True
+    ) if is_sharded(model)]
+
+
+def id_range(alias):
+    """Return the first and last primary key a shard hands out"""
+    size = settings.DATABASE_SHARD_ID_RANGE
+    index = get_shards().index(alias)
+    return index * size + 1, (index + 1) * size
+
+
+def next_id(alias, model):
+    """Return the next unused primary key in a shard's own range"""
+    first, last = id_range(alias)
+    current = model.objects.using(alias).filter(
+        pk__range=(first, last)
+    ).aggregate(m=Max('pk'))['m']
+    return (current or first - 1) + 1
+
+
+def reserve_id_range(alias, models):
+    """Make the id sequences of models on a shard continue in its range"""
+    connection = connections[alias]
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for model in models:
+            table = model._meta.db_table
+            column = model._meta.pk.column
+            last_used = next_id(alias, model) - 1
+            if connection.vendor == 'postgresql':
+                first = id_range(alias)[0]
+                cursor.execute(
+                    'SELECT setval(pg_get_serial_sequence(%s, %s), %s, %s)',
+                    [qn(table), column, max(last_used, first),
+                     last_used >= first],
+                )
+            elif connection.vendor == 'sqlite':
+                cursor.execute('DELETE FROM sqlite_sequence WHERE name = %s',
+                               [table])
+                cursor.execute('INSERT INTO sqlite_sequence (name, seq) '
+                               'VALUES (%s, %s)', [table, last_used])
+
+
+def hash_shard(user_id, shards=None):
+    """Return the shard a user id hashes to"""
+    shards = shards or get_shards()
+    digest = hashlib.md5(str(user_id).encode()).digest()
+    return shards[int.from_bytes(digest[:8], 'big') % len(shards)]
+
+
+def remove_mirrors(user_id):
+    """Delete the copies of a user row on every shard but default"""
+    user_model = get_user_model()
+    for alias in get_shards():
+        if alias != 'default':
+            user_model.objects.using(alias).filter(pk=user_id).delete()
+
+
+def mirror_user(user, alias):
+    """Copy the user row onto a shard so foreign keys resolve there"""
+    if alias == 'default':
+        return
+    user_model = get_user_model()
+    values = user_model.objects.using('default').filter(
+        pk=user.pk
+    ).values().get()
+    user_model.objects.using(alias).update_or_create(
+        pk=user.pk, defaults=values
+    )
+
+
+def get_assignment(user, create=True):
+    """Return the directory entry for a user
+
+    A user without one is placed by hash_shard. With create the entry is
+    stored and the user mirrored there; otherwise an unsaved entry is
+    returned, so that reads never write.
+    """
+    from core.models import UserShard
+
+    assignment = UserShard.objects.using('default').filter(
+        user_id=user.pk
+    ).first()
+    if assignment is None:
+        alias = hash_shard(user.pk)
+        if not create:
+            return UserShard(user_id=user.pk, alias=alias)
+        mirror_user(user, alias)
+        assignment, created = UserShard.objects.using(
+            'default'
+        ).get_or_create(user_id=user.pk, defaults={'alias': alias})
+    return assignment
+
+
+def shard_for_user(user):
+    """Return the database alias holding a user's recipe data"""
+    if len(get_shards()) == 1:
+        return get_shards()[0]
+    return get_assignment(user).alias
+
+
+def get_current_shard():
+    """Return the shard activated for the current request, if any"""
+    return _current_shard.get()
+
+
+def activate(alias):
+    """Route sharded models to the alias; returns a token for deactivate"""
+    return _current_shard.set(alias)
+
+
+def deactivate(token):
+    """Restore the shard that was active before the matching activate"""
+    _current_shard.reset(token)
+
+
+class UserShardRouter:
+    """Database router sending sharded models to the active shard"""
+
+    def db_for_read(self, model, **hints):
+        if not is_sharded(model):
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return _current_shard.get()
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+class ShardedViewMixin:
+    """Activate the request user's shard for the duration of a view"""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._shard_token = None
+        if len(get_shards()) == 1 or not request.user.is_authenticated:
+            return
+        is_write = request.method not in ('GET', 'HEAD', 'OPTIONS')
+        assignment = get_assignment(request.user, create=is_write)
+        if assignment.is_moving and is_write:
+            raise ShardMoving()
+        self._shard_token = activate(assignment.alias)
+
+    def dispatch(self, request, *args, **kwargs):
+        # finalize_response is skipped when an exception is re-raised
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            self._release_shard()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        self._release_shard()
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def _release_shard(self):
+        token = getattr(self, '_shard_token', None)
+        if token is not None:
+            deactivate(token)
+            self._shard_token = None
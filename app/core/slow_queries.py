@@ -0,0 +1,112 @@
+"""
+Slow query capture.
+
+`SlowQueryMiddleware` wraps every database connection for the duration
+of a request. Queries slower than SLOW_QUERY_THRESHOLD_MS are logged to
+the `core.slow_queries` logger with the view that issued them, and a
+sampled share of slow SELECTs is explained on a background thread over
+a separate connection, so the request neither waits for the plan nor
+has its transaction touched by it. On PostgreSQL the plan comes from
+`EXPLAIN (ANALYZE, BUFFERS)`, which runs the query a second time, so
+SELECTs that lock rows or call functions with side effects are skipped.
+"""
+import logging
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('core.slow_queries')
+
+_executor = ThreadPoolExecutor(max_workers=1,
+                               thread_name_prefix='explain')
+_pending = threading.BoundedSemaphore(10)
+
+# Row locks and calls that change state even inside a SELECT
+SIDE_EFFECTS = re.compile(
+    r'\bFOR\s+(NO\s+KEY\s+UPDATE|UPDATE|KEY\s+SHARE|SHARE)\b|'
+    r'\b(NEXTVAL|SETVAL|PG_ADVISORY_\w+)\s*\(',
+    re.IGNORECASE,
+)
+
+
+def can_explain(sql):
+    """Return whether sql is safe to run again for its plan"""
+    statement = sql.lstrip().upper()
+    return (statement.startswith('SELECT') and
+            not SIDE_EFFECTS.search(statement))
+
+
+def explain(alias, sql, params):
+    """Return the query plan of sql, using a connection of its own"""
+    connection = connections.create_connection(alias)
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                prefix = 'EXPLAIN (ANALYZE, BUFFERS) '
+            elif connection.vendor == 'sqlite':
+                prefix = 'EXPLAIN QUERY PLAN '
+            else:
+                prefix = 'EXPLAIN '
+            cursor.execute(prefix + sql, params)
+            return '\n'.join(
+                ' '.join(str(column) for column in row)
+                for row in cursor.fetchall()
+            )
+    finally:
+        connection.close()
+
+
+def _log_plan(alias, sql, params, view):
+    try:
+        plan = explain(alias, sql, params)
+    except Exception:
+        logger.exception('EXPLAIN failed for slow query from %s', view)
+    else:
+        logger.warning('Plan for slow query from %s:\n%s\n%s',
+                       view, sql, plan)
+    finally:
+        _pending.release()
+
+
+def schedule_explain(alias, sql, params, view):
+    """Explain the query in the background unless too many are queued"""
+    if not _pending.acquire(blocking=False):
+        return None
+    return _executor.submit(_log_plan, alias, sql, params, view)
+
+
+class SlowQueryRecorder:
+    """Execute wrapper logging queries over the threshold"""
+
+    def __init__(self, request, alias):
+        self.request = request
+        self.alias = alias
+        self.threshold = settings.SLOW_QUERY_THRESHOLD_MS / 1000
+
+    @property
+    def view(self):
+        match = getattr(self.request, 'resolver_match', None)
+        return match.view_name if match else self.request.path
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            if duration >= self.threshold:
+                self.record(sql, params, many, duration)
+
+    def record(self, sql, params, many, duration):
+        """Log one slow query and maybe sample its plan"""
+        view = self.view
+        logger.warning('Slow query (%.1f ms) on %s from %s: %s',
+                       duration * 1000, self.alias, view, sql)
+        if (not many and can_explain(sql) and
+                random.random() < settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE):
+            schedule_explain(self.alias, sql, params, view)
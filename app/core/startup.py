@@ -0,0 +1,82 @@
+"""
+Measure the cold start of a process.
+
+Run as `python -m core.startup` (optionally with `-X importtime`); it
+prints the time spent loading settings, importing, loading models and
+readying each app, creating the WSGI handler and importing the URLconf
+as JSON on stdout.
+"""
+import json
+import sys
+import time
+
+# Modules that should only be imported when first used
+LAZY_MODULES = ['PIL', 'drf_spectacular.views']
+
+
+def measure():
+    """Start up Django like a server process and return the timings"""
+    start = time.perf_counter()
+    from django.apps import AppConfig
+    from django.conf import settings
+
+    apps = {}
+    create = AppConfig.create.__func__
+    import_models = AppConfig.import_models
+
+    def timed_create(cls, entry):
+        began = time.perf_counter()
+        config = create(cls, entry)
+        apps[config.label] = {'import': time.perf_counter() - began}
+        ready = config.ready
+
+        def timed_ready():
+            began = time.perf_counter()
+            ready()
+            apps[config.label]['ready'] = time.perf_counter() - began
+
+        config.ready = timed_ready
+        return config
+
+    def timed_import_models(self):
+        began = time.perf_counter()
+        import_models(self)
+        apps[self.label]['models'] = time.perf_counter() - began
+
+    phases = {}
+    began = time.perf_counter()
+    settings.INSTALLED_APPS
+    phases['settings'] = time.perf_counter() - began
+
+    AppConfig.create = classmethod(timed_create)
+    AppConfig.import_models = timed_import_models
+    try:
+        import django
+
+        began = time.perf_counter()
+        django.setup(set_prefix=False)
+        phases['setup'] = time.perf_counter() - began
+    finally:
+        AppConfig.create = classmethod(create)
+        AppConfig.import_models = import_models
+
+    from django.utils.module_loading import import_string
+    from importlib import import_module
+
+    began = time.perf_counter()
+    import_string(settings.WSGI_APPLICATION)
+    phases['wsgi'] = time.perf_counter() - began
+    began = time.perf_counter()
+    import_module(settings.ROOT_URLCONF)
+    phases['urlconf'] = time.perf_counter() - began
+
+    return {
+        'total': time.perf_counter() - start,
+        'phases': phases,
+        'apps': apps,
+        'loaded': [name for name in LAZY_MODULES if name in sys.modules],
+    }
+
+
+if __name__ == '__main__':
+    json.dump(measure(), sys.stdout)
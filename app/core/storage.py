@@ -0,0 +1,43 @@
+"""File storage for the app"""
+
+import os
+import re
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+
+CONTENT_ADDRESSED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}[^/]*$')
+
+
+def is_content_addressed(name):
+    """Return True if a storage name is derived from its content hash"""
+    return bool(CONTENT_ADDRESSED_NAME.search(name))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that stores content-hashed files only once
+
+    Saving a content-addressed name that already exists reuses the stored
+    file instead of writing a renamed copy. New files are written under a
+    temporary name and hard-linked into place, so when two uploads of the
+    same bytes race, the loser keeps the winner's identical file.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        if is_content_addressed(name) and self.exists(name):
+            return name
+        return super().get_available_name(name, max_length)
+
+    def _save(self, name, content):
+        if not is_content_addressed(name):
+            return super()._save(name, content)
+        if self.exists(name):
+            return name
+        tmp_name = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        try:
+            os.link(self.path(tmp_name), self.path(name))
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(self.path(tmp_name))
+        return name
@@ -0,0 +1,147 @@
+"""
+Database-backed background tasks.
+
+Tasks are rows in the `Task` table, so enqueueing inside a transaction
+only makes the task visible once that transaction commits and no broker
+is needed. Workers claim rows with `SELECT ... FOR UPDATE SKIP LOCKED`,
+mark them running for a visibility timeout and delete them once they
+succeed. A task whose worker died becomes claimable again when its
+visibility timeout passes; failures are retried with exponential backoff
+until `max_attempts` is reached.
+
+A batch runs one task after another, so each task's lease is renewed
+right before it starts. Every claim bumps `attempts`, which serves as the
+claim token: a worker only renews, records or deletes a task while the
+row still carries the attempt it claimed, so a task re-claimed by another
+worker after its lease ran out is left to that worker.
+
+Task functions live in each app's `tasks.py` and are registered with
+the `task` decorator.
+"""
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def task(func=None, *, name=None, max_attempts=5):
+    """Register a function as a task; adds a `delay(**kwargs)` helper"""
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        _registry[task_name] = func
+        func.task_name = task_name
+        func.delay = lambda **kwargs: enqueue(
+            task_name, kwargs, max_attempts=max_attempts
+        )
+        return func
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def get_task(name):
+    """Return the function registered under name"""
+    if name not in _registry:
+        autodiscover_modules('tasks')
+    return _registry[name]
+
+
+def enqueue(name, payload=None, delay=0, max_attempts=5):
+    """Queue a task to run after delay seconds"""
+    from core.models import Task
+
+    return Task.objects.create(
+        name=name,
+        payload=payload or {},
+        max_attempts=max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+class Worker:
+    """Claims and runs queued tasks"""
+
+    def __init__(self, visibility_timeout=300, batch_size=10,
+                 retry_delay=5, max_retry_delay=3600):
+        self.visibility_timeout = visibility_timeout
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+    def claim(self):
+        """Lock a batch of due tasks for this worker"""
+        from core.models import Task
+
+        now = timezone.now()
+        with transaction.atomic():
+            tasks = list(
+                Task.objects.select_for_update(skip_locked=True).filter(
+                    Q(status=Task.QUEUED, run_at__lte=now) |
+                    Q(status=Task.RUNNING, locked_until__lt=now)
+                ).order_by('run_at')[:self.batch_size]
+            )
+            locked_until = now + timedelta(seconds=self.visibility_timeout)
+            for claimed in tasks:
+                claimed.status = Task.RUNNING
+                claimed.attempts += 1
+                claimed.locked_until = locked_until
+            Task.objects.bulk_update(
+                tasks, ['status', 'attempts', 'locked_until']
+            )
+        return tasks
+
+    def backoff(self, attempts):
+        """Return seconds to wait before retrying a failed task"""
+        delay = min(self.max_retry_delay,
+                    self.retry_delay * 2 ** (attempts - 1))
+        return random.uniform(delay / 2, delay)
+
+    def execute(self, claimed):
+        """Run one claimed task; successes are deleted, failures recorded"""
+        from core.models import Task
+
+        owned = Task.objects.filter(pk=claimed.pk, attempts=claimed.attempts,
+                                    status=Task.RUNNING)
+        locked_until = timezone.now() + timedelta(
+            seconds=self.visibility_timeout
+        )
+        if not owned.update(locked_until=locked_until):
+            logger.info('Task %s #%s was claimed by another worker',
+                        claimed.name, claimed.pk)
+            return False
+        try:
+            get_task(claimed.name)(**claimed.payload)
+        except Exception:
+            error = traceback.format_exc()
+            logger.warning('Task %s #%s failed (attempt %s)',
+                           claimed.name, claimed.pk, claimed.attempts)
+            if claimed.attempts >= claimed.max_attempts:
+                owned.update(status=Task.FAILED, locked_until=None,
+                             last_error=error)
+            else:
+                owned.update(
+                    status=Task.QUEUED, locked_until=None, last_error=error,
+                    run_at=timezone.now() + timedelta(
+                        seconds=self.backoff(claimed.attempts)
+                    ),
+                )
+            return False
+        owned.delete()
+        return True
+
+    def run_batch(self):
+        """Claim and run one batch; returns the number of tasks claimed"""
+        claimed = self.claim()
+        for item in claimed:
+            self.execute(item)
+        return len(claimed)
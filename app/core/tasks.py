@@ -0,0 +1,30 @@
+"""Background tasks of the core app"""
+
+from django.conf import settings
+
+from core import deletion, images
+from core.taskqueue import task
+
+
+@task
+def noop(**kwargs):
+    """Do nothing; used to measure queue overhead"""
+
+
+@task(max_attempts=3)
+def generate_image_variants(recipe_id, source_name, using='default'):
+    """Render the resized variants of a recipe image"""
+    images.generate_variants(recipe_id, source_name, using)
+
+
+@task
+def delete_user_data(deletion_id):
+    """Delete a deactivated user's data, re-queueing itself until done"""
+    from core.models import UserDeletion
+
+    progress = UserDeletion.objects.get(pk=deletion_id)
+    done = deletion.run(progress,
+                        chunk_size=settings.USER_DELETION_CHUNK_SIZE,
+                        max_chunks=settings.USER_DELETION_CHUNKS_PER_TASK)
+    if not done:
+        delete_user_data.delay(deletion_id=deletion_id)
@@ -0,0 +1,156 @@
+"""Tests for the request multiplexing endpoint"""
+
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.http import FileResponse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import ResolverMatch, reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+BATCH_URL = reverse('batch')
+RECIPE_PAYLOAD = {'title': 'Porridge', 'time_minutes': 5, 'price': '2.50'}
+
+
+class BatchApiTests(TestCase):
+    """Test running several API requests in one call"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'password123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_auth_required(self):
+        """Test the batch endpoint requires a token"""
+        res = APIClient().post(BATCH_URL, {'requests': [
+            {'path': '/api/user/me/'},
+        ]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_screen_load(self):
+        """Test sub-requests run as the batch user with one token lookup"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(BATCH_URL, {'requests': [
+                {'path': '/api/user/me/'},
+                {'path': '/api/recipe/recipe/'},
+                {'path': '/api/recipe/tag/?assigned_only=0'},
+                {'path': '/api/recipe/ingredient/'},
+            ]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        statuses = [r['status'] for r in res.data['responses']]
+        self.assertEqual(statuses, [200] * 4)
+        self.assertEqual(res.data['responses'][0]['body']['email'],
+                         self.user.email)
+        self.assertEqual(res.data['responses'][2]['body'][0]['name'],
+                         'Vegan')
+        token_lookups = [q for q in queries.captured_queries
+                         if 'authtoken_token' in q['sql']]
+        self.assertEqual(len(token_lookups), 1)
+
+    def test_writes_run_in_order(self):
+        """Test a read after a write sees the write"""
+        res = self.client.post(BATCH_URL, {'requests': [
+            {'method': 'POST', 'path': '/api/recipe/recipe/',
+             'body': RECIPE_PAYLOAD},
+            {'path': '/api/recipe/recipe/'},
+        ]}, format='json')
+
+        create, listing = res.data['responses']
+        self.assertEqual(create['status'], status.HTTP_201_CREATED)
+        self.assertEqual([recipe['id'] for recipe in listing['body']],
+                         [create['body']['id']])
+        self.assertTrue(Recipe.objects.filter(user=self.user).exists())
+
+    def test_errors_are_per_request(self):
+        """Test failing sub-requests do not fail the batch"""
+        res = self.client.post(BATCH_URL, {'requests': [
+            {'path': '/api/nothing-here/'},
+            {'path': '/api/batch/'},
+            {'path': '/api/recipe/recipe/99999/'},
+            {'method': 'POST', 'path': '/api/recipe/recipe/', 'body': {}},
+        ]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['status'] for r in res.data['responses']],
+                         [404, 400, 404, 400])
+
+    def test_only_api_paths(self):
+        """Test paths outside the API are refused per sub-request"""
+        res = self.client.post(BATCH_URL, {'requests': [
+            {'path': '/admin/'},
+            {'path': '/media/uploads/recipe/missing.jpg'},
+            {'path': '/api/batch/?x=1'},
+            {'path': '/api/user/me/'},
+        ]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['status'] for r in res.data['responses']],
+                         [400, 400, 400, 200])
+
+    def test_streamed_file_is_closed(self):
+        """Test a file response of a sub-request does not leak its file"""
+        opened = tempfile.TemporaryFile()
+        self.addCleanup(opened.close)
+        match = ResolverMatch(lambda request: FileResponse(opened), (), {})
+
+        with patch('core.batch.resolve', return_value=match):
+            res = self.client.post(BATCH_URL, {'requests': [
+                {'path': '/api/recipe/recipe/1/image/'},
+            ]}, format='json')
+
+        self.assertEqual(res.data['responses'][0]['status'], 200)
+        self.assertTrue(opened.closed)
+
+    @override_settings(BATCH_MAX_REQUESTS=2)
+    def test_too_many_requests(self):
+        """Test batches over BATCH_MAX_REQUESTS are rejected"""
+        res = self.client.post(BATCH_URL, {'requests': [
+            {'path': '/api/user/me/'},
+        ] * 3}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(BATCH_MAX_WORKERS=3)
+class ParallelBatchApiTests(TransactionTestCase):
+    """Test reads of a parallel batch run on worker threads"""
+
+    def test_parallel_keeps_order(self):
+        """Test parallel batches return responses in request order"""
+        user = get_user_model().objects.create_user(
+            'user@example.com', 'password123'
+        )
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        Tag.objects.create(user=user, name='Vegan')
+
+        res = client.post(BATCH_URL, {'parallel': True, 'requests': [
+            {'path': '/api/user/me/'},
+            {'path': '/api/recipe/tag/'},
+            {'method': 'POST', 'path': '/api/recipe/recipe/',
+             'body': dict(RECIPE_PAYLOAD, tags=[{'name': 'Dinner'}])},
+            {'path': '/api/recipe/tag/'},
+            {'path': '/api/recipe/ingredient/'},
+        ]}, format='json')
+
+        responses = res.data['responses']
+        self.assertEqual([r['status'] for r in responses],
+                         [200, 200, 201, 200, 200])
+        self.assertEqual(responses[0]['body']['email'], user.email)
+        self.assertEqual(len(responses[1]['body']), 1)
+        self.assertEqual(len(responses[3]['body']), 2)
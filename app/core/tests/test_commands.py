@@ -1,10 +1,26 @@
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import skipUnless
 from unittest.mock import patch
 
+from PIL import Image
 from psycopg2 import OperationalError as Psycopg2Error
 
+from django.conf import settings
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import F, Max
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from core import sharding
+from core.models import ImageBlob, Recipe, UserShard
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -29,3 +45,262 @@ class CommandTests(SimpleTestCase):
 
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+    @patch('time.sleep')
+    @patch('time.monotonic')
+    def test_wait_for_db_gives_up_after_timeout(self, patched_monotonic,
+                                                patched_sleep, patched_check):
+        """Test the command exits non-zero once the deadline passes."""
+        patched_monotonic.side_effect = [0, 1, 2, 100]
+        patched_check.side_effect = OperationalError
+
+        with self.assertRaises(CommandError):
+            call_command('wait_for_db', timeout=10)
+
+        self.assertEqual(patched_check.call_count, 3)
+
+    @patch('time.sleep')
+    def test_wait_for_db_backoff_grows(self, patched_sleep, patched_check):
+        """Test the delay between attempts backs off."""
+        patched_check.side_effect = [OperationalError] * 4 + [True]
+
+        call_command('wait_for_db')
+
+        delays = [c.args[0] for c in patched_sleep.call_args_list]
+        self.assertEqual(len(delays), 4)
+        self.assertLessEqual(delays[0], 0.1)
+        self.assertGreater(delays[-1], delays[0])
+
+    @patch('core.management.commands.wait_for_db.connections')
+    @patch('core.management.commands.wait_for_db.settings')
+    def test_wait_for_db_probes_each_alias(self, patched_settings,
+                                           patched_connections,
+                                           patched_check):
+        """Test every configured alias is checked."""
+        patched_settings.DATABASES = {'default': {}, 'replica': {}}
+        patched_check.return_value = True
+
+        call_command('wait_for_db')
+
+        patched_check.assert_any_call(databases=['default'])
+        patched_check.assert_any_call(databases=['replica'])
+
+    def test_wait_for_db_unknown_alias(self, patched_check):
+        """Test an unknown alias is rejected up front."""
+        with self.assertRaises(CommandError):
+            call_command('wait_for_db', databases=['missing'])
+
+        patched_check.assert_not_called()
+
+    @patch('core.management.commands.wait_for_db.Command.'
+           '_pending_migrations')
+    @patch('time.sleep')
+    def test_wait_for_db_migrations(self, patched_sleep, patched_pending,
+                                    patched_check):
+        """Test waiting until migrations have been applied."""
+        patched_check.return_value = True
+        patched_pending.side_effect = [True, True, False]
+
+        call_command('wait_for_db', migrations=True)
+
+        self.assertEqual(patched_pending.call_count, 3)
+
+
+class SweepImagesTests(TestCase):
+    """Test garbage collection of unreferenced images"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'password123'
+        )
+
+    def test_sweep_deletes_unreferenced_images(self):
+        """Test released images are deleted and used ones kept"""
+        kept = default_storage.save('uploads/recipe/kept.jpg',
+                                    ContentFile(b'kept'))
+        gone = default_storage.save('uploads/recipe/gone.jpg',
+                                    ContentFile(b'gone'))
+        self.addCleanup(default_storage.delete, kept)
+        Recipe.objects.create(user=self.user, title='Soup', time_minutes=5,
+                              price=Decimal('1.00'), image=kept)
+        ImageBlob.objects.create(name=kept, ref_count=0)
+        ImageBlob.objects.create(name=gone, ref_count=0)
+
+        call_command('sweep_images', grace=0, stdout=StringIO())
+
+        self.assertTrue(default_storage.exists(kept))
+        self.assertFalse(default_storage.exists(gone))
+        self.assertEqual(ImageBlob.objects.get(name=kept).ref_count, 1)
+        self.assertFalse(ImageBlob.objects.filter(name=gone).exists())
+
+
+class BackfillImageMetadataTests(TransactionTestCase):
+    """Test backfilling stored image metadata"""
+
+    def test_backfill_image_metadata(self):
+        """Test recipes without metadata get it from their image file"""
+        user = get_user_model().objects.create_user(
+            'user@example.com', 'password123'
+        )
+        buffer = BytesIO()
+        Image.new('RGB', (16, 8), (0, 0, 255)).save(buffer, format='JPEG')
+        name = default_storage.save('uploads/recipe/backfill.jpg',
+                                    ContentFile(buffer.getvalue()))
+        self.addCleanup(default_storage.delete, name)
+        recipe = Recipe.objects.create(user=user, title='Soup',
+                                       time_minutes=5,
+                                       price=Decimal('1.00'), image=name)
+        recipe.refresh_from_db()
+        change_seq = recipe.change_seq
+
+        call_command('backfill_image_metadata', workers=2, stdout=StringIO())
+
+        recipe.refresh_from_db()
+        self.assertGreater(recipe.change_seq, change_seq)
+        self.assertEqual((recipe.image_width, recipe.image_height), (16, 8))
+        self.assertEqual(recipe.image_format, 'jpeg')
+        self.assertEqual(recipe.image_bytes, len(buffer.getvalue()))
+
+
+class SeedDataTests(TestCase):
+    """Test generating a benchmark dataset"""
+
+    def _seed(self, **options):
+        options = {'users': 20, 'seed': 7, 'batch_size': 50,
+                   'stdout': StringIO(), **options}
+        call_command('seed_data', **options)
+
+    def test_seed_data_creates_related_rows(self):
+        """Test users get recipes linked to their own tags and ingredients"""
+        self._seed()
+
+        users = get_user_model().objects.filter(
+            email__startswith='seed'
+        )
+        self.assertEqual(users.count(), 20)
+        self.assertTrue(users.first().check_password('password123'))
+        self.assertTrue(Recipe.objects.exists())
+        self.assertFalse(Recipe.tags.through.objects.exclude(
+            recipe__user=F('tag__user')
+        ).exists())
+        self.assertFalse(Recipe.ingredients.through.objects.exclude(
+            recipe__user=F('ingredient__user')
+        ).exists())
+        recipe = Recipe.objects.create(user=users.first(), title='New',
+                                       time_minutes=1, price=Decimal('1'))
+        self.assertGreater(recipe.pk, Recipe.objects.exclude(
+            pk=recipe.pk).aggregate(m=Max('pk'))['m'])
+
+    def test_seed_data_is_reproducible(self):
+        """Test the same seed generates the same data"""
+        def snapshot():
+            return [
+                (r.title, r.time_minutes, r.price, r.tags.count(),
+                 r.ingredients.count())
+                for r in Recipe.objects.order_by('pk')
+            ]
+
+        self._seed()
+        first = snapshot()
+        get_user_model().objects.all().delete()
+        self._seed()
+
+        self.assertEqual(snapshot(), first)
+
+    def test_power_users_own_more_recipes(self):
+        """Test power users get a multiple of the regular recipe count"""
+        self._seed(users=10, power_users=1.0, power_factor=20, recipes=5)
+        power_count = Recipe.objects.count()
+        Recipe.objects.all().delete()
+        get_user_model().objects.all().delete()
+        self._seed(users=10, power_users=0.0, recipes=5)
+
+        self.assertGreater(power_count, Recipe.objects.count() * 5)
+
+
+@skipUnless(len(settings.DATABASE_SHARDS) > 1, 'needs DB_SHARDS with 2+')
+class ShardedSeedDataTests(TestCase):
+    """Test seeding users spread over several shards"""
+    databases = '__all__'
+
+    def test_seed_data_on_two_shards(self):
+        """Test each shard gets its users and ids from its own range"""
+        call_command('seed_data', users=10, seed=3, batch_size=20,
+                     stdout=StringIO())
+
+        for alias in settings.DATABASE_SHARDS[:2]:
+            first, last = sharding.id_range(alias)
+            users = UserShard.objects.filter(alias=alias).values_list(
+                'user_id', flat=True
+            )
+            self.assertTrue(users)
+            self.assertEqual(get_user_model().objects.using(alias).filter(
+                pk__in=list(users)).count(), len(users))
+            for model in (Recipe, Recipe.tags.through):
+                ids = model.objects.using(alias).values_list('pk', flat=True)
+                self.assertTrue(ids)
+                self.assertTrue(all(first <= pk <= last for pk in ids))
+            recipe = Recipe.objects.using(alias).create(
+                user_id=users[0], title='New', time_minutes=1,
+                price=Decimal('1'),
+            )
+            self.assertTrue(first <= recipe.pk <= last)
+
+
+class BenchApiTests(TestCase):
+    """Test the API benchmark suite"""
+    databases = '__all__'
+
+    def setUp(self):
+        call_command('seed_data', users=3, recipes=10, seed=1,
+                     stdout=StringIO())
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.baseline = os.path.join(directory.name, 'baseline.json')
+
+    def test_bench_api_saves_baseline_and_rolls_back(self):
+        """Test every scenario is measured and mutations are undone"""
+        recipes = Recipe.objects.count()
+
+        call_command('bench_api', iterations=3, warmup=0, min_recipes=1,
+                     save=self.baseline, stdout=StringIO())
+
+        with open(self.baseline) as f:
+            results = json.load(f)
+        self.assertIn('recipe_create', results)
+        self.assertIn('recipe_list_by_tag', results)
+        for result in results.values():
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertGreater(result['queries'], 0)
+            self.assertTrue(all(code < 300 for code in result['status']))
+        self.assertEqual(Recipe.objects.count(), recipes)
+
+    def test_bench_api_flags_regressions(self):
+        """Test results worse than the baseline fail the command"""
+        call_command('bench_api', iterations=3, warmup=0, min_recipes=1,
+                     scenarios=['recipe_detail'], save=self.baseline,
+                     stdout=StringIO())
+        with open(self.baseline) as f:
+            results = json.load(f)
+        results['recipe_detail']['queries'] -= 1
+        with open(self.baseline, 'w') as f:
+            json.dump(results, f)
+
+        with self.assertRaises(CommandError):
+            call_command('bench_api', iterations=3, warmup=0,
+                         min_recipes=1, scenarios=['recipe_detail'],
+                         compare=self.baseline, stdout=StringIO())
+
+    def test_bench_api_leaves_media_root_untouched(self):
+        """Test uploaded images and variants are not left behind"""
+        with tempfile.TemporaryDirectory() as media_root:
+            with self.settings(MEDIA_ROOT=media_root):
+                call_command('bench_api', iterations=2, warmup=0,
+                             min_recipes=1, scenarios=['image_upload'],
+                             save=self.baseline, stdout=StringIO())
+                files = [name for _, _, names in os.walk(media_root)
+                         for name in names]
+
+        with open(self.baseline) as f:
+            self.assertEqual(json.load(f)['image_upload']['status'], [200])
+        self.assertEqual(files, [])
@@ -0,0 +1,183 @@
+"""Tests for the chunked deletion of users"""
+
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from core import deletion
+from core.models import (ImageBlob, Ingredient, Recipe, Tag, Task,
+                         Tombstone, UserDeletion)
+from core.taskqueue import Worker
+
+
+EXPECTED_COUNTS = {
+    'recipe_tags': 15, 'recipe_ingredients': 5, 'recipe': 5, 'tag': 3,
+    'ingredient': 1, 'tombstone': 3,
+}
+
+
+class UserDataMixin:
+    """Create two users with recipes, tags, ingredients and tombstones"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'password123'
+        )
+        self.other = get_user_model().objects.create_user(
+            'other@example.com', 'password123'
+        )
+        for user in (self.user, self.other):
+            tags = [Tag.objects.create(user=user, name=f'Tag {i}')
+                    for i in range(3)]
+            ingredient = Ingredient.objects.create(user=user, name='Salt')
+            for i in range(5):
+                recipe = Recipe.objects.create(
+                    user=user, title=f'Recipe {i}', time_minutes=5,
+                    price=Decimal('1.00'),
+                    image=f'uploads/recipe/{user.pk}-{i}.jpg',
+                )
+                recipe.tags.add(*tags)
+                recipe.ingredients.add(ingredient)
+                ImageBlob.objects.acquire(recipe.image.name)
+            for i in range(3):
+                Tombstone.objects.create(user=user, model_name='recipe',
+                                         object_id=100 + i, change_seq=i)
+
+
+class UserDeletionTests(UserDataMixin, TestCase):
+    """Test users are deactivated at once and deleted in chunks"""
+    databases = '__all__'
+
+    def test_request_deletion(self):
+        """Test the user is deactivated and the deletion queued"""
+        Token.objects.create(user=self.user)
+
+        progress = deletion.request_deletion(self.user)
+
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+        self.assertEqual(progress.stage, UserDeletion.RECIPE_TAGS)
+        task = Task.objects.get()
+        self.assertEqual(task.payload, {'deletion_id': progress.pk})
+        self.assertEqual(deletion.request_deletion(self.user), progress)
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_run_is_resumable(self):
+        """Test an interrupted deletion continues where it stopped"""
+        progress = deletion.request_deletion(self.user)
+
+        self.assertFalse(deletion.run(progress, chunk_size=2, max_chunks=8))
+        progress = UserDeletion.objects.get(pk=progress.pk)
+        self.assertEqual(progress.stage, UserDeletion.RECIPE_INGREDIENTS)
+        self.assertEqual(progress.deleted, {'recipe_tags': 15})
+
+        self.assertTrue(deletion.run(progress, chunk_size=2))
+
+        self.assertEqual(progress.stage, UserDeletion.DONE)
+        self.assertIsNotNone(progress.finished_at)
+        self.assertEqual(progress.deleted, EXPECTED_COUNTS)
+        self.assertFalse(get_user_model().objects.filter(
+            pk=self.user.pk
+        ).exists())
+        self.assertEqual(Recipe.objects.filter(user=self.other).count(), 5)
+        self.assertEqual(Recipe.tags.through.objects.count(), 15)
+        self.assertEqual(Tombstone.objects.count(), 3)
+        self.assertEqual(
+            ImageBlob.objects.filter(ref_count=0).count(), 5
+        )
+        self.assertEqual(
+            ImageBlob.objects.filter(ref_count=1).count(), 5
+        )
+
+    @override_settings(USER_DELETION_CHUNK_SIZE=4,
+                       USER_DELETION_CHUNKS_PER_TASK=3)
+    def test_task_requeues_itself(self):
+        """Test the task runs a bounded number of chunks per attempt"""
+        progress = deletion.request_deletion(self.user)
+        worker = Worker()
+
+        runs = 0
+        while worker.run_batch():
+            runs += 1
+
+        self.assertGreater(runs, 1)
+        progress.refresh_from_db()
+        self.assertEqual(progress.stage, UserDeletion.DONE)
+        self.assertFalse(Task.objects.exists())
+        self.assertFalse(Tag.objects.filter(user_id=self.user.pk).exists())
+
+    def test_command_sync(self):
+        """Test the command deletes a user and reports progress"""
+        out = StringIO()
+
+        call_command('delete_user', 'user@example.com', '--sync',
+                     '--chunk-size', '10', stdout=out)
+
+        self.assertIn('user@example.com: done', out.getvalue())
+        self.assertFalse(get_user_model().objects.filter(
+            pk=self.user.pk
+        ).exists())
+
+    def test_interleaved_runners(self):
+        """Test runners holding stale copies do not undo each other"""
+        progress = deletion.request_deletion(self.user)
+        first = UserDeletion.objects.get(pk=progress.pk)
+        second = UserDeletion.objects.get(pk=progress.pk)
+
+        done = set()
+        while len(done) < 2:
+            for runner in (first, second):
+                if deletion.run(runner, chunk_size=2, max_chunks=1):
+                    done.add(id(runner))
+
+        progress.refresh_from_db()
+        self.assertEqual(progress.stage, UserDeletion.DONE)
+        self.assertEqual(progress.deleted, EXPECTED_COUNTS)
+        self.assertEqual(first.stage, UserDeletion.DONE)
+
+    def test_resume_skips_queued_deletions(self):
+        """Test --resume only queues deletions without a live task"""
+        deletion.request_deletion(self.user)
+        out = StringIO()
+
+        call_command('delete_user', '--resume', stdout=out)
+        self.assertIn('Queued 0 deletions', out.getvalue())
+        self.assertEqual(Task.objects.count(), 1)
+
+        Task.objects.update(status=Task.FAILED)
+        call_command('delete_user', '--resume', stdout=out)
+        self.assertIn('Queued 1 deletions', out.getvalue())
+        self.assertEqual(Task.objects.filter(status=Task.QUEUED).count(), 1)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs row locks')
+class ConcurrentUserDeletionTests(UserDataMixin, TransactionTestCase):
+    """Test two runners deleting the same user at the same time"""
+
+    def test_concurrent_runners(self):
+        """Test concurrent runners take turns and count every row once"""
+        progress = deletion.request_deletion(self.user)
+
+        def runner():
+            try:
+                return deletion.run(
+                    UserDeletion.objects.get(pk=progress.pk), chunk_size=2
+                )
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(2) as executor:
+            results = list(executor.map(lambda _: runner(), range(2)))
+
+        self.assertEqual(results, [True, True])
+        progress.refresh_from_db()
+        self.assertEqual(progress.stage, UserDeletion.DONE)
+        self.assertEqual(progress.deleted, EXPECTED_COUNTS)
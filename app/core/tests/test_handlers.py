@@ -0,0 +1,75 @@
+"""Tests for the routed WSGI handler"""
+
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from core.handlers import RoutedWSGIHandler, keep_connections
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class RoutedWSGIHandlerTests(TestCase):
+    """Test API paths skip the session based middleware"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'password123'
+        )
+        self.token = Token.objects.create(user=self.user)
+
+    def _get(self, handler, path, **extra):
+        environ = RequestFactory().get(path, **extra).environ
+        result = {}
+
+        def start_response(status, headers):
+            result['status'] = status
+
+        with keep_connections():
+            body = b''.join(handler(environ, start_response))
+        return result['status'], body
+
+    def test_api_uses_lean_chain(self):
+        """Test API requests work without session middleware"""
+        handler = RoutedWSGIHandler()
+
+        with patch.object(SessionMiddleware, 'process_request',
+                          autospec=True,
+                          side_effect=SessionMiddleware.process_request
+                          ) as process_request:
+            status, body = self._get(
+                handler, '/api/user/me/',
+                HTTP_AUTHORIZATION=f'Token {self.token.key}',
+            )
+            self.assertEqual(process_request.call_count, 0)
+            self._get(handler, '/admin/login/')
+            self.assertEqual(process_request.call_count, 1)
+
+        self.assertEqual(status, '200 OK')
+        self.assertIn(b'user@example.com', body)
+
+    @override_settings(API_MIDDLEWARE=None)
+    def test_api_middleware_disabled(self):
+        """Test API paths use MIDDLEWARE when API_MIDDLEWARE is None"""
+        handler = RoutedWSGIHandler()
+
+        with patch.object(SessionMiddleware, 'process_request',
+                          autospec=True,
+                          side_effect=SessionMiddleware.process_request
+                          ) as process_request:
+            self._get(handler, '/api/user/me/')
+
+        self.assertEqual(process_request.call_count, 1)
+
+    def test_bench_middleware(self):
+        """Test the benchmark reports both chains"""
+        out = StringIO()
+
+        call_command('bench_middleware', iterations=5, repeat=1, stdout=out)
+
+        self.assertIn('Full middleware', out.getvalue())
+        self.assertIn('API middleware', out.getvalue())
@@ -0,0 +1,58 @@
+"""Tests for health endpoints"""
+
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import health
+
+LIVE_URL = '/health/live'
+READY_URL = '/health/ready'
+
+
+class HealthApiTests(TestCase):
+    """Test liveness and readiness probes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        health.clear_cache()
+
+    def test_live(self):
+        """Test liveness needs no auth and touches no database"""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(LIVE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 0)
+
+    def test_ready(self):
+        """Test readiness with healthy dependencies"""
+        res = self.client.get(READY_URL + '/')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['status'], 'ok')
+
+    def test_ready_is_cached(self):
+        """Test repeated readiness probes reuse the database check"""
+        self.client.get(READY_URL)
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(5):
+                self.client.get(READY_URL)
+
+        self.assertEqual(len(queries), 0)
+
+    @override_settings(HEALTH_CHECK_CACHE_SECONDS=0)
+    @patch('core.health.check_media')
+    def test_ready_reports_failures(self, patched_media):
+        """Test a failing dependency makes readiness fail"""
+        patched_media.return_value = {'media': 'read-only file system'}
+
+        with patch.dict(health.CHECKS, {'media': patched_media}):
+            res = self.client.get(READY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn('media', res.json()['errors'])
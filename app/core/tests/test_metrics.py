@@ -0,0 +1,146 @@
+"""Tests for the Prometheus request metrics"""
+
+import json
+import os
+import tempfile
+import time
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import metrics
+
+RECIPE_URL = reverse('recipe:recipe-list')
+METRICS_URL = reverse('metrics')
+
+
+class MetricsTests(TestCase):
+    """Test per-route metrics collection and exposition"""
+
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'password123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_requests_are_recorded_per_route(self):
+        """Test latency, query and size histograms are labelled by view"""
+        self.client.get(RECIPE_URL)
+        self.client.get(RECIPE_URL)
+
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer secret')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        body = res.content.decode()
+        labels = 'method="GET",status="200",view="recipe:recipe-list"'
+        for name in ('http_request_duration_seconds',
+                     'http_request_db_queries',
+                     'http_response_size_bytes'):
+            self.assertIn(f'# TYPE {name} histogram', body)
+            self.assertIn(f'{name}_count{{{labels}}} 2', body)
+            self.assertIn(f'{name}_bucket{{{labels},le="+Inf"}} 2', body)
+
+    def test_metrics_from_other_processes_are_added(self):
+        """Test snapshots written by other workers are aggregated"""
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            with override_settings(METRICS_DIR=metrics_dir):
+                metrics.record_request('recipe:recipe-list', 'GET', 200,
+                                       0.02, 3, 512)
+                metrics.flush()
+                own_files = os.listdir(metrics_dir)
+                with open(os.path.join(metrics_dir, 'metrics_other.json'),
+                          'w') as f:
+                    f.write(json.dumps(metrics.collect()))
+
+                body = metrics.render()
+
+        self.assertEqual(len(own_files), 1)
+        labels = 'method="GET",status="200",view="recipe:recipe-list"'
+        self.assertIn(
+            f'http_request_duration_seconds_count{{{labels}}} 2', body
+        )
+        self.assertIn(
+            f'http_request_db_queries_bucket{{{labels},le="5"}} 2', body
+        )
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_metrics_restricted_by_address(self):
+        """Test scrapes from addresses not allowed are refused"""
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 403)
+
+    def test_metrics_closed_by_default(self):
+        """Test local and wrong-token scrapes are refused unless configured"""
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 403)
+        with override_settings(METRICS_TOKEN='secret'):
+            res = self.client.get(METRICS_URL,
+                                  HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(res.status_code, 403)
+
+        with override_settings(METRICS_ALLOWED_IPS=['127.0.0.1']):
+            res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, 200)
+
+    @skipUnless(hasattr(os, 'fork'), 'needs os.fork')
+    def test_forked_process_gets_own_id(self):
+        """Test a forked worker does not share the parent's snapshot file"""
+        metrics.record_request('recipe:recipe-list', 'GET', 200, 0.02, 3, 5)
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.write(write_fd, json.dumps(
+                [metrics._process['id'], len(metrics._data)]
+            ).encode())
+            os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as f:
+            child_id, child_series = json.loads(f.read())
+        os.waitpid(pid, 0)
+
+        self.assertNotEqual(child_id, metrics._process['id'])
+        self.assertEqual(child_series, 0)
+        self.assertTrue(metrics._data)
+
+    def test_idle_worker_flushes_on_timer(self):
+        """Test the last requests are written without another request"""
+        metrics._start_process()
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            with override_settings(METRICS_DIR=metrics_dir,
+                                   METRICS_FLUSH_SECONDS=0.01):
+                metrics.record_request('recipe:recipe-list', 'GET', 200,
+                                       0.02, 3, 512)
+                path = metrics._snapshot_path()
+                deadline = time.monotonic() + 5
+                while (not os.path.exists(path) and
+                       time.monotonic() < deadline):
+                    time.sleep(0.01)
+                with open(path) as f:
+                    data = json.load(f)
+
+        self.assertEqual(data, metrics._data)
+
+    def test_stale_snapshots_removed_on_start(self):
+        """Test old files of this pid and of dead processes are cleared"""
+        metrics._start_process()
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            names = [f'metrics_{os.getpid()}.json', 'metrics_4194305.json',
+                     'metrics_other.json']
+            for name in names:
+                with open(os.path.join(metrics_dir, name), 'w') as f:
+                    f.write('{}')
+            with override_settings(METRICS_DIR=metrics_dir,
+                                   METRICS_FLUSH_SECONDS=60):
+                metrics.record_request('recipe:recipe-list', 'GET', 200,
+                                       0.02, 3, 512)
+                remaining = os.listdir(metrics_dir)
+
+        self.assertEqual(remaining, ['metrics_other.json'])
@@ -1,5 +1,8 @@
 """Test for models"""
 
+import hashlib
+
+from django.core.files.base import ContentFile
 from django.test import TestCase
 from unittest.mock import patch
 from django.contrib.auth import get_user_model
@@ -92,3 +95,26 @@ class ModelTest(TestCase):
         file_path = models.recipe_image_file_path(None, 'myimage.jpg')
 
         self.assertEqual(file_path, f'uploads/recipe/{uuid}.jpg')
+
+    def test_recipe_file_name_content_hash(self):
+        """Test uploaded images are named after their content hash"""
+        recipe = models.Recipe(image=ContentFile(b'image-bytes',
+                                                 name='photo.JPG'))
+        digest = hashlib.sha256(b'image-bytes').hexdigest()
+
+        file_path = models.recipe_image_file_path(recipe, 'photo.JPG')
+
+        self.assertEqual(file_path,
+                         f'uploads/recipe/{digest[:2]}/{digest}.jpg')
+
+    def test_image_blob_reference_counting(self):
+        """Test acquiring and releasing stored images"""
+        models.ImageBlob.objects.acquire('uploads/recipe/a.jpg')
+        models.ImageBlob.objects.acquire('uploads/recipe/a.jpg')
+        models.ImageBlob.objects.release('uploads/recipe/a.jpg')
+        models.ImageBlob.objects.release('uploads/recipe/b.jpg')
+
+        counts = dict(models.ImageBlob.objects.values_list('name',
+                                                           'ref_count'))
+        self.assertEqual(counts, {'uploads/recipe/a.jpg': 1,
+                                  'uploads/recipe/b.jpg': 0})
@@ -0,0 +1,186 @@
+"""Tests for the fast JSON renderer and parser"""
+
+import io
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from unittest.mock import patch
+
+import msgpack
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from core.parsers import FastJSONParser, MessagePackParser
+from core.renderers import FastJSONRenderer, MessagePackRenderer
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TOKEN_URL = reverse('user:token')
+MSGPACK = 'application/msgpack'
+
+PAYLOAD = [OrderedDict([
+    ('id', 1),
+    ('price', '5.50'),
+    ('raw_price', Decimal('5.50')),
+    ('link', 'https://example.com/recipes/1?x=1&y=/2'),
+    ('image', 'http://testserver/static/media/uploads/recipe/ab/c.jpg'),
+    ('title', 'Crème brûlée \u2028\u2029 "quoted" \\ 🍮'),
+    ('created', datetime(2022, 1, 2, 3, 4, 5, 600, tzinfo=timezone.utc)),
+    ('day', date(2022, 1, 2)),
+    ('duration', timedelta(minutes=90)),
+    ('uuid', uuid.UUID(int=1)),
+    ('lazy', gettext_lazy('Recipe')),
+    ('ratio', 0.1),
+    ('big', 2 ** 70),
+    ('flags', [True, False, None]),
+    ('nested', {1: 'int key', 'tags': ({'id': 2, 'name': 'Vegan'},)}),
+])]
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    """Test FastJSONRenderer output matches JSONRenderer"""
+
+    def test_identical_output(self):
+        """Test the output bytes equal DRF's for tricky values"""
+        for data in (PAYLOAD, PAYLOAD[0], [], {}, 'text', 1, None):
+            self.assertEqual(FastJSONRenderer().render(data),
+                             JSONRenderer().render(data))
+
+    def test_indented_output(self):
+        """Test indented output falls back to the stdlib encoder"""
+        media_type = 'application/json; indent=4'
+
+        self.assertEqual(FastJSONRenderer().render(PAYLOAD, media_type),
+                         JSONRenderer().render(PAYLOAD, media_type))
+
+    def test_without_orjson(self):
+        """Test the renderer and parser work when orjson is missing"""
+        with patch('core.renderers.orjson', None), \
+                patch('core.parsers.orjson', None):
+            rendered = FastJSONRenderer().render(PAYLOAD)
+            parsed = FastJSONParser().parse(io.BytesIO(rendered))
+
+        self.assertEqual(rendered, JSONRenderer().render(PAYLOAD))
+        self.assertEqual(parsed, JSONParser().parse(io.BytesIO(rendered)))
+
+
+class FastJSONParserTests(SimpleTestCase):
+    """Test FastJSONParser accepts and rejects what JSONParser does"""
+
+    def test_parse(self):
+        """Test parsed data equals the stdlib parser's"""
+        body = JSONRenderer().render(PAYLOAD)
+
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(body)),
+                         JSONParser().parse(io.BytesIO(body)))
+
+    def test_parse_error(self):
+        """Test invalid bodies raise the same ParseError"""
+        for body in (b'{"a": NaN}', b'{"a": ', b'\xff'):
+            with self.assertRaises(ParseError) as expected:
+                JSONParser().parse(io.BytesIO(body))
+            with self.assertRaises(ParseError) as raised:
+                FastJSONParser().parse(io.BytesIO(body))
+            self.assertEqual(str(raised.exception),
+                             str(expected.exception))
+
+
+class FastJSONApiTests(TestCase):
+    """Test API responses are unchanged"""
+
+    def test_recipe_list(self):
+        """Test the recipe list renders exactly like JSONRenderer"""
+        user = get_user_model().objects.create_user('user@example.com',
+                                                    'password123')
+        recipe = Recipe.objects.create(user=user, title='Crème', price=5,
+                                       time_minutes=3, link='http://x.y/')
+        recipe.tags.add(Tag.objects.create(user=user, name='Végan'))
+        client = APIClient()
+        client.force_authenticate(user)
+
+        res = client.get(RECIPE_URL)
+
+        self.assertEqual(res.content, JSONRenderer().render(res.data))
+        self.assertEqual(res.json()[0]['price'], '5.00')
+
+
+class MessagePackTests(SimpleTestCase):
+    """Test the MessagePack renderer and parser"""
+
+    def test_decimal_encoded_as_string(self):
+        """Test Decimals keep their exact digits as strings"""
+        data = {'price': Decimal('5.50'), 'total': Decimal('1E+2')}
+
+        decoded = msgpack.unpackb(MessagePackRenderer().render(data))
+
+        self.assertEqual(decoded, {'price': '5.50', 'total': '1E+2'})
+
+    def test_same_values_as_json(self):
+        """Test other types decode to what the JSON renderer produces"""
+        data = [{key: value for key, value in PAYLOAD[0].items()
+                 if key not in ('raw_price', 'big', 'nested')}]
+        body = MessagePackRenderer().render(data)
+
+        self.assertEqual(MessagePackParser().parse(io.BytesIO(body)),
+                         JSONParser().parse(
+                             io.BytesIO(JSONRenderer().render(data))))
+
+    def test_parse_error(self):
+        """Test malformed bodies raise ParseError"""
+        for body in (b'\xc1', b'\x92\x01', b'\x01\x02'):
+            with self.assertRaises(ParseError):
+                MessagePackParser().parse(io.BytesIO(body))
+
+
+class MessagePackApiTests(TestCase):
+    """Test MessagePack content negotiation on the API"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'password123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_create_and_list_recipe(self):
+        """Test recipes can be created and listed in MessagePack"""
+        body = msgpack.packb({
+            'title': 'Soup', 'time_minutes': 5, 'price': '5.50',
+            'tags': [{'name': 'Vegan'}],
+        })
+
+        res = self.client.post(RECIPE_URL, body, content_type=MSGPACK,
+                               HTTP_ACCEPT=MSGPACK)
+        listed = self.client.get(RECIPE_URL, HTTP_ACCEPT=MSGPACK)
+
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res['Content-Type'], MSGPACK)
+        self.assertEqual(msgpack.unpackb(res.content)['price'], '5.50')
+        recipes = msgpack.unpackb(listed.content)
+        self.assertEqual(recipes[0]['tags'][0]['name'], 'Vegan')
+        self.assertEqual(recipes, self.client.get(RECIPE_URL).json())
+
+    def test_invalid_body(self):
+        """Test a malformed MessagePack body is a 400"""
+        res = self.client.post(RECIPE_URL, b'\xc1', content_type=MSGPACK)
+
+        self.assertEqual(res.status_code, 400)
+
+    def test_user_token(self):
+        """Test the user endpoints negotiate MessagePack too"""
+        self.client.force_authenticate(None)
+        body = msgpack.packb({'email': 'user@example.com',
+                              'password': 'password123'})
+
+        res = self.client.post(TOKEN_URL, body, content_type=MSGPACK,
+                               HTTP_ACCEPT=MSGPACK)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('token', msgpack.unpackb(res.content))
@@ -0,0 +1,105 @@
+"""Tests for the cached OpenAPI schema"""
+
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from core import schema
+
+SCHEMA_URL = reverse('api-schema')
+JSON = 'application/vnd.oai.openapi+json'
+
+
+@override_settings(APP_VERSION='v1')
+class CachedSchemaTests(SimpleTestCase):
+    """Test the schema is generated once and served with validators"""
+
+    def setUp(self):
+        schema.clear()
+        schema.code_version.cache_clear()
+        self.addCleanup(schema.clear)
+        self.addCleanup(schema.code_version.cache_clear)
+
+    def test_schema_generated_once(self):
+        """Test repeated requests reuse the generated schema"""
+        with patch('core.schema.generate', wraps=schema.generate) as gen:
+            first = self.client.get(SCHEMA_URL, HTTP_ACCEPT=JSON)
+            second = self.client.get(SCHEMA_URL, HTTP_ACCEPT=JSON)
+            self.client.get(SCHEMA_URL)
+
+        self.assertEqual(gen.call_count, 1)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.content, second.content)
+        self.assertIn('/api/recipe/recipe/',
+                      json.loads(first.content)['paths'])
+
+    def test_etag_not_modified(self):
+        """Test a matching If-None-Match gets an empty 304"""
+        res = self.client.get(SCHEMA_URL)
+
+        cached = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+
+    def test_gzip(self):
+        """Test clients accepting gzip get the precompressed schema"""
+        plain = self.client.get(SCHEMA_URL)
+
+        res = self.client.get(SCHEMA_URL, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(res.content), plain.content)
+        self.assertIn('Accept-Encoding', res['Vary'])
+
+    def test_new_code_version_regenerates(self):
+        """Test the schema is generated again for a new version"""
+        with patch('core.schema.generate', wraps=schema.generate) as gen:
+            self.client.get(SCHEMA_URL)
+            with override_settings(APP_VERSION='v2'):
+                schema.code_version.cache_clear()
+                self.client.get(SCHEMA_URL)
+
+        self.assertEqual(gen.call_count, 2)
+
+    def test_build_schema_file_used(self):
+        """Test workers load the schema written by build_schema"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'schema.json')
+            with override_settings(SCHEMA_CACHE_FILE=path):
+                call_command('build_schema', stdout=StringIO())
+                schema.clear()
+                with patch('core.schema.generate') as gen:
+                    res = self.client.get(SCHEMA_URL, HTTP_ACCEPT=JSON)
+
+        gen.assert_not_called()
+        self.assertIn('/api/recipe/recipe/',
+                      json.loads(res.content)['paths'])
+
+    def test_unsupported_lang_uses_default(self):
+        """Test made-up languages share the default schema cache entry"""
+        with patch('core.schema.generate', wraps=schema.generate) as gen:
+            default = self.client.get(SCHEMA_URL, HTTP_ACCEPT=JSON)
+            for lang in ('xx', 'en', 'a' * 100):
+                res = self.client.get(SCHEMA_URL, {'lang': lang},
+                                      HTTP_ACCEPT=JSON)
+                self.assertEqual(res.content, default.content)
+            self.client.get(SCHEMA_URL, {'lang': 'de'}, HTTP_ACCEPT=JSON)
+
+        self.assertEqual(gen.call_count, 2)
+        self.assertEqual(gen.call_args.kwargs['lang'], 'de')
+        self.assertEqual(len(schema._schemas), 2)
+
+    def test_accept_parameters_share_cache(self):
+        """Test Accept parameters do not create new cache entries"""
+        for i in range(3):
+            self.client.get(SCHEMA_URL, HTTP_ACCEPT=f'{JSON}; x={i}')
+
+        self.assertEqual(len(schema._rendered), 1)
@@ -0,0 +1,252 @@
+"""Tests for per-user sharding"""
+
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import deletion, sharding
+from core.management.commands.move_user_shard import Command
+from core.models import Recipe, Tag, UserShard
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+class ShardRouterTests(SimpleTestCase):
+    """Test shard selection and routing"""
+
+    def test_hash_shard_is_stable(self):
+        """Test the same user always hashes to the same shard"""
+        shards = ['default', 'shard1', 'shard2']
+        picks = {sharding.hash_shard(42, shards) for _ in range(5)}
+
+        self.assertEqual(len(picks), 1)
+        self.assertIn(picks.pop(), shards)
+
+    def test_hash_shard_spreads_users(self):
+        """Test users are spread across all shards"""
+        shards = ['default', 'shard1', 'shard2']
+        picks = {sharding.hash_shard(user_id, shards)
+                 for user_id in range(100)}
+
+        self.assertEqual(picks, set(shards))
+
+    def test_router_uses_active_shard(self):
+        """Test sharded models follow the activated shard"""
+        router = sharding.UserShardRouter()
+        token = sharding.activate('shard1')
+        try:
+            self.assertEqual(router.db_for_read(Recipe), 'shard1')
+            self.assertEqual(router.db_for_write(Tag), 'shard1')
+            self.assertEqual(
+                router.db_for_write(Recipe.tags.through), 'shard1'
+            )
+            self.assertIsNone(router.db_for_read(get_user_model()))
+        finally:
+            sharding.deactivate(token)
+
+        self.assertIsNone(router.db_for_read(Recipe))
+
+    def test_router_prefers_instance_database(self):
+        """Test related lookups stay on the instance's database"""
+        router = sharding.UserShardRouter()
+        recipe = Recipe()
+        recipe._state.db = 'shard2'
+
+        self.assertEqual(
+            router.db_for_read(Tag, instance=recipe), 'shard2'
+        )
+
+
+class ShardDirectoryTests(TestCase):
+    """Test the user shard directory"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'password123'
+        )
+
+    def test_single_shard_skips_directory(self):
+        """Test no directory entry is needed with one shard"""
+        self.assertEqual(sharding.shard_for_user(self.user), 'default')
+        self.assertFalse(UserShard.objects.exists())
+
+    @override_settings(DATABASE_SHARDS=['shard1', 'default'])
+    def test_directory_entry_wins_over_hash(self):
+        """Test a pinned user stays on their shard"""
+        UserShard.objects.create(user=self.user, alias='default')
+
+        self.assertEqual(sharding.shard_for_user(self.user), 'default')
+
+    @override_settings(DATABASE_SHARDS=['default', 'shard1'])
+    def test_writes_blocked_while_moving(self):
+        """Test writes get a 503 and reads work while a user moves"""
+        UserShard.objects.create(user=self.user, alias='default',
+                                 is_moving=True)
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        res = client.post(RECIPE_URL, {'title': 'Soup', 'time_minutes': 5,
+                                       'price': '1.00'})
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(Recipe.objects.exists())
+
+        res = client.get(RECIPE_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+@skipUnless(len(settings.DATABASE_SHARDS) > 1, 'needs DB_SHARDS with 2+')
+class MoveUserShardTests(TestCase):
+    """Test requests and moves across two shards"""
+    databases = '__all__'
+
+    def setUp(self):
+        self.source, self.target = settings.DATABASE_SHARDS[:2]
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'password123'
+        )
+        UserShard.objects.create(user=self.user, alias=self.source)
+        sharding.mirror_user(self.user, self.source)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = self.create_recipe(self.source)
+
+    def create_recipe(self, alias, **params):
+        defaults = {'title': 'Soup', 'time_minutes': 5,
+                    'price': Decimal('1.00')}
+        defaults.update(params)
+        recipe = Recipe.objects.using(alias).create(user=self.user,
+                                                    **defaults)
+        recipe.tags.add(Tag.objects.using(alias).create(user=self.user,
+                                                        name='Vegan'))
+        return recipe
+
+    def move(self):
+        call_command('move_user_shard', self.user.email, self.target,
+                     grace=0, stdout=StringIO())
+
+    def test_requests_use_the_users_shard(self):
+        """Test the API reads and writes the user's shard only"""
+        res = self.client.post(RECIPE_URL, {'title': 'Stew',
+                                            'time_minutes': 5,
+                                            'price': '1.00'})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Recipe.objects.using(self.source).filter(
+            pk=res.data['id']).exists())
+        self.assertFalse(Recipe.objects.using(self.target).exists())
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(len(res.data), 2)
+
+    def test_move(self):
+        """Test a move copies the data, switches and cleans up"""
+        self.move()
+
+        moved = Recipe.objects.using(self.target).get(pk=self.recipe.pk)
+        self.assertEqual(moved.tags.count(), 1)
+        self.assertFalse(Recipe.objects.using(self.source).exists())
+        self.assertFalse(Tag.objects.using(self.source).exists())
+        assignment = UserShard.objects.get(user=self.user)
+        self.assertEqual(assignment.alias, self.target)
+        self.assertFalse(assignment.is_moving)
+
+        res = self.client.post(RECIPE_URL, {'title': 'Stew',
+                                            'time_minutes': 5,
+                                            'price': '1.00'})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        first, last = sharding.id_range(self.target)
+        self.assertTrue(first <= res.data['id'] <= last)
+        self.assertEqual(len(self.client.get(RECIPE_URL).data), 2)
+
+    def test_move_aborts_on_id_collision(self):
+        """Test nothing is moved when the target already uses an id"""
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'password123'
+        )
+        sharding.mirror_user(other, self.target)
+        Recipe.objects.using(self.target).create(
+            pk=self.recipe.pk, user=other, title='Other', time_minutes=5,
+            price=Decimal('1.00'),
+        )
+
+        with self.assertRaisesMessage(CommandError, 'already exist'):
+            self.move()
+
+        self.assertTrue(Recipe.objects.using(self.source).filter(
+            pk=self.recipe.pk, user=self.user).exists())
+        self.assertFalse(Tag.objects.using(self.target).exists())
+        assignment = UserShard.objects.get(user=self.user)
+        self.assertEqual(assignment.alias, self.source)
+        self.assertFalse(assignment.is_moving)
+
+    def test_move_aborts_on_write_during_copy(self):
+        """Test a write racing the copy rolls the target back"""
+        copy = Command._copy
+
+        def racing_copy(command, model, *args, **kwargs):
+            if model is Recipe:
+                self.create_recipe(self.source, title='Late')
+            return copy(command, model, *args, **kwargs)
+
+        with mock.patch.object(Command, '_copy', racing_copy), \
+                self.assertRaisesMessage(CommandError, 'changed'):
+            self.move()
+
+        self.assertEqual(Recipe.objects.using(self.source).count(), 2)
+        self.assertFalse(Recipe.objects.using(self.target).exists())
+        self.assertFalse(Tag.objects.using(self.target).exists())
+        self.assertEqual(UserShard.objects.get(user=self.user).alias,
+                         self.source)
+
+    def test_move_back_removes_mirror(self):
+        """Test a move leaves no copy of the user row on the old shard"""
+        self.move()
+        call_command('move_user_shard', self.user.email, self.source,
+                     grace=0, stdout=StringIO())
+
+        self.assertTrue(Recipe.objects.using(self.source).filter(
+            pk=self.recipe.pk).exists())
+        self.assertFalse(get_user_model().objects.using(self.target).filter(
+            pk=self.user.pk).exists())
+
+    def test_deletion_removes_every_mirror(self):
+        """Test deleting a user removes their row from all shards"""
+        sharding.mirror_user(self.user, self.target)
+
+        deletion.run(deletion.request_deletion(self.user))
+
+        for alias in settings.DATABASE_SHARDS:
+            self.assertFalse(get_user_model().objects.using(alias).filter(
+                pk=self.user.pk).exists())
+
+    def test_reads_do_not_pin_user(self):
+        """Test a new user's reads do not create a directory entry"""
+        user = get_user_model().objects.create_user(
+            'new@example.com', 'password123'
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+
+        res = client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(UserShard.objects.filter(user=user).exists())
+        client.post(RECIPE_URL, {'title': 'Stew', 'time_minutes': 5,
+                                 'price': '1.00'})
+        self.assertTrue(UserShard.objects.filter(user=user).exists())
+
+    def test_shard_released_after_error(self):
+        """Test a view that raises does not leave its shard active"""
+        with mock.patch('recipe.views.RecipeViewSet.get_queryset',
+                        side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            self.client.get(RECIPE_URL)
+
+        self.assertIsNone(sharding.get_current_shard())
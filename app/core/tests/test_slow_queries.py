@@ -0,0 +1,86 @@
+"""Tests for slow query capture"""
+
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import slow_queries
+from core.models import Recipe
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+class SlowQueryTests(TestCase):
+    """Test slow queries are logged and explained"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'password123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0.000001,
+                       SLOW_QUERY_EXPLAIN_SAMPLE_RATE=0.0)
+    def test_slow_query_logged_with_view(self):
+        """Test queries over the threshold are logged with their view"""
+        with self.assertLogs('core.slow_queries', level='WARNING') as logs:
+            self.client.get(RECIPE_URL)
+
+        self.assertTrue(any('recipe:recipe-list' in line and
+                            'core_recipe' in line for line in logs.output))
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=60000)
+    def test_fast_queries_not_logged(self):
+        """Test queries under the threshold are not logged"""
+        with self.assertNoLogs('core.slow_queries', level='WARNING'):
+            self.client.get(RECIPE_URL)
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0.000001,
+                       SLOW_QUERY_EXPLAIN_SAMPLE_RATE=1.0)
+    def test_only_selects_are_explained(self):
+        """Test sampled plans are requested for SELECT statements only"""
+        with patch('core.slow_queries.schedule_explain') as schedule, \
+                self.assertLogs('core.slow_queries', level='WARNING'):
+            self.client.post(RECIPE_URL, {
+                'title': 'Soup', 'time_minutes': 5, 'price': '1.00',
+            })
+
+        statements = [call.args[1] for call in schedule.call_args_list]
+        self.assertTrue(statements)
+        for sql in statements:
+            self.assertTrue(sql.startswith('SELECT'))
+        self.assertEqual(schedule.call_args.args[3], 'recipe:recipe-list')
+
+    def test_can_explain(self):
+        """Test statements with side effects are never re-run"""
+        self.assertTrue(slow_queries.can_explain('SELECT 1'))
+        self.assertFalse(slow_queries.can_explain(
+            'SELECT * FROM core_task FOR UPDATE SKIP LOCKED'
+        ))
+        self.assertFalse(slow_queries.can_explain(
+            'UPDATE core_recipe SET title = %s'
+        ))
+        self.assertFalse(slow_queries.can_explain(
+            "SELECT nextval('core_change_seq'), clock_timestamp()"
+        ))
+        self.assertFalse(slow_queries.can_explain(
+            'SELECT setval(pg_get_serial_sequence(%s, %s), %s, %s)'
+        ))
+        self.assertFalse(slow_queries.can_explain(
+            'SELECT * FROM core_task FOR NO KEY UPDATE'
+        ))
+        self.assertTrue(slow_queries.can_explain(
+            'SELECT "core_recipe"."nextval_count" FROM "core_recipe"'
+        ))
+
+    def test_explain_uses_separate_connection(self):
+        """Test the plan is fetched without using the request connection"""
+        sql = str(Recipe.objects.filter(user=self.user).query)
+
+        plan = slow_queries.explain('default', sql, None)
+
+        self.assertIn('core_recipe', plan)
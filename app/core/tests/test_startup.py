@@ -0,0 +1,54 @@
+"""Tests for cold start time"""
+
+import json
+import os
+import subprocess
+import sys
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+# Seconds Django may take to load settings, apps, the WSGI handler and the
+# URLconf in a fresh API-only process
+COLD_START_BUDGET = 2.0
+
+
+def cold_start(**env):
+    """Return the timings of starting Django in a new interpreter"""
+    result = subprocess.run(
+        [sys.executable, '-m', 'core.startup'], cwd=settings.BASE_DIR,
+        env={**os.environ, **env}, capture_output=True, text=True,
+        check=True,
+    )
+    return json.loads(result.stdout)
+
+
+class StartupTests(SimpleTestCase):
+    """Test startup stays fast and heavy modules stay lazy"""
+
+    def test_cold_start_budget(self):
+        """Test an API-only process starts within the budget"""
+        timings = cold_start(API_ONLY='1')
+
+        self.assertLess(timings['total'], COLD_START_BUDGET)
+        self.assertEqual(timings['loaded'], [])
+        self.assertNotIn('admin', timings['apps'])
+
+    def test_admin_loaded_by_default(self):
+        """Test the admin is still set up outside API-only processes"""
+        timings = cold_start(API_ONLY='0')
+
+        self.assertIn('ready', timings['apps']['admin'])
+
+    def test_profile_startup(self):
+        """Test the profile reports phases, apps and imports"""
+        out = StringIO()
+
+        call_command('profile_startup', limit=3, stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('urlconf', output)
+        self.assertIn('recipe', output)
+        self.assertIn('Slowest imports', output)
@@ -0,0 +1,58 @@
+"""Tests for the content addressed file storage"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from unittest.mock import patch
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from core.storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    """Test content-hashed files are stored once"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.storage = ContentAddressedStorage(location=self.tmp.name)
+        self.content = b'same bytes'
+        digest = hashlib.sha256(self.content).hexdigest()
+        self.name = f'uploads/recipe/{digest[:2]}/{digest}.jpg'
+
+    def test_existing_name_is_reused(self):
+        """Test saving the same content twice keeps one file"""
+        first = self.storage.save(self.name, ContentFile(self.content))
+        second = self.storage.save(self.name, ContentFile(self.content))
+
+        self.assertEqual(first, self.name)
+        self.assertEqual(second, self.name)
+        self.assertEqual(os.listdir(os.path.dirname(
+            self.storage.path(self.name)
+        )), [os.path.basename(self.name)])
+
+    def test_concurrent_upload_of_same_content(self):
+        """Test losing the race to create the file does not loop"""
+        self.storage.save(self.name, ContentFile(self.content))
+        result = {}
+
+        def save():
+            with patch.object(self.storage, 'exists', return_value=False):
+                result['name'] = self.storage.save(
+                    self.name, ContentFile(self.content)
+                )
+
+        thread = threading.Thread(target=save, daemon=True)
+        thread.start()
+        thread.join(timeout=5)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(result['name'], self.name)
+        with self.storage.open(self.name) as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertEqual(len(os.listdir(os.path.dirname(
+            self.storage.path(self.name)
+        ))), 1)
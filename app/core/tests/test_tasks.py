@@ -0,0 +1,151 @@
+"""Tests for the background task queue"""
+
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Task
+from core.taskqueue import Worker, enqueue, task
+
+calls = []
+
+
+@task(name='tests.record')
+def record(**kwargs):
+    calls.append(kwargs)
+
+
+@task(name='tests.explode', max_attempts=2)
+def explode(**kwargs):
+    raise RuntimeError('boom')
+
+
+@task(name='tests.reclaim')
+def reclaim(task_id, **kwargs):
+    """Act as another worker re-claiming a task whose lease ran out"""
+    calls.append(task_id)
+    Task.objects.filter(pk=task_id).update(
+        attempts=F('attempts') + 1,
+        locked_until=timezone.now() + timedelta(seconds=300),
+    )
+
+
+@task(name='tests.lease')
+def lease(**kwargs):
+    calls.append(Task.objects.get(name='tests.lease').locked_until)
+
+
+class TaskQueueTests(TestCase):
+    """Test enqueueing and running tasks"""
+
+    def setUp(self):
+        calls.clear()
+        self.worker = Worker(retry_delay=10)
+
+    def test_delay_enqueues_task(self):
+        """Test delay() stores a queued task with its arguments"""
+        record.delay(value=1)
+
+        queued = Task.objects.get()
+        self.assertEqual(queued.name, 'tests.record')
+        self.assertEqual(queued.payload, {'value': 1})
+        self.assertEqual(queued.status, Task.QUEUED)
+
+    def test_successful_task_is_removed(self):
+        """Test a task runs once and is deleted afterwards"""
+        record.delay(value=1)
+
+        self.assertEqual(self.worker.run_batch(), 1)
+        self.assertEqual(self.worker.run_batch(), 0)
+
+        self.assertEqual(calls, [{'value': 1}])
+        self.assertFalse(Task.objects.exists())
+
+    def test_future_task_waits(self):
+        """Test tasks are not run before their run_at"""
+        enqueue('tests.record', delay=60)
+
+        self.assertEqual(self.worker.run_batch(), 0)
+
+    def test_failed_task_is_retried_with_backoff(self):
+        """Test a failure re-queues the task for later"""
+        explode.delay()
+
+        self.worker.run_batch()
+
+        failed = Task.objects.get()
+        self.assertEqual(failed.status, Task.QUEUED)
+        self.assertEqual(failed.attempts, 1)
+        self.assertGreater(failed.run_at, timezone.now())
+        self.assertIn('boom', failed.last_error)
+
+    def test_task_fails_after_max_attempts(self):
+        """Test a task is marked failed once out of attempts"""
+        explode.delay()
+        Task.objects.update(attempts=1)
+
+        self.worker.run_batch()
+
+        self.assertEqual(Task.objects.get().status, Task.FAILED)
+
+    def test_expired_claim_is_retried(self):
+        """Test tasks of a vanished worker are claimed again"""
+        record.delay(value=2)
+        Task.objects.update(
+            status=Task.RUNNING, attempts=1,
+            locked_until=timezone.now() - timedelta(seconds=1),
+        )
+
+        self.assertEqual(self.worker.run_batch(), 1)
+        self.assertEqual(calls, [{'value': 2}])
+
+    def test_run_worker_burst(self):
+        """Test run_worker drains the queue and exits in burst mode"""
+        for value in range(3):
+            record.delay(value=value)
+        out = StringIO()
+
+        call_command('run_worker', burst=True, stdout=out)
+
+        self.assertEqual(len(calls), 3)
+        self.assertIn('Processed 3 tasks', out.getvalue())
+
+    def test_reclaimed_task_is_skipped(self):
+        """Test a task claimed by another worker is not run twice"""
+        first = enqueue('tests.reclaim')
+        second = record.delay(value=1)
+        Task.objects.filter(pk=first.pk).update(
+            payload={'task_id': second.pk},
+            run_at=timezone.now() - timedelta(seconds=1),
+        )
+
+        self.assertEqual(self.worker.run_batch(), 2)
+
+        self.assertEqual(calls, [second.pk])
+        taken = Task.objects.get()
+        self.assertEqual((taken.pk, taken.attempts), (second.pk, 2))
+
+    def test_reclaimed_task_is_not_deleted(self):
+        """Test finishing a task does not delete another worker's claim"""
+        own = enqueue('tests.reclaim')
+        Task.objects.filter(pk=own.pk).update(payload={'task_id': own.pk})
+
+        self.worker.run_batch()
+
+        self.assertEqual(Task.objects.get().attempts, 2)
+
+    def test_lease_renewed_per_task(self):
+        """Test each task's lease starts when the task does"""
+        lease.delay()
+        claimed, = self.worker.claim()
+        started = timezone.now()
+        Task.objects.update(locked_until=started - timedelta(seconds=1))
+
+        self.worker.execute(claimed)
+
+        self.assertGreater(calls[0], started + timedelta(seconds=60))
+        self.assertFalse(Task.objects.exists())
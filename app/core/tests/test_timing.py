@@ -0,0 +1,62 @@
+"""Tests for per-request timing"""
+
+import logging
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def parse_server_timing(header):
+    """Return {metric: (duration, description)} from a Server-Timing header"""
+    metrics = {}
+    for entry in header.split(', '):
+        name, *params = entry.split(';')
+        values = dict(param.split('=', 1) for param in params)
+        metrics[name] = (float(values['dur']), values.get('desc'))
+    return metrics
+
+
+class ServerTimingTests(TestCase):
+    """Test the Server-Timing breakdown"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'password123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Recipe.objects.create(user=self.user, title='Soup', time_minutes=5,
+                              price=Decimal('1.00'))
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1.0)
+    def test_server_timing_header(self):
+        """Test sampled requests report db, serializer and render time"""
+        with self.assertLogs('core.timing', level='INFO') as logs:
+            res = self.client.get(RECIPE_URL)
+
+        metrics = parse_server_timing(res['Server-Timing'])
+        for name in ('auth', 'db', 'serialize', 'render', 'total'):
+            self.assertIn(name, metrics)
+        self.assertRegex(metrics['db'][1], r'"\d+ queries"')
+        self.assertIn('"view": "recipe:recipe-list"', logs.output[0])
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_not_measured(self):
+        """Test no header is added when the request is not sampled"""
+        res = self.client.get(RECIPE_URL)
+
+        self.assertNotIn('Server-Timing', res)
+
+    def test_timing_logger_configured(self):
+        """Test LOGGING lets the timing lines through outside of tests"""
+        logger = logging.getLogger('core.timing')
+
+        self.assertTrue(logger.isEnabledFor(logging.INFO))
+        self.assertTrue(logger.handlers)
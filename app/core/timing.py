@@ -0,0 +1,102 @@
+"""
+Per-request timing breakdown.
+
+`ServerTimingMiddleware` activates a `RequestTimings` for a sampled share
+of requests. Database time is collected through `execute_wrapper`; views
+and serializers add their own spans through `span()`. Outside a sampled
+request every hook is a no-op.
+"""
+import contextvars
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar('request_timings', default=None)
+_timed_serializers = {}
+
+
+class RequestTimings:
+    """Accumulated durations (in seconds) for one request"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = defaultdict(float)
+        self.queries = 0
+        self.render_start = None
+
+    def __call__(self, execute, sql, params, many, context):
+        """Database execute wrapper counting queries and their time"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.spans['db'] += time.perf_counter() - start
+
+
+def current():
+    """Return the timings of the current request, if it is sampled"""
+    return _current.get()
+
+
+def activate(timings):
+    """Make timings current; returns a token for deactivate"""
+    return _current.set(timings)
+
+
+def deactivate(token):
+    """Restore the timings active before the matching activate"""
+    _current.reset(token)
+
+
+@contextmanager
+def span(name):
+    """Add the duration of the block to the named span"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.spans[name] += time.perf_counter() - start
+
+
+class TimedSerializerMixin:
+    """Record serializer representation and validation time"""
+
+    def to_representation(self, instance):
+        with span('serialize'):
+            return super().to_representation(instance)
+
+    def is_valid(self, raise_exception=False):
+        with span('validate'):
+            return super().is_valid(raise_exception=raise_exception)
+
+
+def timed_serializer(serializer_class):
+    """Return a subclass of serializer_class that records its timings"""
+    if serializer_class not in _timed_serializers:
+        _timed_serializers[serializer_class] = type(
+            serializer_class.__name__,
+            (TimedSerializerMixin, serializer_class),
+            {'__module__': serializer_class.__module__},
+        )
+    return _timed_serializers[serializer_class]
+
+
+class ServerTimingViewMixin:
+    """Time DRF request setup and serializers of sampled requests"""
+
+    def initial(self, request, *args, **kwargs):
+        with span('auth'):
+            super().initial(request, *args, **kwargs)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer_class = self.get_serializer_class()
+        fake_view = getattr(self, 'swagger_fake_view', False)
+        if _current.get() is not None and not fake_view:
+            serializer_class = timed_serializer(serializer_class)
+        kwargs.setdefault('context', self.get_serializer_context())
+        return serializer_class(*args, **kwargs)
@@ -0,0 +1,42 @@
+"""Views for the core app"""
+
+import functools
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.utils.module_loading import import_string
+from django.views.decorators.csrf import csrf_exempt
+
+from core import metrics
+
+
+def may_scrape_metrics(request):
+    """Return True for the METRICS_TOKEN or an allowed client address"""
+    if settings.METRICS_TOKEN and constant_time_compare(
+        request.headers.get('Authorization', ''),
+        f'Bearer {settings.METRICS_TOKEN}',
+    ):
+        return True
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def metrics_view(request):
+    """Expose request metrics of all worker processes for Prometheus"""
+    if not may_scrape_metrics(request):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(),
+                        content_type='text/plain; version=0.0.4')
+
+
+def lazy_view(view_path, **initkwargs):
+    """Return a view that imports the class view_path on first request"""
+    @functools.lru_cache(maxsize=None)
+    def load():
+        return import_string(view_path).as_view(**initkwargs)
+
+    @csrf_exempt
+    def view(request, *args, **kwargs):
+        return load()(request, *args, **kwargs)
+
+    return view
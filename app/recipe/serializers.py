@@ -1,5 +1,8 @@
 """Serializers for the recipe API"""
 
+from django.core.files.storage import default_storage
+from django.conf import settings
+from django.db import router, transaction
 from rest_framework import serializers
 from core.models import Recipe, Tag, Ingredient
 
@@ -54,35 +57,59 @@ class RecipeSerializer(serializers.ModelSerializer):
         """Create a new recipe"""
         tags = validated_data.pop('tags',[])
         ingredients = validated_data.pop('ingredients',[])
-        recipe = Recipe.objects.create(**validated_data)
-        self._get_or_create_tags(recipe, tags)
-        self._get_or_create_ingredients(recipe, ingredients)
+        with transaction.atomic(using=router.db_for_write(Recipe)):
+            recipe = Recipe.objects.create(**validated_data)
+            self._get_or_create_tags(recipe, tags)
+            self._get_or_create_ingredients(recipe, ingredients)
         return recipe
 
     def update(self, instance, validated_data):
         """Update a recipe"""
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
-        if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(instance, tags)
+        with transaction.atomic(using=router.db_for_write(Recipe)):
+            if tags is not None:
+                instance.tags.clear()
+                self._get_or_create_tags(instance, tags)
 
-        if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(instance, ingredients)
+            if ingredients is not None:
+                instance.ingredients.clear()
+                self._get_or_create_ingredients(instance, ingredients)
 
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
 
-        instance.save()
+            instance.save()
         return instance
 
 
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for recipe detail"""
+    image_variants = serializers.SerializerMethodField()
 
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ['description', 'image']
+        fields = RecipeSerializer.Meta.fields + [
+            'description', 'image', 'image_variants', 'image_width',
+            'image_height', 'image_bytes', 'image_format',
+            'image_placeholder',
+        ]
+        read_only_fields = RecipeSerializer.Meta.read_only_fields + [
+            'image_width', 'image_height', 'image_bytes', 'image_format',
+            'image_placeholder',
+        ]
+
+    def get_image_variants(self, obj) -> dict:
+        """Return the URL of each generated image variant"""
+        request = self.context.get('request')
+        variants = {}
+        for variant, formats in (obj.image_variants or {}).items():
+            variants[variant] = {}
+            for fmt, name in formats.items():
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                variants[variant][fmt] = url
+        return variants
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
@@ -93,3 +120,28 @@ class RecipeImageSerializer(serializers.ModelSerializer):
         fields = ['id', 'image']
         read_only_fields = ['id']
         extra_kwargs = {'image': {'required': True}}
+
+
+class BatchRetrieveSerializer(serializers.Serializer):
+    """Serializer for the IDs of a batch retrieve"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+    )
+
+    def validate_ids(self, value):
+        """Limit the number of IDs to BATCH_RETRIEVE_MAX_IDS"""
+        limit = settings.BATCH_RETRIEVE_MAX_IDS
+        if len(value) > limit:
+            raise serializers.ValidationError(
+                f'Ensure this field has no more than {limit} elements.'
+            )
+        return value
+
+
+class MergeSerializer(serializers.Serializer):
+    """Serializer for the sources merged into a tag or ingredient"""
+    sources = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+    )
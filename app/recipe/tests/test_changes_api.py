@@ -0,0 +1,167 @@
+"""Tests for the delta sync API"""
+
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+CHANGES_URL = reverse('recipe:changes')
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe"""
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class PrivateChangesApiTests(TestCase):
+    """Test the authenticated changes feed"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'password123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sync(self, since=None, **params):
+        if since is not None:
+            params['since'] = since
+        res = self.client.get(CHANGES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_auth_required(self):
+        """Test the feed requires authentication"""
+        res = APIClient().get(CHANGES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_full_then_incremental_sync(self):
+        """Test a sync returns only what changed after its cursor"""
+        recipe = create_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        create_recipe(get_user_model().objects.create_user(
+            'other@example.com', 'password123'
+        ))
+
+        full = self.sync()
+        self.assertEqual([r['id'] for r in full['recipes']], [recipe.id])
+        self.assertEqual([t['id'] for t in full['tags']], [tag.id])
+        self.assertFalse(full['has_more'])
+        nothing = self.sync(full['cursor'])
+        self.assertEqual(nothing['recipes'], [])
+        self.assertEqual(nothing['cursor'], full['cursor'])
+
+        self.client.patch(reverse('recipe:recipe-detail', args=[recipe.id]),
+                          {'title': 'Renamed'})
+        delta = self.sync(full['cursor'])
+
+        self.assertEqual([r['title'] for r in delta['recipes']], ['Renamed'])
+        self.assertEqual(delta['tags'], [])
+        self.assertGreater(delta['cursor'], full['cursor'])
+
+    def test_deletes_leave_tombstones(self):
+        """Test deleted objects are reported and dependents changed"""
+        recipe = create_recipe(self.user)
+        kept = create_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        kept.tags.add(tag)
+        cursor = self.sync()['cursor']
+
+        self.client.delete(reverse('recipe:recipe-detail', args=[recipe.id]))
+        self.client.delete(reverse('recipe:tag-detail', args=[tag.id]))
+        delta = self.sync(cursor)
+
+        self.assertEqual(delta['deleted'], {
+            'recipes': [recipe.id], 'tags': [tag.id], 'ingredients': [],
+        })
+        self.assertEqual([r['id'] for r in delta['recipes']], [kept.id])
+        self.assertEqual(delta['recipes'][0]['tags'], [])
+
+    def test_merge_reports_changes(self):
+        """Test merged tags are deleted and their recipes changed"""
+        target = Tag.objects.create(user=self.user, name='Vegan')
+        source = Tag.objects.create(user=self.user, name='vegan')
+        recipe = create_recipe(self.user)
+        recipe.tags.add(source)
+        cursor = self.sync()['cursor']
+
+        self.client.post(reverse('recipe:tag-merge', args=[target.id]),
+                         {'sources': [source.id]}, format='json')
+        delta = self.sync(cursor)
+
+        self.assertEqual(delta['deleted']['tags'], [source.id])
+        self.assertEqual(delta['recipes'][0]['tags'][0]['id'], target.id)
+
+    def test_paging(self):
+        """Test following the cursor returns every change exactly once"""
+        recipes = [create_recipe(self.user) for _ in range(3)]
+        tags = [Tag.objects.create(user=self.user, name=f'Tag {i}')
+                for i in range(2)]
+
+        seen, cursor, pages = [], 0, 0
+        while True:
+            page = self.sync(cursor, limit=2)
+            pages += 1
+            seen += [('recipe', r['id']) for r in page['recipes']]
+            seen += [('tag', t['id']) for t in page['tags']]
+            cursor = page['cursor']
+            if not page['has_more']:
+                break
+
+        self.assertEqual(pages, 3)
+        self.assertCountEqual(seen, [('recipe', r.id) for r in recipes] +
+                              [('tag', t.id) for t in tags])
+
+    def test_cost_independent_of_collection_size(self):
+        """Test an incremental sync does not read unchanged rows"""
+        for _ in range(30):
+            create_recipe(self.user)
+        cursor = self.sync()['cursor']
+        create_recipe(self.user, title='New')
+
+        with CaptureQueriesContext(connection) as queries:
+            delta = self.sync(cursor)
+
+        self.assertEqual(len(delta['recipes']), 1)
+        self.assertLessEqual(len(queries), 6)
+
+    def test_invalid_cursor(self):
+        """Test malformed cursors are rejected"""
+        res = self.client.get(CHANGES_URL, {'since': 'abc'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_recent_changes_held_back(self):
+        """Test changes that may be uncommitted are left for a later sync"""
+        old = create_recipe(self.user)
+        new = create_recipe(self.user)
+        Recipe.objects.filter(pk=old.pk).update(
+            changed_at=timezone.now() - timedelta(minutes=1)
+        )
+        horizon = {'changed_at__lte': timezone.now() - timedelta(seconds=5)}
+
+        with patch('core.changes.committed_filter', return_value=horizon):
+            first = self.sync()
+        second = self.sync(first['cursor'])
+
+        self.assertEqual([r['id'] for r in first['recipes']], [old.id])
+        self.assertEqual(first['cursor'], old.change_seq)
+        self.assertFalse(first['has_more'])
+        self.assertEqual([r['id'] for r in second['recipes']], [new.id])
@@ -130,3 +130,20 @@ class PrivateIngredientsApiTests(TestCase):
 
         res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
         self.assertEqual(len(res.data), 1)
+
+    def test_merge_ingredients(self):
+        """Test merging ingredients into one"""
+        target = Ingredient.objects.create(user=self.user, name='Salt')
+        source = Ingredient.objects.create(user=self.user, name='salt')
+        recipe = Recipe.objects.create(user=self.user, title='Chips',
+                                       time_minutes=10, price=Decimal('2.00'))
+        recipe.ingredients.add(source)
+
+        res = self.client.post(
+            reverse('recipe:ingredient-merge', args=[target.id]),
+            {'sources': [source.id]}, format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(Ingredient.objects.filter(id=source.id).exists())
+        self.assertEqual(list(recipe.ingredients.all()), [target])
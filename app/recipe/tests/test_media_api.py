@@ -0,0 +1,184 @@
+"""Test for the media serving API"""
+
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import image_cache
+from core.models import Recipe
+
+HASHED_NAME = 'uploads/recipe/ab/' + 'ab' * 32 + '.jpg'
+
+
+def media_url(name):
+    """Return the URL serving a media file"""
+    return reverse('media', args=[name])
+
+
+def resized_url(recipe_id):
+    """Return the URL serving a resized recipe image"""
+    return reverse('recipe:recipe-resized-image', args=[recipe_id])
+
+
+class MediaApiTests(TestCase):
+    """Test serving recipe images"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'password123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.name = default_storage.save(HASHED_NAME,
+                                         ContentFile(b'jpeg-bytes'))
+        self.addCleanup(default_storage.delete, self.name)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5,
+            price=Decimal('1.00'), image=self.name,
+        )
+
+    def test_auth_required(self):
+        """Test anonymous users cannot fetch media"""
+        res = APIClient().get(media_url(self.name))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_serve_own_image(self):
+        """Test the owner gets the file with long-lived cache headers"""
+        res = self.client.get(media_url(self.name))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), b'jpeg-bytes')
+        self.assertIn('immutable', res['Cache-Control'])
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+
+    def test_not_modified(self):
+        """Test a matching ETag returns 304"""
+        etag = self.client.get(media_url(self.name))['ETag']
+
+        res = self.client.get(media_url(self.name), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_other_users_image_not_found(self):
+        """Test images of other users are not served"""
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'password123'
+        )
+        self.client.force_authenticate(other)
+
+        res = self.client.get(media_url(self.name))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(MEDIA_SENDFILE_BACKEND='nginx')
+    def test_accel_redirect(self):
+        """Test nginx delivery sets X-Accel-Redirect and no body"""
+        res = self.client.get(media_url(self.name))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Accel-Redirect'],
+                         '/protected-media/' + self.name)
+        self.assertEqual(res.content, b'')
+
+    @override_settings(MEDIA_SENDFILE_BACKEND='sendfile')
+    def test_x_sendfile(self):
+        """Test X-Sendfile delivery points at the file on disk"""
+        res = self.client.get(media_url(self.name))
+
+        self.assertEqual(res['X-Sendfile'], default_storage.path(self.name))
+
+
+class ResizedImageApiTests(TestCase):
+    """Test the on-demand resized image endpoint"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'password123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        buffer = io.BytesIO()
+        Image.new('RGB', (1000, 500)).save(buffer, format='JPEG')
+        self.name = default_storage.save('uploads/recipe/resize.jpg',
+                                         ContentFile(buffer.getvalue()))
+        self.addCleanup(default_storage.delete, self.name)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5,
+            price=Decimal('1.00'), image=self.name,
+        )
+
+    def _cleanup_cache(self, width, fmt):
+        name = image_cache.cache_name(self.name, width, fmt)
+        self.addCleanup(lambda: [
+            os.remove(path) for path in (default_storage.path(name),
+                                         default_storage.path(name) + '.lock')
+            if os.path.exists(path)
+        ])
+        return name
+
+    def test_resized_image(self):
+        """Test the image is resized to the requested width and format"""
+        self._cleanup_cache(320, 'webp')
+        url = resized_url(self.recipe.id)
+
+        res = self.client.get(url, {'width': 320, 'fmt': 'webp'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'image/webp')
+        img = Image.open(io.BytesIO(b''.join(res.streaming_content)))
+        self.assertEqual((img.format, img.size), ('WEBP', (320, 160)))
+
+    def test_width_not_allowed(self):
+        """Test widths outside the allowlist are rejected"""
+        res = self.client.get(resized_url(self.recipe.id), {'width': 333})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_concurrent_misses_render_once(self):
+        """Test concurrent requests for one variant decode the image once"""
+        self._cleanup_cache(160, 'jpeg')
+        render = image_cache.render
+        calls = []
+
+        def slow_render(*args):
+            calls.append(args)
+            time.sleep(0.2)
+            return render(*args)
+
+        with patch('core.image_cache.render', side_effect=slow_render):
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                names = set(pool.map(
+                    lambda _: image_cache.get_resized(self.name, 160, 'jpeg'),
+                    range(4),
+                ))
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(names), 1)
+
+    def test_evict_least_recently_used(self):
+        """Test eviction removes the oldest files first"""
+        old = self._cleanup_cache(160, 'jpeg')
+        new = self._cleanup_cache(320, 'jpeg')
+        image_cache.get_resized(self.name, 160, 'jpeg')
+        image_cache.get_resized(self.name, 320, 'jpeg')
+        os.utime(default_storage.path(old), (0, 0))
+
+        new_size = os.path.getsize(default_storage.path(new))
+        image_cache.evict(limit=int(new_size / 0.9) + 1)
+
+        self.assertFalse(default_storage.exists(old))
+        self.assertTrue(default_storage.exists(new))
@@ -3,14 +3,19 @@
 import tempfile
 import os
 
+from unittest.mock import patch
+
 from PIL import Image
-from django.test import TestCase
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from decimal import Decimal
 from rest_framework import status
 from rest_framework.test import APIClient
-from core.models import Recipe, Tag, Ingredient
+from core.images import generate_variants
+from core.models import Recipe, Tag, Ingredient, ImageBlob
 from recipe.serializers import (RecipeSerializer,
                                 RecipeDetailSerializer,)
 
@@ -23,6 +28,14 @@ def detail_url(recipe_id):
     return reverse('recipe:recipe-detail', args=[recipe_id])
 
 
+def batch_url(**params):
+    """Return the recipe batch retrieve URL"""
+    url = reverse('recipe:recipe-batch')
+    if params:
+        url += '?' + '&'.join(f'{k}={v}' for k, v in params.items())
+    return url
+
+
 def image_upload_url(recipe_id):
     """Return URL for recipe image upload"""
     return reverse('recipe:recipe-upload-image', args=[recipe_id])
@@ -420,6 +433,60 @@ class PrivateRecipeApiTests(TestCase):
         self.assertIn(serializer2.data, res.data)
         self.assertNotIn(serializer3.data, res.data)
 
+    def test_batch_retrieve_keeps_order(self):
+        """Test batch retrieve returns recipes in request order"""
+        other = create_recipe(user=create_user(email='other@example.com',
+                                               password='password123'))
+        recipes = [create_recipe(user=self.user) for _ in range(3)]
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipes[1].tags.add(tag)
+        ids = [recipes[2].id, 99999, recipes[0].id, other.id, recipes[1].id]
+
+        res = self.client.get(batch_url(ids=','.join(map(str, ids))))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data['results']],
+                         [recipes[2].id, recipes[0].id, recipes[1].id])
+        self.assertEqual(res.data['missing'], [99999, other.id])
+        self.assertEqual(res.data['results'][2]['tags'][0]['name'], 'Vegan')
+        self.assertIn('description', res.data['results'][0])
+
+    def test_batch_retrieve_post(self):
+        """Test IDs can be sent in a POST body"""
+        recipe = create_recipe(user=self.user)
+
+        res = self.client.post(batch_url(), {'ids': [recipe.id, recipe.id]},
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['missing'], [])
+
+    def test_batch_retrieve_query_count(self):
+        """Test the number of queries does not grow with the batch"""
+        recipes = [create_recipe(user=self.user) for _ in range(10)]
+        for recipe in recipes:
+            recipe.tags.add(Tag.objects.create(user=self.user, name='T'))
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name='I')
+            )
+
+        with self.assertNumQueries(3):
+            res = self.client.get(
+                batch_url(ids=','.join(str(r.id) for r in recipes))
+            )
+
+        self.assertEqual(len(res.data['results']), 10)
+
+    @override_settings(BATCH_RETRIEVE_MAX_IDS=2)
+    def test_batch_retrieve_invalid(self):
+        """Test malformed, empty and oversized batches are rejected"""
+        for url in (batch_url(ids='1,x'), batch_url(),
+                    batch_url(ids='1,2,3')):
+            res = self.client.get(url)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class ImageUploadTests(TestCase):
     """Test for uploading images to recipes"""
@@ -449,6 +516,120 @@ class ImageUploadTests(TestCase):
         self.assertIn('image', res.data)
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
+    def test_upload_image_stores_metadata(self):
+        """Test image dimensions and placeholder are saved on upload"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.png') as image_file:
+            Image.new('RGB', (40, 30), (255, 0, 0)).save(image_file,
+                                                         format='PNG')
+            size = image_file.tell()
+            image_file.seek(0)
+            self.client.post(url, {'image': image_file}, format='multipart')
+
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.assertEqual(res.data['image_width'], 40)
+        self.assertEqual(res.data['image_height'], 30)
+        self.assertEqual(res.data['image_bytes'], size)
+        self.assertEqual(res.data['image_format'], 'png')
+        self.assertEqual(res.data['image_placeholder'], '#ff0000')
+
+    def test_upload_same_image_is_stored_once(self):
+        """Test identical uploads share one content-addressed file"""
+        other = create_recipe(user=self.user)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+            for recipe in (self.recipe, other):
+                image_file.seek(0)
+                res = self.client.post(image_upload_url(recipe.id),
+                                       {'image': image_file},
+                                       format='multipart')
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.recipe.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.recipe.image.name, other.image.name)
+        self.assertEqual(
+            ImageBlob.objects.get(name=other.image.name).ref_count, 2
+        )
+
+    @patch('core.images.get_executor')
+    def test_upload_image_schedules_variants(self, patched_executor):
+        """Test uploading an image queues variant generation after commit"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            img = Image.new('RGB', (10, 10))
+            img.save(image_file, format='JPEG')
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(url, {'image': image_file},
+                                       format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        patched_executor.return_value.submit.assert_called_once()
+
+    def test_generate_image_variants(self):
+        """Test resized variants are stored and exposed on the detail"""
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (1200, 600)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            self.recipe.image.save('photo.jpg', File(image_file))
+
+        variants = generate_variants(self.recipe.id, self.recipe.image.name)
+        self.addCleanup(lambda: [default_storage.delete(name)
+                                 for formats in variants.values()
+                                 for name in formats.values()])
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants, variants)
+        with default_storage.open(variants['thumbnail']['webp']) as thumb:
+            self.assertEqual(Image.open(thumb).size, (200, 100))
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertTrue(
+            res.data['image_variants']['medium']['jpeg'].endswith(
+                variants['medium']['jpeg']
+            )
+        )
+
+    @override_settings(RECIPE_IMAGE_MAX_BYTES=2048)
+    def test_upload_image_too_large(self):
+        """Test uploads over the byte limit are rejected"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.png') as image_file:
+            Image.effect_noise((100, 100), 64).save(image_file, format='PNG')
+            image_file.seek(0)
+            res = self.client.post(url, {'image': image_file},
+                                   format='multipart')
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=100 * 100)
+    def test_upload_image_too_many_pixels(self):
+        """Test images over the pixel limit are rejected from the header"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.png') as image_file:
+            Image.new('RGB', (101, 100)).save(image_file, format='PNG')
+            image_file.seek(0)
+            res = self.client.post(url, {'image': image_file},
+                                   format='multipart')
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def test_upload_non_image_file(self):
+        """Test files that are not images are rejected"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            image_file.write(b'not an image' * 100)
+            image_file.seek(0)
+            res = self.client.post(url, {'image': image_file},
+                                   format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_upload_image_bad_request(self):
         """Test uploading an invalid image"""
         url = image_upload_url(self.recipe.id)
@@ -130,3 +130,58 @@ class PrivateTagsApiTests(TestCase):
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
         self.assertEqual(len(res.data), 1)
+
+    def test_batch_retrieve_tags(self):
+        """Test fetching several tags by ID in one request"""
+        tag1 = Tag.objects.create(user=self.user, name='Breakfast')
+        tag2 = Tag.objects.create(user=self.user, name='Lunch')
+        other = Tag.objects.create(user=create_user(email='other@example.com'),
+                                   name='Dinner')
+
+        res = self.client.get(reverse('recipe:tag-batch'),
+                              {'ids': f'{tag2.id},{other.id},{tag1.id}'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'],
+                         [TagSerializer(tag2).data, TagSerializer(tag1).data])
+        self.assertEqual(res.data['missing'], [other.id])
+
+    def test_merge_tags(self):
+        """Test merging tags re-points their recipes and deletes them"""
+        target = Tag.objects.create(user=self.user, name='Vegan')
+        source1 = Tag.objects.create(user=self.user, name='vegan')
+        source2 = Tag.objects.create(user=self.user, name='Vegan ')
+        recipes = [
+            Recipe.objects.create(user=self.user, title=f'Soup {i}',
+                                  time_minutes=10, price=Decimal('5.00'))
+            for i in range(3)
+        ]
+        recipes[0].tags.add(target, source1)
+        recipes[1].tags.add(source1, source2)
+        recipes[2].tags.add(source2)
+
+        res = self.client.post(
+            reverse('recipe:tag-merge', args=[target.id]),
+            {'sources': [source1.id, source2.id]}, format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, TagSerializer(target).data)
+        self.assertFalse(Tag.objects.filter(
+            id__in=[source1.id, source2.id]
+        ).exists())
+        for recipe in recipes:
+            self.assertEqual(list(recipe.tags.all()), [target])
+
+    def test_merge_tags_invalid_sources(self):
+        """Test merging rejects the target and other users' tags"""
+        target = Tag.objects.create(user=self.user, name='Vegan')
+        other = Tag.objects.create(user=create_user(email='other@example.com'),
+                                   name='Vegan')
+        url = reverse('recipe:tag-merge', args=[target.id])
+
+        for sources in ([target.id], [other.id], []):
+            res = self.client.post(url, {'sources': sources}, format='json')
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Tag.objects.filter(id=other.id).exists())
@@ -0,0 +1,100 @@
+"""Streaming upload handling for recipe images"""
+
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from rest_framework import status
+
+
+class ImageUploadRejected(Exception):
+    """Reason an image upload was stopped"""
+
+    def __init__(self, message, status_code=status.HTTP_400_BAD_REQUEST):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class BoundedImageUploadHandler(FileUploadHandler):
+    """Stream an image upload to disk, enforcing byte and pixel limits
+
+    The image header is parsed from the first chunks, before the rest of
+    the body is read, so oversized or undecodable files are rejected
+    without buffering them or letting Pillow decode any pixels. The
+    content hash used for the storage name is computed on the way through.
+    """
+    header_limit = 256 * 2**10
+
+    def __init__(self, request=None, max_bytes=None, max_pixels=None):
+        super().__init__(request)
+        self.max_bytes = max_bytes or settings.RECIPE_IMAGE_MAX_BYTES
+        self.max_pixels = max_pixels or settings.RECIPE_IMAGE_MAX_PIXELS
+        self.error = None
+        self.image_info = None
+        self._header = bytearray()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = TemporaryUploadedFile(
+            self.file_name, self.content_type, 0, self.charset,
+            self.content_type_extra,
+        )
+        self.image_info = None
+        self._header = bytearray()
+        self._sha = hashlib.sha256()
+
+    def _reject(self, message, status_code=status.HTTP_400_BAD_REQUEST):
+        """Record the error, drop the temp file and stop reading the body"""
+        self.error = ImageUploadRejected(message, status_code)
+        self.file.close()
+        raise StopUpload(connection_reset=True)
+
+    def _read_header(self, final=False):
+        """Try to identify the image from the bytes received so far"""
+        from PIL import Image, UnidentifiedImageError
+
+        try:
+            with Image.open(io.BytesIO(bytes(self._header))) as img:
+                width, height = img.size
+                image_format = img.format
+        except Image.DecompressionBombError:
+            self._reject('Image has too many pixels.',
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            if final or len(self._header) >= self.header_limit:
+                self._reject('Upload a valid image.')
+            return
+        if image_format not in settings.RECIPE_IMAGE_FORMATS:
+            self._reject(f'Unsupported image format {image_format}.')
+        if width * height > self.max_pixels:
+            self._reject('Image has too many pixels.',
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.image_info = {'width': width, 'height': height,
+                           'format': image_format}
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_bytes:
+            self._reject('Image file is too large.',
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        if self.image_info is None:
+            self._header += raw_data[:self.header_limit - len(self._header)]
+            self._read_header()
+        self._sha.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if self.image_info is None:
+            self._read_header(final=True)
+        self._header = bytearray()
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.image_info = self.image_info
+        self.file.content_hash = self._sha.hexdigest()
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
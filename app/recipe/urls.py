@@ -12,5 +12,6 @@ router.register('ingredient', views.IngredientViewSet)
 app_name = 'recipe'
 
 urlpatterns = [
+    path('changes/', views.ChangesView.as_view(), name='changes'),
     path('', include(router.urls)),
 ]
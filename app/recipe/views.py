@@ -5,16 +5,95 @@ from drf_spectacular.utils import (extend_schema,
                                    OpenApiParameter,
                                    OpenApiTypes)
 
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.http import Http404
 from rest_framework import viewsets, mixins, status
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
-from core.models import Recipe, Tag, Ingredient
+from core import changes
+from core.image_cache import get_resized
+from core.images import FORMATS as image_formats
+from core.images import image_metadata, schedule_variants, source_stem
+from core.media import serve_file
+from core.models import Recipe, Tag, Ingredient, ImageBlob, Tombstone
+from core.sharding import ShardedViewMixin
+from core.storage import is_content_addressed
+from core.timing import ServerTimingViewMixin
 from recipe import serializers
+from recipe.uploads import BoundedImageUploadHandler
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
+from rest_framework.views import APIView
+
+
+BATCH_SCHEMA = extend_schema(
+    parameters=[
+        OpenApiParameter(
+            'ids',
+            OpenApiTypes.STR,
+            description='Comma separated list of IDs to fetch (GET only)',
+        ),
+    ],
+    request=serializers.BatchRetrieveSerializer,
+    responses={200: OpenApiTypes.OBJECT},
+)
+
+
+class BatchRetrieveMixin:
+    """Fetch many objects by ID in one request"""
+    batch_prefetch = ()
+
+    @action(methods=['GET', 'POST'], detail=False, url_path='batch')
+    def batch(self, request):
+        """Return the requested objects in request order and missing IDs"""
+        if request.method == 'GET':
+            data = {'ids': [
+                value for value in request.query_params.get('ids', '')
+                .split(',') if value
+            ]}
+        else:
+            data = request.data
+        ids_serializer = serializers.BatchRetrieveSerializer(data=data)
+        ids_serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(ids_serializer.validated_data['ids']))
+
+        queryset = self.get_queryset().filter(pk__in=ids).prefetch_related(
+            *self.batch_prefetch
+        )
+        found = {obj.pk: obj for obj in queryset}
+        serializer = self.get_serializer(
+            [found[pk] for pk in ids if pk in found], many=True
+        )
+        return Response({
+            'results': serializer.data,
+            'missing': [pk for pk in ids if pk not in found],
+        })
 
 
 @extend_schema_view(
+    batch=BATCH_SCHEMA,
+    resized_image=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'width',
+                OpenApiTypes.INT,
+                enum=settings.RECIPE_IMAGE_WIDTHS,
+                description='Width of the returned image in pixels',
+            ),
+            OpenApiParameter(
+                'fmt',
+                OpenApiTypes.STR,
+                enum=list(image_formats),
+                description='Encoding of the returned image',
+            ),
+        ],
+        responses={(200, 'image/*'): OpenApiTypes.BINARY},
+    ),
     list=extend_schema(
         parameters=[
             OpenApiParameter(
@@ -30,10 +109,14 @@ from rest_framework.response import Response
         ]
     )
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ServerTimingViewMixin,
+                    ShardedViewMixin,
+                    BatchRetrieveMixin,
+                    viewsets.ModelViewSet):
     """Viewset for the recipe API"""
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
+    batch_prefetch = ('tags', 'ingredients')
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
@@ -68,16 +151,50 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Create a new recipe"""
         serializer.save(user=self.request.user)
 
-    @action(methods=['POST'], detail=True, url_path='upload-image')
+    def perform_destroy(self, instance):
+        """Delete a recipe and release its image"""
+        image = instance.image.name
+        with transaction.atomic(using=instance._state.db):
+            changes.record_deletion(instance)
+            instance.delete()
+        if image:
+            ImageBlob.objects.release(image)
+
+    @action(methods=['POST'], detail=True, url_path='upload-image',
+            parser_classes=[MultiPartParser])
     def upload_image(self, request, pk=None):
         """Upload an image to a recipe"""
         recipe = self.get_object()
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        if content_length > settings.RECIPE_IMAGE_MAX_BYTES + 64 * 2**10:
+            return Response(
+                {'image': ['Image file is too large.']},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        upload_handler = BoundedImageUploadHandler(request._request)
+        request._request.upload_handlers = [upload_handler]
+        data = request.data
+        if upload_handler.error is not None:
+            return Response(
+                {'image': [upload_handler.error.message]},
+                status=upload_handler.error.status_code
+            )
+        previous_image = recipe.image.name
         serializer = self.get_serializer(
             recipe,
-            data=request.data
+            data=data
         )
         if serializer.is_valid():
-            serializer.save()
+            upload = serializer.validated_data['image']
+            recipe = serializer.save(
+                image_variants={},
+                **image_metadata(upload, size=upload.size)
+            )
+            if recipe.image.name != previous_image:
+                ImageBlob.objects.acquire(recipe.image.name)
+                if previous_image:
+                    ImageBlob.objects.release(previous_image)
+            schedule_variants(recipe)
             return Response(
                 serializer.data,
                 status=status.HTTP_200_OK
@@ -87,7 +204,34 @@ class RecipeViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    @action(methods=['GET'], detail=True, url_path='image')
+    def resized_image(self, request, pk=None):
+        """Return the recipe image at an allowed width and format"""
+        recipe = self.get_object()
+        if not recipe.image:
+            raise Http404
+        fmt = request.query_params.get('fmt', 'jpeg')
+        try:
+            width = int(request.query_params.get('width', 0))
+        except ValueError:
+            width = 0
+        if (width not in settings.RECIPE_IMAGE_WIDTHS or
+                fmt not in image_formats):
+            return Response(
+                {'detail': 'Unsupported width or format.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not default_storage.exists(recipe.image.name):
+            raise Http404
+        name = get_resized(recipe.image.name, width, fmt)
+        return serve_file(request, name,
+                          content_type=f'image/{fmt}',
+                          immutable=is_content_addressed(recipe.image.name))
+
+
 @extend_schema_view(
+    batch=BATCH_SCHEMA,
+    merge=extend_schema(request=serializers.MergeSerializer),
     list=extend_schema(
         parameters=[
             OpenApiParameter(
@@ -98,7 +242,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
         ]
     )
 )
-class BaseRecipeAttrViewSet(mixins.UpdateModelMixin,
+class BaseRecipeAttrViewSet(ServerTimingViewMixin,
+                            ShardedViewMixin,
+                            BatchRetrieveMixin,
+                            mixins.UpdateModelMixin,
                             mixins.DestroyModelMixin,
                             mixins.CreateModelMixin,
                             mixins.ListModelMixin,
@@ -120,14 +267,173 @@ class BaseRecipeAttrViewSet(mixins.UpdateModelMixin,
             user=self.request.user
         ).order_by('-name').distinct()
 
+    def perform_merge(self, target, source_ids):
+        """Re-point the recipes of the sources to target, then delete them"""
+        model = self.queryset.model
+        field = Recipe._meta.get_field(self.recipe_field)
+        through = field.remote_field.through
+        alias = router.db_for_write(model)
+        connection = connections[alias]
+        qn = connection.ops.quote_name
+        recipe_column = qn(through._meta.get_field('recipe').column)
+        column = qn(through._meta.get_field(model._meta.model_name).column)
+        placeholders = ', '.join(['%s'] * len(source_ids))
+        sources = model.objects.using(alias).filter(pk__in=source_ids)
+        with transaction.atomic(using=alias):
+            changes.bump(Recipe.objects.using(alias).filter(**{
+                f'{self.recipe_field}__in': source_ids,
+            }).distinct())
+            for source in sources:
+                changes.record_deletion(source)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {qn(through._meta.db_table)} '
+                    f'({recipe_column}, {column}) '
+                    f'SELECT DISTINCT {recipe_column}, %s '
+                    f'FROM {qn(through._meta.db_table)} '
+                    f'WHERE {column} IN ({placeholders}) '
+                    f'ON CONFLICT DO NOTHING',
+                    [target.pk, *source_ids],
+                )
+            sources.delete()
+
+    def perform_destroy(self, instance):
+        """Delete the object, marking the recipes using it as changed"""
+        with transaction.atomic(using=instance._state.db):
+            changes.bump(Recipe.objects.using(instance._state.db).filter(
+                **{self.recipe_field: instance}
+            ))
+            changes.record_deletion(instance)
+            instance.delete()
+
+    @action(methods=['POST'], detail=True)
+    def merge(self, request, pk=None):
+        """Merge the given sources into this object"""
+        target = self.get_object()
+        serializer = serializers.MergeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        source_ids = list(dict.fromkeys(serializer.validated_data['sources']))
+        if target.pk in source_ids:
+            raise ValidationError(
+                {'sources': ['Cannot merge an object into itself.']}
+            )
+        found = set(self.queryset.filter(
+            user=request.user, pk__in=source_ids
+        ).values_list('pk', flat=True))
+        missing = [pk for pk in source_ids if pk not in found]
+        if missing:
+            raise ValidationError({'sources': [
+                f'Invalid pk "{pk}" - object does not exist.'
+                for pk in missing
+            ]})
+        self.perform_merge(target, source_ids)
+        return Response(self.get_serializer(target).data)
+
 
 class TagViewSet(BaseRecipeAttrViewSet):
     """Viewset for the tag API"""
     serializer_class = serializers.TagSerializer
     queryset = Tag.objects.all()
+    recipe_field = 'tags'
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
     """Viewset for the ingredient API"""
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
+    recipe_field = 'ingredients'
+
+
+class ChangesView(ServerTimingViewMixin, ShardedViewMixin, APIView):
+    """Recipes, tags and ingredients changed or deleted after a cursor"""
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    feeds = (
+        ('recipes', Recipe.objects.prefetch_related('tags', 'ingredients'),
+         serializers.RecipeDetailSerializer),
+        ('tags', Tag.objects.all(), serializers.TagSerializer),
+        ('ingredients', Ingredient.objects.all(),
+         serializers.IngredientSerializer),
+    )
+
+    def _int_param(self, name, default, maximum=None):
+        try:
+            value = int(self.request.query_params.get(name, default))
+        except ValueError:
+            raise ValidationError({name: ['A valid integer is required.']})
+        if value < 0:
+            raise ValidationError({name: ['Must not be negative.']})
+        return min(value, maximum) if maximum else value
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'since', OpenApiTypes.INT,
+                description='Cursor returned by the previous sync; 0 or '
+                            'absent for a full sync',
+            ),
+            OpenApiParameter(
+                'limit', OpenApiTypes.INT,
+                description='Most changes to return',
+            ),
+        ],
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    def get(self, request):
+        """Return one page of changes and the cursor to continue from"""
+        since = self._int_param('since', 0)
+        limit = self._int_param('limit', settings.SYNC_PAGE_SIZE,
+                                settings.SYNC_PAGE_SIZE) or 1
+        committed = changes.committed_filter(
+            router.db_for_read(Tombstone)
+        )
+        changed = []
+        for key, queryset, serializer_class in self.feeds:
+            changed.extend(
+                (obj.change_seq, key, obj) for obj in queryset.filter(
+                    user=request.user, change_seq__gt=since, **committed
+                ).order_by('change_seq')[:limit + 1]
+            )
+        changed.extend(
+            (tombstone.change_seq, 'deleted', tombstone)
+            for tombstone in Tombstone.objects.filter(
+                user=request.user, change_seq__gt=since, **committed
+            ).order_by('change_seq')[:limit + 1]
+        )
+        changed.sort(key=lambda change: change[0])
+        page = changed[:limit]
+
+        data = {
+            'cursor': page[-1][0] if page else since,
+            'has_more': len(changed) > limit,
+        }
+        context = {'request': request}
+        for key, queryset, serializer_class in self.feeds:
+            data[key] = serializer_class(
+                [obj for seq, feed, obj in page if feed == key],
+                many=True, context=context,
+            ).data
+        data['deleted'] = {key: [] for key, _, _ in self.feeds}
+        for seq, feed, tombstone in page:
+            if feed == 'deleted':
+                data['deleted'][f'{tombstone.model_name}s'].append(
+                    tombstone.object_id
+                )
+        return Response(data)
+
+
+class RecipeMediaView(ShardedViewMixin, APIView):
+    """Serve recipe images and variants to the recipe owner"""
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(exclude=True)
+    def get(self, request, path):
+        """Check ownership, then hand the file to the proxy or sendfile"""
+        stem = source_stem(path)
+        owned = Recipe.objects.filter(user=request.user).filter(
+            Q(image=path) | Q(image__startswith=f'{stem}.')
+        ).exists()
+        if not owned:
+            raise Http404
+        return serve_file(request, path)
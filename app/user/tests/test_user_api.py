@@ -6,6 +6,7 @@ from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
+from core.models import UserDeletion
 
 
 CREATE_USER_URL = reverse('user:create')
@@ -151,3 +152,14 @@ class PrivateUserApiTests(TestCase):
 
         self.assertTrue(self.user.check_password(payload['password']))
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_delete_user(self):
+        """Test deleting the account deactivates it at once"""
+        res = self.client.delete(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertTrue(UserDeletion.objects.filter(
+            user_id=self.user.pk
+        ).exists())
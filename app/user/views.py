@@ -1,13 +1,15 @@
 """Views for the user API"""
 
 from django.shortcuts import render
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, authentication, permissions, status
+from rest_framework.response import Response
 from user.serializers import (
     UserSerializer,
     AuthTokenSerializer,
 )
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
+from core.deletion import request_deletion
 
 class CreateUserView(generics.CreateAPIView):
     """Create a new user in the system."""
@@ -18,9 +20,10 @@ class CreateTokenView(ObtainAuthToken):
     """Create a new auth token for user"""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(generics.RetrieveUpdateDestroyAPIView):
     """Manage the authenticated user."""
     serializer_class = UserSerializer
     authentication_classes = [authentication.TokenAuthentication]
@@ -30,3 +33,8 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
         """Retrieve and return the authenticated user."""
         return self.request.user
 
+    def destroy(self, request, *args, **kwargs):
+        """Deactivate the user now and delete their data in the background."""
+        request_deletion(self.get_object())
+        return Response(status=status.HTTP_202_ACCEPTED)
+